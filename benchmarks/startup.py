@@ -0,0 +1,71 @@
+"""Бенчмарк запуска воркера приложения Styx.
+
+Для каждого прогона запускает отдельный процесс интерпретатора, который 
+импортирует пакет :mod:`flaskr` и создает приложение фабрикой 
+:func:`flaskr.create_app`. Выводит время импорта и создания приложения, 
+максимальный RSS процесса и список тяжелых модулей, которые были 
+загружены при запуске::
+
+   $ python benchmarks/startup.py --runs 10
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+#: Модули, которые не должны загружаться при запуске веб-воркера
+HEAVY_MODULES = ('metrics', 'visualization', 'graphviz', 'requests')
+
+_WORKER = '''
+import json, resource, sys, time
+start = time.perf_counter()
+import flaskr
+imported = time.perf_counter()
+flaskr.create_app()
+created = time.perf_counter()
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+if sys.platform == 'darwin':
+    rss //= 1024
+print(json.dumps({
+    'import_time': imported - start,
+    'create_time': created - imported,
+    'max_rss_kb': rss,
+    'heavy_modules': [m for m in %r if m in sys.modules]
+}))
+''' % (HEAVY_MODULES,)
+
+
+def run_worker():
+    """Запускает один воркер и возвращает его замеры.
+
+    :rtype: dict
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.check_output([sys.executable, '-c', _WORKER],
+            cwd=root)
+    return json.loads(output.decode('utf-8').splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5,
+            help='количество запусков воркера')
+    args = parser.parse_args()
+
+    results = [run_worker() for _ in range(args.runs)]
+
+    for key in ('import_time', 'create_time'):
+        values = [r[key] * 1000 for r in results]
+        print('%-12s median %8.1f ms  min %8.1f ms  max %8.1f ms' % (
+            key, statistics.median(values), min(values), max(values)))
+
+    rss = [r['max_rss_kb'] / 1024 for r in results]
+    print('%-12s median %8.1f MB' % ('max_rss', statistics.median(rss)))
+    print('heavy modules loaded: %s' % (
+        ', '.join(results[-1]['heavy_modules']) or 'none'))
+
+
+if __name__ == '__main__':
+    main()
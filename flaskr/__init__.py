@@ -1,40 +1,244 @@
+"""Пакет **flaskr** содержит веб-приложение Styx. Приложение создается
+фабрикой :func:`create_app`, например::
+
+   $ export FLASK_APP="flaskr:create_app()"
+   $ flask init-db
+
+Тяжелые модули (анализаторы *metrics* и *visualization*, *graphviz*,
+*requests*) импортируются при первом использовании, поэтому воркеры,
+которые только отдают страницы, не загружают анализаторы.
+"""
+import os
+import click
 from flask import Flask
-from flaskr.main import main
-from flaskr.auth import auth
-from flaskr.api import api_bp
-from flaskr.filters import filters
-from flaskr.auth import login_manager
 from flaskr.models import db
 from sqlalchemy.engine import Engine
 from sqlalchemy import event
 
-app = Flask(__name__)
-app.config.update(
-    SECRET_KEY=b'\xd2\xa8\x86\x05\xb0[\x85S\xeeF\x1c#\x8av1\x05',
-    SESSION_COOKIE_HTTPONLY=True,
-    REMEMBER_COOKIE_HTTPONLY=True,
-    SESSION_COOKIE_SAMESITE='Strict',
-    SQLALCHEMY_DATABASE_URI='sqlite:///main.db',
-    SQLALCHEMY_TRACK_MODIFICATIONS=False,
-    CPG_SERVER_PORT=5052
-)
-
-db.init_app(app)
-login_manager.init_app(app)
-
-@app.cli.command('init-db')
-def init_db():
-    with app.app_context():
-        db.create_all()
-
-app.register_blueprint(main)
-app.register_blueprint(auth)
-app.register_blueprint(api_bp)
-app.register_blueprint(filters)
+
+def create_app(config=None):
+    """Фабрика приложения. Создает и настраивает экземпляр
+    :class:`flask.Flask`, регистрирует Blueprint'ы и команды CLI.
+
+    Настройки по умолчанию можно переопределить словарем *config* или
+    файлом, путь к которому указан в переменной окружения
+    *STYX_SETTINGS*.
+
+    :param dict config: словарь с настройками приложения
+    :returns: экземпляр приложения
+    :rtype: :class:`flask.Flask`
+    """
+    app = Flask(__name__)
+    app.config.update(
+        SECRET_KEY=b'\xd2\xa8\x86\x05\xb0[\x85S\xeeF\x1c#\x8av1\x05',
+        SESSION_COOKIE_HTTPONLY=True,
+        REMEMBER_COOKIE_HTTPONLY=True,
+        SESSION_COOKIE_SAMESITE='Strict',
+        SQLALCHEMY_DATABASE_URI='sqlite:///main.db',
+        SQLALCHEMY_TRACK_MODIFICATIONS=False,
+        CPG_SERVER_PORT=5052,
+        GITHUB_RAW_BLOBS=True,
+        SOURCE_FALLBACK_ENCODING='latin-1',
+        INGESTION_MAX_BLOB_SIZE=1024 * 1024,
+        INGESTION_EXCLUDES=(),
+        INGESTION_SOURCE='github',
+        INGESTION_CHUNK_SIZE=500,
+        WEBHOOK_DELIVERY_TTL=24 * 60 * 60,
+        WEBHOOK_LEASE_TTL=10 * 60,
+        GC_BATCH_SIZE=500,
+        GC_BATCH_PAUSE=0.05,
+        GC_BACKGROUND=True,
+        HISTORY_FULL_INTERVAL=50,
+        HOTSPOTS_PER_PAGE=20,
+        DISTRIBUTIONS_CACHE_SIZE=32,
+        RENDER_DOT_BINARY='dot',
+        RENDER_WORKERS=4,
+        RENDER_QUEUE_SIZE=16,
+        RENDER_TIMEOUT=5.0,
+        RENDER_MEMORY_LIMIT=512 * 1024 * 1024,
+        RENDER_CHEAP_FROM=1000,
+        RENDER_CHEAP_ENGINE='sfdp',
+        RENDER_MAX_NODES=5000,
+        CFG_RENDER_MODE='server',
+        CFG_CLIENT_MAX_DOT_SIZE=512 * 1024,
+        CFG_LOD_BUDGET=200,
+        COMPRESSION_ENABLED=True,
+        COMPRESSION_MIN_SIZE=1024,
+        COMPRESSION_LEVEL=6,
+        COMPRESSION_BROTLI_QUALITY=4,
+        COMPRESSION_CACHE_SIZE=32 * 1024 * 1024,
+        FRAGMENT_CACHE_SIZE=512,
+        FRAGMENT_CACHE_TTL=60,
+        REANALYSIS_BATCH_SIZE=100,
+        REANALYSIS_BATCH_PAUSE=0.1,
+        GIT_MIRRORS_DIR=os.path.join(app.instance_path, 'mirrors'),
+        BLOB_STORE_ENABLED=True,
+        BLOB_STORE_DIR=os.path.join(app.instance_path, 'blobs'),
+        BLOB_STORE_MAX_SIZE=1024 * 1024 * 1024
+    )
+    app.config.from_envvar('STYX_SETTINGS', silent=True)
+
+    if config is not None:
+        app.config.update(config)
+
+    from flaskr.main import main
+    from flaskr.auth import auth
+    from flaskr.auth import login_manager
+    from flaskr.api import api_bp
+    from flaskr.filters import filters
+    from flaskr import compression
+
+    db.init_app(app)
+    login_manager.init_app(app)
+    compression.init_app(app)
+
+    @app.cli.command('init-db')
+    def init_db():
+        """Создает таблицы БД."""
+        with app.app_context():
+            db.create_all()
+
+    @app.cli.command('rebuild-search')
+    def rebuild_search():
+        """Перестраивает поисковые индексы текущих деревьев всех 
+        проектов."""
+        from flaskr import search
+        from flaskr.models import Project
+
+        with app.app_context():
+            for project in Project.query.all():
+                count = search.rebuild(project)
+                db.session.commit()
+                print('%s: %d' % (project.project_name, count))
+
+    @app.cli.command('rebuild-hotspots')
+    def rebuild_hotspots():
+        """Пересчитывает горячие точки текущих деревьев всех проектов."""
+        from flaskr import hotspots
+        from flaskr.models import Project
+
+        with app.app_context():
+            for project in Project.query.all():
+                count = hotspots.rebuild(project)
+                db.session.commit()
+                print('%s: %d' % (project.project_name, count))
+
+    @app.cli.command('analyze-path')
+    @click.argument('project')
+    @click.argument('path', type=click.Path(exists=True, file_okay=False))
+    @click.option('--workers', type=int, default=None,
+            help='Количество процессов анализа')
+    @click.option('--replace', is_flag=True,
+            help='Заменить загруженное дерево проекта')
+    def analyze_path(project, path, workers, replace):
+        """Загружает локальную копию репозитория PATH в проект PROJECT
+        (<пользователь>/<проект>)."""
+        from flaskr import webhook
+        from flaskr.models import Project
+        from flaskr.models import User
+
+        username, _, project_name = project.partition('/')
+        with app.app_context():
+            p = Project.query.join(User, User.id == Project.user_id)\
+                    .filter(User.username == username, 
+                            Project.project_name == project_name).first()
+            if p is None:
+                raise click.ClickException('Проект %s не найден' % project)
+
+            root_dir = p.get_root_dir()
+            if root_dir is not None and root_dir.git_hash:
+                if not replace:
+                    raise click.ClickException('Дерево проекта уже '
+                            'загружено, используйте --replace')
+                # Старое дерево удаляется командой collect-garbage
+                p.generation += 1
+                db.session.commit()
+
+            def progress(files, summary):
+                print('%d файлов, %.1f файлов/с, %.2f МБ/с' % (files, 
+                    summary['files_per_second'], summary['mb_per_second']))
+
+            summary = webhook.add_local_tree_to_db(path, p.id, workers, 
+                    progress)
+            print('Загружено файлов: %d, %.1f МБ за %.1f с: %.1f файлов/с, '
+                    '%.2f МБ/с' % (summary['files'], 
+                        summary['bytes'] / (1024 * 1024), 
+                        summary['duration'], summary['files_per_second'], 
+                        summary['mb_per_second']))
+
+    @app.cli.command('reanalyze')
+    @click.argument('project', required=False)
+    @click.option('--checkout', type=click.Path(exists=True, file_okay=False),
+            help='Локальная копия репозитория с содержимым файлов')
+    @click.option('--workers', type=int, default=None,
+            help='Количество процессов анализа')
+    @click.option('--batch-size', type=int, default=None,
+            help='Количество файлов в одной транзакции')
+    @click.option('--pause', type=float, default=None,
+            help='Пауза между транзакциями в секундах')
+    def reanalyze(project, checkout, workers, batch_size, pause):
+        """Повторно анализирует файлы с результатами устаревших версий 
+        анализаторов в проекте PROJECT (<пользователь>/<проект>) или во 
+        всех проектах."""
+        from flaskr import reanalysis
+        from flaskr.models import Project
+        from flaskr.models import User
+
+        def progress(summary):
+            print('%d из %d файлов, нет содержимого: %d, %.1f файлов/с' % (
+                summary['files'] + summary['missing'], summary['stale'], 
+                summary['missing'], summary['files_per_second']))
+
+        with app.app_context():
+            query = Project.query.join(User, User.id == Project.user_id)
+            if project is not None:
+                username, _, project_name = project.partition('/')
+                query = query.filter(User.username == username, 
+                        Project.project_name == project_name)
+            projects = [(p.id, '%s/%s' % (p.user.username, p.project_name))
+                    for p in query.order_by(Project.id)]
+            if project is not None and not projects:
+                raise click.ClickException('Проект %s не найден' % project)
+
+            for project_id, name in projects:
+                summary = reanalysis.reanalyze(
+                        db.session.get(Project, project_id), checkout, 
+                        workers, batch_size, pause, progress)
+                if summary is None:
+                    print('%s: дерево не загружено или загружается' % name)
+                    continue
+                print('%s: проанализировано файлов: %d за %.1f с, '
+                        'нет содержимого: %d' % (name, summary['files'], 
+                            summary['duration'], summary['missing']))
+
+    @app.cli.command('collect-garbage')
+    def collect_garbage():
+        """Удаляет деревья прошлых поколений всех проектов."""
+        from flaskr import collector
+
+        with app.app_context():
+            print('Удалено строк: %d' % collector.collect())
+
+    @app.cli.command('prune-blobs')
+    @click.option('--max-size', type=int, default=None,
+            help='Максимальный размер хранилища в байтах')
+    def prune_blobs(max_size):
+        """Удаляет давно не используемые файлы хранилища содержимого."""
+        from flaskr import blobstore
+
+        with app.app_context():
+            print('Удалено байт: %d' % blobstore.evict(max_size))
+
+    app.register_blueprint(main)
+    app.register_blueprint(auth)
+    app.register_blueprint(api_bp)
+    app.register_blueprint(filters)
+
+    return app
+
 
 @event.listens_for(Engine, "connect")
 def set_sqlite_pragma(dbapi_connection, connection_record):
     cursor = dbapi_connection.cursor()
     cursor.execute("PRAGMA foreign_keys=ON")
     cursor.close()
-
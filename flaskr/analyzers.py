@@ -0,0 +1,159 @@
+"""Модуль **analyzers** содержит реестр анализаторов исходного кода.
+Реестр сопоставляет расширению файла список анализаторов, которые
+запускаются для файлов с этим расширением.
+
+Анализаторы - это функции вида ``func(path, content)``, которые
+возвращают результат анализа в виде простых типов (словари, строки,
+числа). Анализаторы не работают с БД и контекстом приложения, поэтому
+их можно запускать параллельно в отдельных процессах.
+
+У каждого анализатора есть версия (см. :func:`analyzer_version`),
+которой помечаются сохраненные результаты анализа. После обновления
+пакета анализатора результаты с прошлой версией пересчитываются
+командой ``flask reanalyze`` (см. :mod:`flaskr.reanalysis`).
+
+:Встроенные анализаторы:
+   * *raw* - LOC метрики (пакет *metrics*)
+   * *halstead* - метрики Холстеда (пакет *metrics*)
+   * *cfg* - графы потока управления функций (пакет *visualization*)
+"""
+import importlib
+import os
+from importlib import metadata
+
+#: Словарь с зарегистрированными анализаторами {имя: функция}
+_analyzers = {}
+#: Словарь с анализаторами для расширений {расширение: (имя, ...)}
+_extensions = {}
+#: Словарь с версиями анализаторов {имя: строка или функция без
+#: параметров, которая возвращает строку}
+_versions = {}
+
+
+def register_analyzer(name, func, extensions=(), version='0'):
+    """Регистрирует анализатор *func* с именем *name* и добавляет его к
+    расширениям *extensions*. Анализаторы расширения запускаются в
+    порядке регистрации.
+
+    :param str name: имя анализатора
+    :param func: функция анализатора ``func(path, content)``
+    :param extensions: расширения файлов с точкой (регистр учитывается)
+    :param version: версия анализатора - строка или функция без
+        параметров, которая вызывается при первом запросе версии (см.
+        :func:`package_version`)
+    """
+    _analyzers[name] = func
+    _versions[name] = version
+
+    for ext in extensions:
+        names = _extensions.get(ext, ())
+        if name not in names:
+            _extensions[ext] = names + (name,)
+
+
+def analyzers_for(path):
+    """Возвращает имена анализаторов для файла *path*.
+
+    :param str path: путь или имя файла
+    :returns: кортеж с именами анализаторов, пустой, если файл не анализируется
+    :rtype: tuple
+    """
+    return _extensions.get(os.path.splitext(path)[1], ())
+
+
+def analyzer_version(name):
+    """Возвращает версию анализатора *name*, которой помечаются
+    результаты анализа в БД.
+
+    :param str name: имя анализатора
+    :rtype: str
+    """
+    version = _versions[name]
+    if callable(version):
+        version = _versions[name] = version()
+    return version
+
+
+def package_version(package, revision=1):
+    """Возвращает функцию, которая вычисляет версию анализатора из
+    версии пакета *package* и ревизии *revision* функции анализатора.
+
+    Версия пакета берется из метаданных установленного дистрибутива, а
+    если их нет - из атрибута ``__version__`` пакета.
+
+    :param str package: имя пакета
+    :param int revision: ревизия функции анализатора, увеличивается при
+        изменении формата результата
+    :returns: функция без параметров для параметра *version*
+        :func:`register_analyzer`
+    """
+    def version():
+        try:
+            package_version = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            package_version = getattr(importlib.import_module(package),
+                    '__version__', '0')
+        return '%s-%s.%d' % (package, package_version, revision)
+
+    return version
+
+
+def run_analyzer(name, path, content):
+    """Запускает анализатор *name* для файла *path* с содержимым *content*.
+
+    :param str name: имя анализатора
+    :param str path: путь к файлу
+    :param str content: содержимое файла
+    :returns: результат анализа
+    """
+    return _analyzers[name](path, content)
+
+
+def analyze(path, content, names=None):
+    """Запускает анализаторы для файла *path* с содержимым *content*.
+
+    :param str path: путь к файлу
+    :param str content: содержимое файла
+    :param names: имена анализаторов, по умолчанию анализаторы расширения файла
+    :returns: словарь {имя анализатора: результат}
+    :rtype: dict
+    """
+    if names is None:
+        names = analyzers_for(path)
+
+    return {name: run_analyzer(name, path, content) for name in names}
+
+
+def _raw(path, content):
+    from metrics import raw
+
+    m = raw.analyze_code(path, content)
+    return {'loc': m.loc, 'lloc': m.lloc, 'ploc': m.ploc,
+            'comments': m.comments, 'blanks': m.blanks}
+
+
+def _halstead(path, content):
+    from metrics import halstead
+
+    m = halstead.analyze_code(path, content)
+    return {'unique_n1': m.n1, 'unique_n2': m.n2,
+            'total_n1': m.N1, 'total_n2': m.N2}
+
+
+def _cfg(path, content):
+    from visualization import graph
+
+    return dict(graph.cfg_for_code(content, path))
+
+
+#: Расширения исходных файлов на языке C (и C++: *.C*, *.cc*)
+C_SOURCES = ('.c', '.C', '.cc')
+#: Расширения заголовочных и включаемых файлов, для которых не строятся
+#: графы потока управления
+C_HEADERS = ('.h', '.H', '.inc')
+
+register_analyzer('raw', _raw, C_SOURCES + C_HEADERS,
+        package_version('metrics'))
+register_analyzer('halstead', _halstead, C_SOURCES + C_HEADERS,
+        package_version('metrics'))
+register_analyzer('cfg', _cfg, C_SOURCES, package_version('visualization'))
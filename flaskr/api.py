@@ -20,9 +20,22 @@ from flask import request
 from flask import url_for
 from sqlalchemy.exc import IntegrityError
 from flask_restx import inputs
-from flaskr import webhook
 from flask import current_app
 import datetime
+from contextlib import closing
+from flaskr import collector
+from flaskr import history
+from flaskr import search
+from flaskr import hotspots
+from flaskr import distributions
+from flaskr import dot
+from flaskr import lod
+from flaskr import compression
+from flaskr import treeindex
+from flaskr.filters import dir_path
+from flask import Response
+from flask import stream_with_context
+import json
 
 #: **api_bp** - это Blueprint, который содержит представления ресурсов API приложения.
 #:
@@ -246,6 +259,8 @@ class Webhook(Resource):
 
         Обрабатывает PUT запрос, который сбрасывает веб-хук в зависимости от параметра *reset*. В случае успеха, возвращает представление.
 
+        При сбросе увеличивается поколение проекта, поэтому старое дерево сразу становится недоступным, а его строки удаляются в фоне (см. :mod:`flaskr.collector`). Аренда проекта отзывается (см. :func:`flaskr.delivery.revoke`), поэтому выполняющаяся загрузка старого веб-хука прерывается, а новый веб-хук можно подключить, не дожидаясь окончания загрузки и удаления.
+
         :Поля представления:
            * *message* (*str*) - сообщение об проведенной операции
         """
@@ -259,10 +274,21 @@ class Webhook(Resource):
 
         if args['reset']:
             if project.hook_id is not None:
-                Directory.query.filter_by(dir_name=None, project_id=project.id).delete()
+                from flaskr import delivery
+
+                # Старое дерево отсоединяется сменой поколения и удаляется 
+                # сборщиком в фоне
+                project.generation += 1
+                flaskr.models.IngestionJob.query.filter_by(
+                        project_id=project.id, 
+                        status='running').update({'status': 'reset'})
+                # Загрузка старого веб-хука прерывается, ping нового 
+                # веб-хука не ждет ее окончания
+                delivery.revoke(project.id)
                 project.hook_id = None
                 project.update_time = datetime.datetime.utcnow()
                 db.session.commit()
+                collector.start()
                 return {'message': 'Хук был успешно сброшен. Теперь к проекту можно подключить новый веб-хук.', 'self-url': self._get_self_url(username, project_name)}, 200
         else:
             if project.hook_id is not None:
@@ -293,6 +319,14 @@ class Webhook(Resource):
                         'description': 'URL ветвей репозитория',
                         'type': 'string'
                     },
+                    'clone_url': {
+                        'description': 'URL для клонирования репозитория',
+                        'type': 'string'
+                    },
+                    'archive_url': {
+                        'description': 'URL архивов репозитория',
+                        'type': 'string'
+                    },
                     'git_commits_url': {
                         'description': 'URL коммитов репозитория',
                         'type': 'string'
@@ -309,17 +343,21 @@ class Webhook(Resource):
     })
 
     @api.response(200, 'Success')
+    @api.response(202, 'Загрузка проекта уже выполняется')
     @api.response(404, 'Проекта не существует')
     @api.response(403, 'Хук уже подключен')
     @api.response(406, 'Неправильные заголовки в запросе')
     @api.param('X-GitHub-Event', 'Название события, которое запустило веб-хук', _in='header', required=True)
     @api.param('X-GitHub-Hook-ID', 'Идентификатор веб-хука', _in='header', required=True)
+    @api.param('X-GitHub-Delivery', 'Идентификатор доставки события, повторные доставки отбрасываются', _in='header')
     @api.expect(post_model, validate=True)
     def post(self, username, project_name): 
         """Обрабатывает разные события Github веб-хука.
 
         Обрабатывает POST запрос, который обрабатывает разные события веб-хука Github в зависимости заголовка *X-GitHub-Event*. В случае успеха, возвращает представление cо статусом веб-хука и ссылкой на самого себя.
 
+        Повторные доставки события (заголовок *X-GitHub-Delivery*) отбрасываются. Доставка запоминается после проверки веб-хука, а если загрузка завершилась ошибкой или ping не был обработан из-за выполняющейся загрузки, то доставка забывается, и ее можно повторить. Загрузки одного проекта сериализуются арендой проекта (см. :mod:`flaskr.delivery`): событие push, пришедшее во время загрузки, возвращает статус 202, а его коммит загружается после завершения текущей загрузки. Несколько таких событий сводятся к одной загрузке самого нового коммита.
+
         :Поля представления:
            * *message* (*str*) - сообщение о статусе веб-хука
            * *self_url* (*str*) - ссылка на самого себя
@@ -330,38 +368,198 @@ class Webhook(Resource):
         if not project:
             return {'message': 'Проекта с указанным названием не существует.'}, 404
 
+        from flaskr import webhook
+        from flaskr import delivery
+
         event = request.headers['X-GitHub-Event']        
         hook_id = request.headers['X-GitHub-Hook-ID']
-        if event == 'ping':
-            if not project.hook_id:
-                #project.hook_id = api.payload['hook_id']
-                project.hook_id = hook_id
-                db.session.commit()
-                commit = webhook.get_commit_of_default_branch(
-                        api.payload['repository'])
-                webhook.add_tree_objs_to_db(commit['commit']['tree']['url'], project.id)
+        delivery_id = request.headers.get('X-GitHub-Delivery')
+        tarball = current_app.config.get('INGESTION_SOURCE') == 'tarball'
 
-                return {'message': 'Хук успешно подключен.', 'hook_id': project.hook_id, 'self-url': self._get_self_url(username, project_name)}, 200
-            else:
+        if event == 'ping':
+            # Повторный ping того же веб-хука продолжает прерванную загрузку
+            resume = project.hook_id and project.hook_id == int(hook_id) \
+                    and not tarball \
+                    and webhook.get_unfinished_job(project.id) is not None
+            if project.hook_id and not resume:
                 return {'message': 'Хук уже подключен к проекту.'}, 403
 
         if event == 'push':
-            if project.hook_id and project.hook_id == int(hook_id):
-                after_commit = webhook.get_commit(
-                        api.payload['repository']['git_commits_url'], 
-                        api.payload['after']
-                        )
-                webhook.update_tree_objs_in_db(
-                        after_commit['tree']['url'], project.id)
-
-                return {'message': 'Событие push успешно обработано.', 'hook_id': project.hook_id, 'self-url': self._get_self_url(username, project_name)}, 200
-            else:
+            if not project.hook_id or project.hook_id != int(hook_id):
                 return {'message': 'Хук не подключен к проекту или был отправлено событие неверного веб-хука.'}, 403
 
+        # Доставка запоминается только после проверки веб-хука и 
+        # забывается, если событие не было обработано
+        if delivery_id and delivery.is_duplicate(delivery_id, project.id, 
+                event):
+            return {'message': 'Событие уже было получено.', 'hook_id': project.hook_id, 'self-url': self._get_self_url(username, project_name)}, 200
+
+        if event == 'ping':
+            lease = delivery.acquire(project.id)
+            if lease is None:
+                delivery.forget(delivery_id)
+                return {'message': 'Загрузка проекта уже выполняется.', 'hook_id': project.hook_id, 'self-url': self._get_self_url(username, project_name)}, 202
+
+            #project.hook_id = api.payload['hook_id']
+            project.hook_id = hook_id
+            db.session.commit()
+            project_id = project.id
+            generation = project.generation
+            try:
+                if tarball:
+                    webhook.add_tarball_to_db(webhook.get_tarball_url(
+                        api.payload['repository']), project_id)
+                else:
+                    with closing(webhook.get_source(project)) as source:
+                        tree_ref = source.tree_of_default_branch(
+                                api.payload['repository'])
+                        webhook.add_tree_objs_to_db(tree_ref, project_id, 
+                                source)
+                self._ingest_pending(lease, project_id)
+            except Exception:
+                self._reset_failed_ping(project_id, generation, tarball)
+                lease.abandon()
+                delivery.forget(delivery_id)
+                raise
+
+            return {'message': 'Хук успешно подключен.', 'hook_id': int(hook_id), 'self-url': self._get_self_url(username, project_name)}, 200
+
+        if event == 'push':
+            # Событие push во время загрузки откладывается, владелец 
+            # аренды загрузит самый новый отложенный коммит
+            lease = delivery.acquire(project.id, api.payload['after'],
+                    api.payload['repository'])
+            if lease is None:
+                return {'message': 'Загрузка проекта уже выполняется, коммит будет загружен после ее завершения.', 'hook_id': project.hook_id, 'self-url': self._get_self_url(username, project_name)}, 202
+
+            project_id = project.id
+            try:
+                webhook.update_to_commit(project_id, 
+                        api.payload['repository'], api.payload['after'])
+                self._ingest_pending(lease, project_id)
+            except Exception:
+                lease.abandon()
+                delivery.forget(delivery_id)
+                raise
+
+            return {'message': 'Событие push успешно обработано.', 'hook_id': int(hook_id), 'self-url': self._get_self_url(username, project_name)}, 200
+
+    def _reset_failed_ping(self, project_id, generation, tarball):
+        """Отключает веб-хук после ошибки загрузки по событию ping, если 
+        загрузку нельзя продолжить повторным ping, чтобы повторная 
+        доставка загрузила дерево заново. Частично загруженный архив 
+        отсоединяется сменой поколения (см. :mod:`flaskr.collector`). 
+        Если веб-хук был сброшен во время загрузки (поколение 
+        *generation* устарело), то проект не изменяется.
+        """
+        from flaskr import webhook
+
+        db.session.rollback()
+        project = db.session.get(Project, project_id)
+        if project.generation != generation:
+            return
+        root_dir = project.get_root_dir()
+        if root_dir is not None and root_dir.git_hash:
+            # Дерево загружено, ошибка при загрузке отложенного коммита
+            return
+        if not tarball and webhook.get_unfinished_job(project_id) is not None:
+            return
+
+        project.hook_id = None
+        if tarball:
+            project.generation += 1
+            flaskr.models.IngestionJob.query.filter_by(
+                    project_id=project_id, 
+                    status='running').update({'status': 'reset'})
+        db.session.commit()
+        if tarball:
+            collector.start()
+
+    def _ingest_pending(self, lease, project_id):
+        from flaskr import webhook
+
+        pending = lease.release()
+        while pending is not None:
+            sha, repository = pending
+            webhook.update_to_commit(project_id, repository, sha)
+            pending = lease.release()
+
     def _get_self_url(self, username, project_name):
         return '/{username}/{project_name}/webhook/github'.format(username=username, project_name=project_name) 
 
 
+@api.route('/<string:username>/<string:project_name>/policy')
+@api.doc(params={'username': 'Имя пользователя', 'project_name': 'Название проекта'}, description='Политика загрузки файлов проекта')
+class ProjectPolicy(Resource):
+    """Ресурс политики загрузки файлов проекта, URL ресурса: 
+    {username}/{project_name}/policy.
+
+    :Параметры запроса:
+       * *username* - имя пользователя
+       * *project_name* - название проекта
+    """
+    policy_model = api.model('Policy', {
+        'max_blob_size': fields.Integer(help='Максимальный размер анализируемого файла в байтах'),
+        'exclude_globs': fields.List(fields.String, help='Шаблоны путей файлов, которые не анализируются', attribute=lambda x: x.exclude_globs.splitlines() if x.exclude_globs is not None else None),
+        'use_gitattributes': fields.Boolean(help='Не анализировать файлы с атрибутом linguist-generated')
+    })
+
+    parser = reqparse.RequestParser()
+    parser.add_argument('max_blob_size', type=int, location='json',
+            help='Максимальный размер анализируемого файла в байтах')
+    parser.add_argument('exclude_globs', type=str, action='append',
+            location='json', help='Шаблоны путей файлов')
+    parser.add_argument('use_gitattributes', type=inputs.boolean,
+            location='json', help='Учитывать linguist-generated')
+
+    @api.response(200, 'Success', policy_model)
+    @api.response(404, 'Проекта не существует')
+    def get(self, username, project_name):
+        """Возвращает политику загрузки файлов проекта.
+
+        Обрабатывает GET запрос, возвращает представление политики с использованием модели :attr:`policy_model`. Поля со значением null означают, что используются настройки приложения.
+        """
+        user = User.query.filter_by(username=username).first()
+        project = Project.query.filter_by(user_id=user.id, project_name=project_name).first()
+
+        if not project:
+            return {'message': 'Проекта с указанным названием не существует.'}, 404
+
+        return marshal(project, ProjectPolicy.policy_model), 200
+
+    @api.doc(security='APITokenHeader')
+    @api.expect(parser)
+    @api.response(200, 'Success', policy_model)
+    @api.response(404, 'Проекта не существует')
+    @token_required
+    def put(self, username, project_name):
+        """Изменяет политику загрузки файлов проекта.
+
+        Обрабатывает PUT запрос, изменяет переданные поля политики. Политика применяется при следующей загрузке файлов проекта.
+
+        :param int max_blob_size: максимальный размер файла в байтах
+        :param list exclude_globs: шаблоны путей, например, vendor/** или *_generated.c
+        :param bool use_gitattributes: учитывать атрибут linguist-generated
+        """
+        args = ProjectPolicy.parser.parse_args()
+        user = User.query.filter_by(username=username).first()
+        project = Project.query.filter_by(user_id=user.id, project_name=project_name).first()
+
+        if not project:
+            return {'message': 'Проекта с указанным названием не существует.'}, 404
+
+        if args['max_blob_size'] is not None:
+            project.max_blob_size = args['max_blob_size']
+        if args['exclude_globs'] is not None:
+            project.exclude_globs = '\n'.join(args['exclude_globs'])
+        if args['use_gitattributes'] is not None:
+            project.use_gitattributes = args['use_gitattributes']
+
+        db.session.commit()
+
+        return marshal(project, ProjectPolicy.policy_model), 200
+
+
 @api.route('/<string:username>/<string:project_name>/<path:path>/metrics/<string:metrics_type>')
 @api.doc(params={'username': 'Имя пользователя', 'project_name': 'Название проекта', 'path': 'Путь к файлу', 'metrics_type': 'Вид метрик'}, description='Метрики файла')
 class Metrics(Resource):
@@ -424,22 +622,24 @@ class Metrics(Resource):
         dirs = parts[:-1]
         filename = parts[-1]
 
-        parent = Directory.query.filter_by(dir_name=None, project_id=project.id).first()
+        parent = project.get_root_dir()
 
         if not parent:
             return {'message': 'Веб-хук не был подключен к проекту.'}, 406
 
-        for child in dirs:
-            parent = Directory.query.filter_by(dir_parent_id=parent.id, dir_name=child).first()
+        parent = treeindex.resolve_dir(project, parent, '/'.join(dirs))
 
-            if not parent:
-                return {'message': 'Директории с указанным именем не существует.'}, 404
+        if not parent:
+            return {'message': 'Директории с указанным именем не существует.'}, 404
 
         f = File.query.filter_by(dir_id=parent.id, file_name=filename).first()
 
         if not f:
             return {'message': 'Файла с указанным именем не существует.'}, 404
 
+        if f.skip_reason:
+            return {'message': 'Файл не был проанализирован.', 'skip_reason': f.skip_reason}, 404
+
         if metrics_type == 'raw':
             return marshal(f.raw_metrics, Metrics.raw_metrics_model), 200
         elif metrics_type == 'halstead':
@@ -460,29 +660,47 @@ class GraphVisualization(Resource):
        * *project_name* - название проекта
        * *path* - путь к файлу
        * *graph_type* - вид графа (cfg,..)
+       * *include_dot* - возвращать ли описания графов, по умолчанию true
+       * *func_name* - имя функции, если нужен граф одной функции
 
     :Вид метрик:
        * *cfg* - граф потока управления
     """
+    parser = reqparse.RequestParser()
+    parser.add_argument('include_dot', type=inputs.boolean, default=True, 
+            location='args', help='Возвращать ли описания графов')
+    parser.add_argument('func_name', location='args', help='Имя функции')
+
     graph_model = api.model('Graph', {
         'func_name': fields.String(required=True, help='Имя функции'),
         'type': fields.String(required=True, help='Тип графа', attribute='graph_type'),
         'dot': fields.String(required=True, help='Представление графа в DOT формате', attribute='graph_dot'),
     })
 
+    function_model = api.model('GraphFunction', {
+        'func_name': fields.String(required=True, help='Имя функции'),
+        'type': fields.String(required=True, help='Тип графа', attribute='graph_type'),
+        'size': fields.Integer(required=True, help='Размер представления графа в DOT формате', attribute='dot_size'),
+    })
+
     @api.response(200, 'Success')
     @api.response(404, 'Проекта не существует')
     @api.response(406, 'Веб-хук не был подключен')
+    @api.expect(parser)
     def get(self, username, project_name, path, graph_type):
         """Возвращает представление с графовыми визуализациями файла.
 
         Обрабатывает GET запрос, возвращает представление с графовыми визуализацями для каждой функции файла. Тип графа указывается при помощи параметра *graph_type*. 
 
+        Если *include_dot* равен false, то описания графов не загружаются из базы данных и возвращаются только имена функций и размеры графов, а граф нужной функции запрашивается с параметром *func_name*.
+
         :Поля представления:
            * func_name (*str*) - имя функции
            * type (*str*) - тип графа (CFG,..)
            * dot (*str*) - представление графа в DOT формате
+           * size (*int*) - размер представления графа в DOT формате, вместо поля dot, если *include_dot* равен false
         """
+        args = GraphVisualization.parser.parse_args()
         user = User.query.filter_by(username=username).first()
         project = Project.query.filter_by(user_id=user.id, project_name=project_name).first()
 
@@ -493,16 +711,15 @@ class GraphVisualization(Resource):
         dirs = parts[:-1]
         filename = parts[-1]
 
-        parent = Directory.query.filter_by(dir_name=None, project_id=project.id).first()
+        parent = project.get_root_dir()
 
         if not parent:
             return {'message': 'Веб-хук не был подключен к проекту.'}, 406
 
-        for child in dirs:
-            parent = Directory.query.filter_by(dir_parent_id=parent.id, dir_name=child).first()
+        parent = treeindex.resolve_dir(project, parent, '/'.join(dirs))
 
-            if not parent:
-                return {'message': 'Директории с указанным именем не существует.'}, 404
+        if not parent:
+            return {'message': 'Директории с указанным именем не существует.'}, 404
 
         f = File.query.filter_by(dir_id=parent.id, file_name=filename).first()
 
@@ -511,14 +728,571 @@ class GraphVisualization(Resource):
 
 
         if graph_type == 'cfg':
-            vizs = flaskr.models.GraphVisualization.query.filter_by(
-                    file_id=f.id,
-                    graph_type=flaskr.models.GraphType.CFG).all()
+            # Графы файла определяются проектом, Git хешем файла и 
+            # ревизией результатов анализа проекта (графы одного blob'а 
+            # в разных проектах могут быть построены разными версиями 
+            # анализатора), поэтому сжатый ответ отдается из кеша без 
+            # обращения к графам в базе данных
+            response = compression.cached(('graph', project.id, f.git_hash, 
+                project.analysis_revision, graph_type, args['include_dot'], 
+                args['func_name']))
+            if response is not None:
+                return response
+
+            if not args['include_dot']:
+                functions = flaskr.models.GraphVisualization.functions(f.id)
+                if args['func_name'] is not None:
+                    functions = [v for v in functions 
+                            if v.func_name == args['func_name']]
+                return marshal(functions, 
+                        GraphVisualization.function_model), 200
+
+            query = flaskr.models.GraphVisualization.query.options(
+                    db.undefer(flaskr.models.GraphVisualization.graph_dot))\
+                    .filter_by(file_id=f.id, 
+                            graph_type=flaskr.models.GraphType.CFG)
+            if args['func_name'] is not None:
+                query = query.filter_by(func_name=args['func_name'])
+            vizs = query.order_by(flaskr.models.GraphVisualization.id).all()
             return marshal(vizs, GraphVisualization.graph_model), 200
         else:
             return {'message': 'Указанный тип графа не построен для данного файла'}, 404
 
 
+@api.route('/<string:username>/<string:project_name>/<path:path>/visualization/summary/<string:graph_type>')
+@api.doc(params={'username': 'Имя пользователя', 'project_name': 'Название проекта', 'path': 'Путь к файлу', 'graph_type': 'Вид графа'}, description='Сокращенное представление графа функции')
+class GraphSummary(Resource):
+    """Ресурс сокращенного представления графа функции (см. 
+    :mod:`flaskr.lod`), URL ресурса: 
+    {username}/{project_name}/{path}/visualization/summary/{graph_type}.
+
+    :Параметры запроса:
+       * *username* - имя пользователя
+       * *project_name* - название проекта
+       * *path* - путь к файлу
+       * *graph_type* - вид графа (cfg)
+    """
+    parser = reqparse.RequestParser()
+    parser.add_argument('func_name', required=True, location='args',
+            help='Имя функции')
+    parser.add_argument('expand', action='append', default=[], 
+            location='args', help='Идентификаторы раскрытых вершин')
+    parser.add_argument('budget', type=inputs.int_range(1, 5000), 
+            location='args', help='Максимальное количество видимых вершин')
+
+    @api.response(200, 'Success')
+    @api.response(404, 'Проекта, файла или функции не существует')
+    @api.response(406, 'Веб-хук не был подключен')
+    @api.response(422, 'Граф функции не удалось разобрать')
+    @api.expect(parser)
+    def get(self, username, project_name, path, graph_type):
+        """Возвращает сокращенное представление графа функции.
+
+        Обрабатывает GET запрос, возвращает граф, в котором циклы, цепочки блоков и параллельные ветви свернуты в вершины, а вершины сверх бюджета объединены в одну. Свернутые вершины раскрываются параметром *expand*, поэтому клиент получает только видимую часть графа.
+
+        :Поля представления:
+           * *nodes* (*list*) - вершины {id, label, shape, kind, size, expandable}
+           * *edges* (*list*) - ребра {source, target, label}
+           * *total* (*int*) - количество вершин исходного графа
+           * *budget* (*int*) - бюджет вершин
+
+        Граф, который помещается в бюджет, возвращается полностью в формате :func:`flaskr.dot.parse`.
+        """
+        args = GraphSummary.parser.parse_args()
+        user = User.query.filter_by(username=username).first()
+        project = Project.query.filter_by(user_id=user.id, project_name=project_name).first()
+
+        if not project:
+            return {'message': 'Проекта с указанным названием не существует.'}, 404
+
+        if graph_type != 'cfg':
+            return {'message': 'Указанный тип графа не построен для данного файла'}, 404
+
+        parts = path.split('/')
+        parent = project.get_root_dir()
+
+        if not parent:
+            return {'message': 'Веб-хук не был подключен к проекту.'}, 406
+
+        parent = treeindex.resolve_dir(project, parent, '/'.join(parts[:-1]))
+
+        if not parent:
+            return {'message': 'Директории с указанным именем не существует.'}, 404
+
+        f = File.query.filter_by(dir_id=parent.id, file_name=parts[-1]).first()
+
+        if not f:
+            return {'message': 'Файла с указанным именем не существует.'}, 404
+
+        budget = args['budget'] or current_app.config['CFG_LOD_BUDGET']
+        response = compression.cached(('summary', project.id, f.git_hash, 
+            project.analysis_revision, args['func_name'], budget, tuple(args['expand'])))
+        if response is not None:
+            return response
+
+        text = flaskr.models.GraphVisualization.get_dot(f.id, 
+                args['func_name'])
+
+        if text is None:
+            return {'message': 'Функции с указанным именем не существует.'}, 404
+
+        try:
+            graph = dot.parse(text)
+        except dot.DotSyntaxError:
+            return {'message': 'Граф функции не удалось разобрать.'}, 422
+
+        return lod.summarize(graph, budget, args['expand']), 200
+
+
+@api.route('/<string:username>/<string:project_name>/<path:path>/visualization/image/<string:graph_type>')
+@api.doc(params={'username': 'Имя пользователя', 'project_name': 'Название проекта', 'path': 'Путь к файлу', 'graph_type': 'Вид графа'}, description='Изображение графа функции в SVG')
+class GraphImage(Resource):
+    """Ресурс изображения графа функции в формате SVG, URL ресурса: 
+    {username}/{project_name}/{path}/visualization/image/{graph_type}.
+
+    Граф отрисовывается в пуле отрисовки (см. :func:`flaskr.render.render_svg`),
+    большой граф сокращается (см. :mod:`flaskr.lod`). Сжатое изображение 
+    кешируется по Git хешу файла (см. :mod:`flaskr.compression`), 
+    поэтому повторный запрос не отрисовывает граф заново.
+
+    :Параметры запроса:
+       * *username* - имя пользователя
+       * *project_name* - название проекта
+       * *path* - путь к файлу
+       * *graph_type* - вид графа (cfg)
+    """
+    parser = GraphSummary.parser.copy()
+
+    @api.response(200, 'Success')
+    @api.response(404, 'Проекта, файла или функции не существует')
+    @api.response(406, 'Веб-хук не был подключен')
+    @api.response(422, 'Граф функции не удалось отрисовать')
+    @api.response(503, 'Пул отрисовки занят')
+    @api.expect(parser)
+    def get(self, username, project_name, path, graph_type):
+        """Возвращает изображение графа функции в формате SVG.
+
+        Обрабатывает GET запрос, возвращает изображение графа функции *func_name*. Граф, в котором больше *budget* вершин, отрисовывается в сокращенном виде, параметр *expand* раскрывает свернутые вершины (см. :class:`GraphSummary`).
+        """
+        from flaskr import render
+
+        args = GraphImage.parser.parse_args()
+        user = User.query.filter_by(username=username).first()
+        project = Project.query.filter_by(user_id=user.id, project_name=project_name).first()
+
+        if not project:
+            return {'message': 'Проекта с указанным названием не существует.'}, 404
+
+        if graph_type != 'cfg':
+            return {'message': 'Указанный тип графа не построен для данного файла'}, 404
+
+        parts = path.split('/')
+        parent = project.get_root_dir()
+
+        if not parent:
+            return {'message': 'Веб-хук не был подключен к проекту.'}, 406
+
+        parent = treeindex.resolve_dir(project, parent, '/'.join(parts[:-1]))
+
+        if not parent:
+            return {'message': 'Директории с указанным именем не существует.'}, 404
+
+        f = File.query.filter_by(dir_id=parent.id, file_name=parts[-1]).first()
+
+        if not f:
+            return {'message': 'Файла с указанным именем не существует.'}, 404
+
+        budget = args['budget'] or current_app.config['CFG_LOD_BUDGET']
+        response = compression.cached(('image', project.id, f.git_hash, 
+            project.analysis_revision, args['func_name'], budget, tuple(args['expand'])))
+        if response is not None:
+            return response
+
+        text = flaskr.models.GraphVisualization.get_dot(f.id, 
+                args['func_name'])
+
+        if text is None:
+            return {'message': 'Функции с указанным именем не существует.'}, 404
+
+        summary = render.summarize_dot(text, budget, args['expand'])
+        if summary is not None:
+            text = dot.to_dot(summary)
+
+        svg, status = render.render_svg(text)
+
+        if svg is None:
+            code = 503 if status in ('busy', 'timeout') else 422
+            return {'message': 'Граф функции не удалось отрисовать.', 
+                    'status': status}, code
+
+        return Response(svg, mimetype='image/svg+xml')
+
+
+@api.route('/<string:username>/<string:project_name>/ingestions')
+@api.doc(params={'username': 'Имя пользователя', 'project_name': 'Название проекта'}, description='Задания загрузки проекта')
+class Ingestions(Resource):
+    """Ресурс заданий загрузки (ingestion) дерева репозитория, URL 
+    ресурса: {username}/{project_name}/ingestions.
+
+    :Параметры запроса:
+       * *username* - имя пользователя
+       * *project_name* - название проекта
+    """
+    file_trace_model = api.model('FileTrace', {
+        'path': fields.String(required=True, help='Путь к файлу'),
+        'blob_size': fields.Integer(help='Размер файла в байтах'),
+        'dot_size': fields.Integer(help='Размер графов в DOT формате в байтах'),
+        'fetch_time': fields.Float(help='Время получения файла'),
+        'decode_time': fields.Float(help='Время декодирования файла'),
+        'raw_time': fields.Float(help='Время вычисления LOC метрик'),
+        'halstead_time': fields.Float(help='Время вычисления метрик Холстеда'),
+        'cfg_time': fields.Float(help='Время построения CFG'),
+        'db_time': fields.Float(help='Время записи в БД'),
+        'total_time': fields.Float(help='Общее время обработки файла')
+    })
+
+    job_model = api.model('IngestionJob', {
+        'id': fields.Integer(required=True, help='Идентификатор задания'),
+        'git_hash': fields.String(required=True, help='Git хеш дерева'),
+        'start_time': fields.DateTime(dt_format='rfc822'),
+        'duration': fields.Float(help='Длительность загрузки в секундах'),
+        'files_count': fields.Integer(help='Количество файлов'),
+        'bytes_count': fields.Integer(help='Размер файлов в байтах'),
+        'files_per_second': fields.Float(help='Файлов в секунду'),
+        'mb_per_second': fields.Float(help='Мегабайт в секунду'),
+        'slowest': fields.List(fields.Nested(file_trace_model), attribute=lambda x: x.slowest_files())
+    })
+
+    parser = reqparse.RequestParser()
+    parser.add_argument('limit', type=int, default=10, location='args',
+            help='Количество последних заданий')
+
+    @api.response(200, 'Success')
+    @api.response(404, 'Проекта не существует')
+    @api.expect(parser)
+    def get(self, username, project_name):
+        """Возвращает последние задания загрузки проекта.
+
+        Обрабатывает GET запрос, возвращает список последних заданий загрузки с пропускной способностью и самыми медленными файлами каждого задания.
+        """
+        args = Ingestions.parser.parse_args()
+        user = User.query.filter_by(username=username).first()
+        project = Project.query.filter_by(user_id=user.id, project_name=project_name).first()
+
+        if not project:
+            return {'message': 'Проекта с указанным названием не существует.'}, 404
+
+        jobs = flaskr.models.IngestionJob.query.filter_by(
+                project_id=project.id).order_by(
+                flaskr.models.IngestionJob.id.desc()).limit(args['limit']).all()
+        return marshal(jobs, Ingestions.job_model), 200
+
+
+
+@api.route('/<string:username>/<string:project_name>/history')
+@api.doc(params={'username': 'Имя пользователя', 'project_name': 'Название проекта'}, description='История метрик проекта')
+class History(Resource):
+    """Ресурс истории метрик проекта по коммитам (см. 
+    :mod:`flaskr.history`), URL ресурса: 
+    {username}/{project_name}/history.
+
+    :Параметры запроса:
+       * *username* - имя пользователя
+       * *project_name* - название проекта
+    """
+    snapshot_model = api.model('CommitSnapshot', {
+        'id': fields.Integer(required=True, help='Идентификатор снимка'),
+        'commit_sha': fields.String(help='SHA коммита'),
+        'tree_sha': fields.String(required=True, help='Git хеш дерева'),
+        'is_full': fields.Boolean(help='Признак полного снимка'),
+        'create_time': fields.DateTime(dt_format='rfc822')
+    })
+
+    delta_model = api.model('MetricsDelta', {
+        'snapshot': fields.Nested(snapshot_model),
+        'git_hash': fields.String(required=True, help='Git хеш файла'),
+        'skipped': fields.Boolean(help='Признак того, что файл не был проанализирован'),
+        'loc': fields.Integer(help='Общее количество строк кода'),
+        'lloc': fields.Integer(help='Количество логических строк кода'),
+        'ploc': fields.Integer(help='Количество физических строк кода'),
+        'comments': fields.Integer(help='Количество строк комментариев'),
+        'blanks': fields.Integer(help='Количество пустых строк'),
+        'unique_n1': fields.Integer(help='Количество уникальных операторов'),
+        'unique_n2': fields.Integer(help='Количество уникальных операндов'),
+        'total_n1': fields.Integer(help='Общее количество операторов'),
+        'total_n2': fields.Integer(help='Общее количество операндов')
+    })
+
+    parser = reqparse.RequestParser()
+    parser.add_argument('path', location='args',
+            help='Путь к файлу, для которого возвращается история метрик')
+    parser.add_argument('limit', type=int, default=50, location='args',
+            help='Количество последних снимков')
+
+    @api.response(200, 'Success')
+    @api.response(404, 'Проекта не существует')
+    @api.expect(parser)
+    def get(self, username, project_name):
+        """Возвращает историю метрик проекта.
+
+        Обрабатывает GET запрос, возвращает последние снимки метрик текущего поколения дерева проекта. Если указан параметр *path*, то возвращает метрики файла на тех коммитах, в которых файл изменялся.
+        """
+        args = History.parser.parse_args()
+        user = User.query.filter_by(username=username).first()
+        project = Project.query.filter_by(user_id=user.id, project_name=project_name).first()
+
+        if not project:
+            return {'message': 'Проекта с указанным названием не существует.'}, 404
+
+        CommitSnapshot = flaskr.models.CommitSnapshot
+        MetricsDelta = flaskr.models.MetricsDelta
+
+        if args['path'] is None:
+            snapshots = CommitSnapshot.query.filter_by(project_id=project.id,
+                    generation=project.generation).order_by(
+                    CommitSnapshot.id.desc()).limit(args['limit']).all()
+            return marshal(snapshots, History.snapshot_model), 200
+
+        deltas = MetricsDelta.query.join(CommitSnapshot).filter(
+                CommitSnapshot.project_id == project.id,
+                CommitSnapshot.generation == project.generation,
+                MetricsDelta.path == args['path']).order_by(
+                MetricsDelta.snapshot_id.desc()).limit(args['limit']).all()
+        return marshal(deltas, History.delta_model), 200
+
+
+@api.route('/<string:username>/<string:project_name>/diff')
+@api.doc(params={'username': 'Имя пользователя', 'project_name': 'Название проекта'}, description='Изменение метрик между коммитами')
+class Diff(Resource):
+    """Ресурс изменения метрик проекта между двумя коммитами, URL 
+    ресурса: {username}/{project_name}/diff.
+
+    Изменение вычисляется по снимкам метрик коммитов (см. 
+    :func:`flaskr.history.diff`) без повторного анализа файлов.
+
+    :Параметры запроса:
+       * *username* - имя пользователя
+       * *project_name* - название проекта
+    """
+    parser = reqparse.RequestParser()
+    parser.add_argument('from', required=True, location='args',
+            help='SHA исходного коммита или дерева')
+    parser.add_argument('to', required=True, location='args',
+            help='SHA конечного коммита или дерева')
+
+    @api.response(200, 'Success')
+    @api.response(404, 'Проекта или снимка коммита не существует')
+    @api.expect(parser)
+    def get(self, username, project_name):
+        """Возвращает изменение метрик между коммитами.
+
+        Обрабатывает GET запрос, возвращает изменения LOC метрик и метрик Холстеда для каждого измененного файла и каждой директории, а также функции, граф потока управления которых изменился. Ответ передается потоком, поэтому большие изменения не собираются в памяти.
+
+        :Поля представления:
+           * *from* (*str*) - SHA исходного коммита
+           * *to* (*str*) - SHA конечного коммита
+           * *files* (*list*) - изменения файлов (см. :func:`flaskr.history.diff`)
+           * *directories* (*dict*) - суммарные изменения метрик директорий {путь: разница метрик и количество измененных файлов *files*}
+        """
+        args = Diff.parser.parse_args()
+        user = User.query.filter_by(username=username).first()
+        project = Project.query.filter_by(user_id=user.id, project_name=project_name).first()
+
+        if not project:
+            return {'message': 'Проекта с указанным названием не существует.'}, 404
+
+        snapshots = []
+        for ref in (args['from'], args['to']):
+            snapshot = history.find_snapshot(project, ref)
+            if snapshot is None:
+                return {'message': 'Снимка метрик для коммита %s не существует.' % ref}, 404
+            snapshots.append(snapshot)
+
+        def generate():
+            directories = {}
+
+            yield '{"from": %s, "to": %s, "files": [' % (
+                    json.dumps(args['from']), json.dumps(args['to']))
+
+            for i, change in enumerate(history.diff(*snapshots)):
+                yield (',' if i else '') + json.dumps(change)
+
+                parts = change['path'].split('/')[:-1]
+                for depth in range(len(parts) + 1):
+                    rollup = directories.setdefault(
+                            ''.join(part + '/' for part in parts[:depth]),
+                            dict.fromkeys(history.METRICS + ('files',), 0))
+                    rollup['files'] += 1
+                    for name, value in change['delta'].items():
+                        rollup[name] += value
+
+            yield '], "directories": %s}' % json.dumps(directories)
+
+        return Response(stream_with_context(generate()), 
+                mimetype='application/json')
+
+
+@api.route('/<string:username>/<string:project_name>/search')
+@api.doc(params={'username': 'Имя пользователя', 'project_name': 'Название проекта'}, description='Поиск функций и файлов проекта')
+class Search(Resource):
+    """Ресурс поиска функций и файлов проекта (см. :mod:`flaskr.search`), 
+    URL ресурса: {username}/{project_name}/search.
+
+    :Параметры запроса:
+       * *username* - имя пользователя
+       * *project_name* - название проекта
+    """
+    result_model = api.model('SearchResult', {
+        'kind': fields.String(required=True, help='Тип: file или function'),
+        'name': fields.String(required=True, help='Имя функции или файла'),
+        'path': fields.String(required=True, help='Путь к файлу'),
+        'file_id': fields.Integer(help='Идентификатор файла'),
+        'score': fields.Float(help='Релевантность, 1.0 - совпадение по префиксу')
+    })
+
+    parser = reqparse.RequestParser()
+    parser.add_argument('q', required=True, location='args',
+            help='Строка запроса, префикс или часть имени')
+    parser.add_argument('kind', choices=search.KINDS, location='args',
+            help='Тип результатов: file или function')
+    parser.add_argument('limit', type=int, default=20, location='args',
+            help='Максимальное количество результатов')
+
+    @api.response(200, 'Success')
+    @api.response(404, 'Проекта не существует')
+    @api.expect(parser)
+    def get(self, username, project_name):
+        """Ищет функции и файлы проекта.
+
+        Обрабатывает GET запрос, возвращает функции и файлы, имя которых начинается с запроса (или путь, если запрос содержит ``/``), а если таких мало - то и похожие по триграммам.
+        """
+        args = Search.parser.parse_args()
+        user = User.query.filter_by(username=username).first()
+        project = Project.query.filter_by(user_id=user.id, project_name=project_name).first()
+
+        if not project:
+            return {'message': 'Проекта с указанным названием не существует.'}, 404
+
+        results = search.search(project, args['q'], args['kind'], 
+                min(args['limit'], 100))
+        return marshal(results, Search.result_model), 200
+
+
+@api.route('/<string:username>/<string:project_name>/hotspots')
+@api.doc(params={'username': 'Имя пользователя', 'project_name': 'Название проекта'}, description='Рейтинг горячих точек проекта')
+class Hotspots(Resource):
+    """Ресурс рейтинга горячих точек проекта (см. :mod:`flaskr.hotspots`), 
+    URL ресурса: {username}/{project_name}/hotspots.
+
+    :Параметры запроса:
+       * *username* - имя пользователя
+       * *project_name* - название проекта
+    """
+    hotspot_model = api.model('Hotspot', {
+        'file_id': fields.Integer(required=True, help='Идентификатор файла'),
+        'path': fields.String(required=True, help='Путь к файлу'),
+        'churn': fields.Integer(required=True, help='Количество изменений файла'),
+        'loc': fields.Integer(help='Количество строк кода'),
+        'volume': fields.Float(help='Объем Холстеда'),
+        'score': fields.Float(required=True, help='Оценка горячей точки')
+    })
+
+    page_model = api.model('HotspotPage', {
+        'page': fields.Integer(required=True, help='Номер страницы'),
+        'per_page': fields.Integer(required=True, help='Количество горячих точек на странице'),
+        'has_next': fields.Boolean(required=True, help='Есть ли следующая страница'),
+        'hotspots': fields.List(fields.Nested(hotspot_model))
+    })
+
+    parser = reqparse.RequestParser()
+    parser.add_argument('page', type=inputs.positive, default=1, 
+            location='args', help='Номер страницы, начиная с 1')
+    parser.add_argument('per_page', type=inputs.int_range(1, 100), 
+            default=20, location='args', 
+            help='Количество горячих точек на странице')
+
+    @api.response(200, 'Success')
+    @api.response(404, 'Проекта не существует')
+    @api.expect(parser)
+    def get(self, username, project_name):
+        """Возвращает страницу рейтинга горячих точек проекта.
+
+        Обрабатывает GET запрос, возвращает файлы текущего дерева проекта по убыванию оценки (произведения количества изменений на сложность). Количество горячих точек не подсчитывается, признак *has_next* определяется по одной лишней записи.
+        """
+        args = Hotspots.parser.parse_args()
+        user = User.query.filter_by(username=username).first()
+        project = Project.query.filter_by(user_id=user.id, project_name=project_name).first()
+
+        if not project:
+            return {'message': 'Проекта с указанным названием не существует.'}, 404
+
+        per_page = args['per_page']
+        rows = hotspots.top(project, (args['page'] - 1) * per_page, 
+                per_page + 1)
+
+        return marshal({'page': args['page'], 'per_page': per_page,
+            'has_next': len(rows) > per_page, 'hotspots': rows[:per_page]},
+            Hotspots.page_model), 200
+
+
+@api.route('/<string:username>/<string:project_name>/distributions')
+@api.doc(params={'username': 'Имя пользователя', 'project_name': 'Название проекта'}, description='Распределения метрик файлов проекта')
+class Distributions(Resource):
+    """Ресурс распределений метрик файлов проекта (см. 
+    :mod:`flaskr.distributions`), URL ресурса: 
+    {username}/{project_name}/distributions.
+
+    :Параметры запроса:
+       * *username* - имя пользователя
+       * *project_name* - название проекта
+    """
+    parser = reqparse.RequestParser()
+    parser.add_argument('bins', type=inputs.int_range(1, 200), default=20,
+            location='args', help='Количество интервалов гистограмм')
+
+    @api.response(200, 'Success')
+    @api.response(404, 'Проекта не существует')
+    @api.expect(parser)
+    def get(self, username, project_name):
+        """Возвращает распределения метрик файлов проекта.
+
+        Обрабатывает GET запрос, возвращает для количества строк кода и метрик Холстеда (объема, сложности, трудоемкости и оценки количества ошибок) гистограмму, перцентили p50, p90, p99 и файлы-выбросы выше p99.
+
+        :Поля представления:
+           * *git_hash* (*str*) - Git хеш корня дерева проекта
+           * *metrics* (*dict*) - распределения {метрика: распределение} (см. :func:`flaskr.distributions.compute`), у выбросов добавлен путь к файлу *path*
+        """
+        args = Distributions.parser.parse_args()
+        user = User.query.filter_by(username=username).first()
+        project = Project.query.filter_by(user_id=user.id, project_name=project_name).first()
+
+        if not project:
+            return {'message': 'Проекта с указанным названием не существует.'}, 404
+
+        root_dir = project.get_root_dir()
+        if not root_dir:
+            return {'message': 'Дерево проекта не загружено.'}, 404
+
+        metrics = distributions.get_distributions(project, root_dir, 
+                args['bins'])
+
+        outliers = [o for m in metrics.values() for o in m.get('outliers', ())]
+        paths = {}
+        if outliers:
+            paths = {f.id: dir_path(f.parent_dir) + f.file_name 
+                    for f in File.query.filter(File.id.in_(
+                        set(o['file_id'] for o in outliers)))}
+
+        result = {}
+        for name, m in metrics.items():
+            m = dict(m)
+            if 'outliers' in m:
+                m['outliers'] = [dict(o, path=paths.get(o['file_id'])) 
+                        for o in m['outliers']]
+            result[name] = m
+
+        return {'git_hash': root_dir.git_hash, 'metrics': result}, 200
+
 api.add_resource(UserSettings, '/<string:username>/settings', endpoint='user_settings_resource')
 api.add_resource(ProjectRoot, '/<string:username>/<string:project_name>', endpoint='project_root_resource')
 api.add_resource(Webhook, '/<string:username>/<string:project_name>/webhook/github', endpoint='webhook_resource')
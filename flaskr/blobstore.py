@@ -0,0 +1,216 @@
+"""Модуль **blobstore** содержит локальное хранилище содержимого файлов
+репозиториев.
+
+Содержимое файла хранится по его Git хешу (см. :func:`flaskr.gitobj.blob_sha`)
+в директории из параметра приложения *BLOB_STORE_DIR*: файл
+``<первые 2 символа хеша>/<остальные символы>`` сжат zlib. Одинаковые
+файлы разных проектов и коммитов хранятся один раз. Запись выполняется
+через временный файл и переименование, поэтому хранилище можно
+использовать из нескольких процессов одновременно, а при чтении
+проверяется Git хеш содержимого.
+
+Содержимое сохраняется при загрузке (см. :func:`flaskr.webhook._add_metrics_for_file`)
+и читается из хранилища до обращения к источнику загрузки и при
+повторном анализе (см. :mod:`flaskr.reanalysis`). Размер хранилища
+ограничен параметром *BLOB_STORE_MAX_SIZE* байт: после записи каждой
+1/16 этого размера в процессе давно не используемые файлы удаляются
+(см. :func:`evict`).
+
+Функции :func:`read` и :func:`write` не используют контекст
+приложения, поэтому их можно вызывать в процессах пула анализа.
+"""
+import os
+import tempfile
+import threading
+import zlib
+from flask import current_app
+from flaskr import gitobj
+
+#: Доля от максимального размера хранилища, до которой оно сокращается
+#: при вытеснении
+_EVICT_TO = 0.9
+
+#: Количество байт, записанных в хранилище процессом после последнего
+#: вытеснения
+_written = 0
+
+#: Блокировка счетчика записанных байт
+_lock = threading.Lock()
+
+
+def _path(root, sha):
+    return os.path.join(root, sha[:2], sha[2:])
+
+
+def read(root, sha):
+    """Читает содержимое файла с Git хешем *sha* из хранилища *root*.
+    Поврежденный файл хранилища удаляется.
+
+    :param str root: директория хранилища
+    :param str sha: Git хеш файла
+    :returns: содержимое или None, если его нет в хранилище
+    :rtype: bytes
+    """
+    path = _path(root, sha)
+    try:
+        with open(path, 'rb') as f:
+            data = zlib.decompress(f.read())
+    except FileNotFoundError:
+        return None
+    except zlib.error:
+        data = None
+
+    if data is None or gitobj.blob_sha(data) != sha:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        return None
+
+    # Время изменения - время последнего использования для вытеснения
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        pass
+    return data
+
+
+def write(root, sha, data):
+    """Сохраняет содержимое *data* файла с Git хешем *sha* в хранилище
+    *root*, если его там нет.
+
+    :param str root: директория хранилища
+    :param str sha: Git хеш файла
+    :param bytes data: содержимое файла
+    :returns: размер записанного сжатого файла, 0 - если содержимое уже
+        было в хранилище
+    :rtype: int
+    """
+    path = _path(root, sha)
+    try:
+        os.utime(path)
+        return 0
+    except FileNotFoundError:
+        pass
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    body = zlib.compress(bytes(data))
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(body)
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+    return len(body)
+
+
+def root():
+    """Возвращает директорию хранилища из параметра приложения
+    *BLOB_STORE_DIR* или None, если хранилище отключено параметром
+    *BLOB_STORE_ENABLED*.
+
+    :rtype: str
+    """
+    if not current_app.config['BLOB_STORE_ENABLED']:
+        return None
+    return current_app.config['BLOB_STORE_DIR']
+
+
+def get(sha):
+    """Возвращает содержимое файла с Git хешем *sha* из хранилища
+    приложения (см. :func:`read`).
+
+    :param str sha: Git хеш файла
+    :returns: содержимое или None, если его нет в хранилище или
+        хранилище отключено
+    :rtype: bytes
+    """
+    store_root = root()
+    if store_root is None:
+        return None
+    return read(store_root, sha)
+
+
+def put(sha, data):
+    """Сохраняет содержимое *data* файла с Git хешем *sha* в хранилище
+    приложения (см. :func:`write`).
+
+    :param str sha: Git хеш файла
+    :param bytes data: содержимое файла
+    """
+    store_root = root()
+    if store_root is not None:
+        written(write(store_root, sha, data))
+
+
+def written(size):
+    """Учитывает *size* байт, записанных в хранилище приложения (в том
+    числе в процессах пула), и запускает вытеснение, если после
+    последнего вытеснения записано больше 1/16 максимального размера
+    хранилища.
+
+    :param int size: размер записанных файлов в байтах
+    """
+    global _written
+
+    limit = current_app.config['BLOB_STORE_MAX_SIZE']
+    with _lock:
+        _written += size
+        if _written < limit // 16:
+            return
+        _written = 0
+
+    evict()
+
+
+def evict(max_size=None):
+    """Удаляет давно не используемые файлы хранилища приложения, если
+    его размер больше *max_size*, пока размер не станет меньше 90%
+    *max_size*.
+
+    :param int max_size: максимальный размер хранилища в байтах, по
+        умолчанию параметр приложения *BLOB_STORE_MAX_SIZE*
+    :returns: размер удаленных файлов в байтах
+    :rtype: int
+    """
+    store_root = root()
+    if store_root is None or not os.path.isdir(store_root):
+        return 0
+    if max_size is None:
+        max_size = current_app.config['BLOB_STORE_MAX_SIZE']
+
+    entries = []
+    total = 0
+    for subdir in os.scandir(store_root):
+        if not subdir.is_dir():
+            continue
+        for entry in os.scandir(subdir.path):
+            if entry.name.startswith('.tmp-'):
+                continue
+            try:
+                st = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, entry.path))
+            total += st.st_size
+
+    if total <= max_size:
+        return 0
+
+    removed = 0
+    entries.sort()
+    for _mtime, size, path in entries:
+        if total - removed <= max_size * _EVICT_TO:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            continue
+        removed += size
+
+    current_app.logger.info('blobstore.evict removed=%d total=%d', removed,
+            total - removed)
+    return removed
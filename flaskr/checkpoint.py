@@ -0,0 +1,106 @@
+"""Модуль **checkpoint** содержит средства для фиксации (commit) загрузки
+(ingestion) дерева репозитория частями.
+
+После каждых *INGESTION_CHUNK_SIZE* файлов сессия фиксируется, в задании
+загрузки (:class:`flaskr.models.IngestionJob`) сохраняется контрольная
+точка (количество обработанных файлов и путь последнего файла), а
+зафиксированные объекты, в том числе директории, удаляются из сессии
+(expunge). Поэтому память сессии не растет с размером репозитория, а при
+сбое теряется только последняя часть загрузки. Загрузки хранят
+идентификаторы директорий и загружают модели заново по мере
+необходимости (см. :func:`flaskr.webhook._traverse`).
+
+Директории получают Git хеш только после обработки всего поддерева (см.
+:func:`flaskr.webhook._traverse`), поэтому прерванная загрузка
+продолжается с контрольной точки: полностью загруженные поддеревья
+пропускаются, а уже добавленные файлы не анализируются повторно.
+"""
+from flask import current_app
+from flask import g
+from flaskr.models import db
+from flaskr import delivery
+
+
+class Checkpoint:
+    """Контрольные точки загрузки дерева репозитория.
+
+    :param job: задание загрузки
+    :type job: :class:`flaskr.models.IngestionJob`
+    :param int chunk_size: количество файлов в одной фиксации
+    """
+    def __init__(self, job, chunk_size):
+        self.job = job
+        self.chunk_size = chunk_size
+        self._pending = 0
+
+    def file_done(self, path):
+        """Отмечает файл *path* как обработанный. Если в текущей части
+        набралось *chunk_size* файлов, то фиксирует часть (см.
+        :meth:`commit_chunk`).
+
+        :param str path: путь к файлу относительно корня репозитория
+        """
+        self.job.files_done += 1
+        self.job.checkpoint_path = path
+        self._pending += 1
+
+        if self._pending >= self.chunk_size:
+            self.commit_chunk()
+
+    def commit_chunk(self):
+        """Фиксирует сессию и удаляет из нее все объекты, кроме задания
+        загрузки.
+
+        Перед фиксацией продлевается аренда проекта, если она была
+        выдана (см. :func:`flaskr.delivery.acquire`).
+
+        :raises flaskr.delivery.ConcurrentIngestionError: если аренда проекта потеряна
+        """
+        _renew_lease()
+        db.session.commit()
+        self._pending = 0
+
+        for obj in list(db.session):
+            if obj is not self.job:
+                db.session.expunge(obj)
+
+        current_app.logger.info('ingestion.checkpoint job=%s files=%d path=%s',
+                self.job.id, self.job.files_done, self.job.checkpoint_path)
+
+    def finish(self):
+        """Отмечает задание загрузки как завершенное."""
+        _renew_lease()
+        self.job.status = 'done'
+
+        if g.get('ingestion_checkpoint') is self:
+            g.pop('ingestion_checkpoint')
+
+
+def _renew_lease():
+    lease = delivery.get_lease()
+
+    if lease is not None:
+        lease.renew()
+
+
+def begin(job):
+    """Начинает контрольные точки для задания загрузки *job*, размер части
+    берется из параметра приложения *INGESTION_CHUNK_SIZE*.
+
+    :param job: задание загрузки
+    :type job: :class:`flaskr.models.IngestionJob`
+    :rtype: :class:`Checkpoint`
+    """
+    job.status = 'running'
+    g.ingestion_checkpoint = Checkpoint(job,
+            current_app.config.get('INGESTION_CHUNK_SIZE', 500))
+    return g.ingestion_checkpoint
+
+
+def get_checkpoint():
+    """Возвращает контрольные точки текущей загрузки или None, если
+    загрузка не была начата функцией :func:`begin`.
+
+    :rtype: :class:`Checkpoint`
+    """
+    return g.get('ingestion_checkpoint')
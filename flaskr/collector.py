@@ -0,0 +1,187 @@
+"""Модуль **collector** содержит сборщик деревьев прошлых поколений
+проектов.
+
+При сбросе веб-хука (см. :meth:`flaskr.api.Webhook.put`) поколение
+проекта (:attr:`flaskr.models.Project.generation`) увеличивается, и
+старое дерево сразу становится недоступным, без удаления строк в
+транзакции запроса. Сборщик удаляет строки таких деревьев небольшими
+частями по *GC_BATCH_SIZE* строк: сначала файлы (метрики и графы
+удаляются каскадно), затем директории от листьев к корню. Каждая часть
+фиксируется отдельно, поэтому БД не блокируется надолго. Также
+удаляются снимки метрик коммитов прошлых поколений (см.
+:mod:`flaskr.history`).
+
+Сборщик запускается в фоновом потоке функцией :func:`start` или
+командой ``flask collect-garbage``.
+"""
+import threading
+import time
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from flaskr.models import db
+from flaskr.models import CommitSnapshot
+from flaskr.models import Directory
+from flaskr.models import File
+from flaskr.models import MetricsDelta
+from flaskr.models import Project
+
+#: Блокировка, которая не дает запустить несколько сборщиков в одном
+#: процессе
+_lock = threading.Lock()
+
+
+def _orphan_roots():
+    """Возвращает идентификаторы корневых директорий деревьев прошлых
+    поколений.
+    """
+    return [id for id, in db.session.execute(db.select(Directory.id)
+        .join(Project, Project.id == Directory.project_id)
+        .where(Directory.dir_parent_id.is_(None),
+            Directory.generation != Project.generation))]
+
+
+def _tree_dirs(root_id):
+    """Возвращает идентификаторы директорий дерева с корнем *root_id*,
+    упорядоченные от самых глубоких к корню.
+    """
+    tree = db.select(Directory.id, db.literal(0).label('depth'))\
+            .where(Directory.id == root_id).cte('tree', recursive=True)
+    tree = tree.union_all(db.select(Directory.id, tree.c.depth + 1)
+            .where(Directory.dir_parent_id == tree.c.id))
+    return [id for id, in db.session.execute(db.select(tree.c.id)
+        .order_by(tree.c.depth.desc()))]
+
+
+def _delete_batches(model, condition, batch_size, pause):
+    """Удаляет строки модели *model*, которые удовлетворяют условию
+    *condition*, частями по *batch_size* строк. Каждая часть
+    фиксируется отдельно.
+
+    :returns: количество удаленных строк
+    :rtype: int
+    """
+    deleted = 0
+
+    while True:
+        ids = db.select(model.id).where(condition).limit(batch_size)
+        count = db.session.execute(db.delete(model)
+                .where(model.id.in_(ids.scalar_subquery()))).rowcount
+        db.session.commit()
+
+        if not count:
+            return deleted
+
+        deleted += count
+        if pause:
+            time.sleep(pause)
+
+
+def _delete_tree(root_id, batch_size, pause):
+    """Удаляет дерево с корнем *root_id*: сначала файлы (метрики и
+    графы удаляются каскадно), затем директории от листьев к корню.
+
+    Директории дерева вычисляются рекурсивным запросом один раз, а не
+    для каждой части. Если прерванная загрузка прошлого поколения успела
+    добавить в дерево директории, то они удаляются при следующем
+    вычислении.
+
+    :returns: количество удаленных строк
+    :rtype: int
+    """
+    deleted = 0
+
+    while True:
+        dirs = _tree_dirs(root_id)
+        if not dirs:
+            return deleted
+
+        for i in range(0, len(dirs), batch_size):
+            deleted += _delete_batches(File, 
+                    File.dir_id.in_(dirs[i:i + batch_size]), batch_size, 
+                    pause)
+
+        try:
+            for i in range(0, len(dirs), batch_size):
+                deleted += _delete_batches(Directory, 
+                        Directory.id.in_(dirs[i:i + batch_size]), 
+                        batch_size, pause)
+        except IntegrityError:
+            # В дерево добавлена директория после вычисления дерева
+            db.session.rollback()
+
+
+def _delete_snapshots(batch_size, pause):
+    """Удаляет снимки метрик коммитов прошлых поколений: сначала дельты
+    метрик, затем сами снимки.
+
+    :returns: количество удаленных строк
+    :rtype: int
+    """
+    snapshots = [id for id, in db.session.execute(db.select(CommitSnapshot.id)
+        .join(Project, Project.id == CommitSnapshot.project_id)
+        .where(CommitSnapshot.generation != Project.generation))]
+    deleted = 0
+
+    for i in range(0, len(snapshots), batch_size):
+        chunk = snapshots[i:i + batch_size]
+        deleted += _delete_batches(MetricsDelta, 
+                MetricsDelta.snapshot_id.in_(chunk), batch_size, pause)
+        deleted += _delete_batches(CommitSnapshot, 
+                CommitSnapshot.id.in_(chunk), batch_size, pause)
+
+    return deleted
+
+
+def collect(batch_size=None, pause=None):
+    """Удаляет деревья и снимки метрик коммитов прошлых поколений всех
+    проектов частями.
+
+    :param int batch_size: количество строк в одной части, по умолчанию
+        параметр приложения *GC_BATCH_SIZE*
+    :param float pause: пауза между частями в секундах, по умолчанию
+        параметр приложения *GC_BATCH_PAUSE*
+    :returns: количество удаленных строк файлов, директорий, снимков и
+        дельт метрик
+    :rtype: int
+    """
+    if batch_size is None:
+        batch_size = current_app.config['GC_BATCH_SIZE']
+    if pause is None:
+        pause = current_app.config['GC_BATCH_PAUSE']
+
+    deleted = 0
+
+    for root_id in _orphan_roots():
+        deleted += _delete_tree(root_id, batch_size, pause)
+    deleted += _delete_snapshots(batch_size, pause)
+
+    current_app.logger.info('collector.done deleted=%d', deleted)
+    return deleted
+
+
+def _run(app):
+    with app.app_context():
+        try:
+            collect()
+        finally:
+            db.session.remove()
+            _lock.release()
+
+
+def start():
+    """Запускает сборщик в фоновом потоке, если он еще не запущен и
+    параметр приложения *GC_BACKGROUND* установлен.
+
+    :returns: True, если сборщик был запущен
+    :rtype: bool
+    """
+    if not current_app.config['GC_BACKGROUND']:
+        return False
+
+    if not _lock.acquire(blocking=False):
+        return False
+
+    app = current_app._get_current_object()
+    threading.Thread(target=_run, args=(app,), name='styx-collector',
+            daemon=True).start()
+    return True
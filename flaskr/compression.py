@@ -0,0 +1,176 @@
+"""Модуль **compression** содержит сжатие ответов приложения.
+
+Ответы текстовых типов (HTML, JSON, SVG, CSS, JavaScript) размером не
+меньше *COMPRESSION_MIN_SIZE* байт сжимаются после обработки запроса
+(см. :func:`init_app`). Алгоритм выбирается по заголовку
+``Accept-Encoding``: brotli, если установлен пакет ``brotli``, иначе
+gzip.
+
+Неизменяемые ответы (например, графы файла с заданным Git хешем)
+представление помечает ключом функцией :func:`cacheable`: такой ответ
+сжимается один раз с максимальной степенью сжатия и хранится в кеше
+размером *COMPRESSION_CACHE_SIZE* байт. Функция :func:`cached`
+возвращает готовый сжатый ответ из кеша до того, как представление
+загрузит или отрисует данные.
+"""
+import gzip
+import threading
+from collections import OrderedDict
+from flask import Response
+from flask import current_app
+from flask import g
+from flask import request
+
+try:
+    import brotli
+except ImportError: # pragma: no cover
+    brotli = None
+
+#: Типы ответов, которые сжимаются
+MIMETYPES = ('text/html', 'text/plain', 'text/css', 'text/javascript',
+        'application/javascript', 'application/json', 'image/svg+xml')
+
+#: Кеш сжатых ответов {(ключ, алгоритм): (тело, тип ответа)}
+_cache = OrderedDict()
+
+#: Размер кеша сжатых ответов в байтах
+_cache_size = 0
+
+#: Блокировка кеша сжатых ответов
+_cache_lock = threading.Lock()
+
+
+def encodings():
+    """Возвращает поддерживаемые алгоритмы сжатия в порядке предпочтения.
+
+    :rtype: tuple
+    """
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def negotiate():
+    """Возвращает алгоритм сжатия, который принимает клиент текущего
+    запроса, или None.
+
+    :rtype: str
+    """
+    return request.accept_encodings.best_match(encodings())
+
+
+def compress(data, encoding, best=False):
+    """Сжимает *data* алгоритмом *encoding*.
+
+    :param bytes data: данные
+    :param str encoding: алгоритм сжатия (``br`` или ``gzip``)
+    :param bool best: сжимать с максимальной степенью сжатия, степень по
+        умолчанию задается параметрами приложения *COMPRESSION_LEVEL*
+        (gzip) и *COMPRESSION_BROTLI_QUALITY* (brotli)
+    :rtype: bytes
+    """
+    if encoding == 'br':
+        return brotli.compress(data, quality=11 if best else
+                current_app.config['COMPRESSION_BROTLI_QUALITY'])
+    # Нулевое время изменения, чтобы одинаковые данные сжимались
+    # одинаково
+    return gzip.compress(data, 9 if best else
+            current_app.config['COMPRESSION_LEVEL'], mtime=0)
+
+
+def cacheable(key):
+    """Помечает ответ текущего запроса как неизменяемый: сжатое тело
+    ответа сохраняется в кеше по ключу *key*.
+
+    :param tuple key: ключ, который однозначно определяет тело ответа,
+        например, Git хеш файла и параметры запроса
+    """
+    g.compression_key = key
+
+
+def cached(key):
+    """Возвращает сжатый ответ из кеша по ключу *key* для алгоритма,
+    который принимает клиент, и помечает ответ функцией
+    :func:`cacheable`.
+
+    :param tuple key: ключ ответа
+    :returns: ответ или None, если ответа нет в кеше
+    :rtype: :class:`flask.Response`
+    """
+    cacheable(key)
+    encoding = negotiate()
+    if encoding is None:
+        return None
+
+    with _cache_lock:
+        entry = _cache.get((key, encoding))
+        if entry is None:
+            return None
+        _cache.move_to_end((key, encoding))
+
+    body, mimetype = entry
+    response = Response(body, mimetype=mimetype)
+    response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def _store(key, body, mimetype):
+    global _cache_size
+
+    limit = current_app.config['COMPRESSION_CACHE_SIZE']
+    if len(body) > limit:
+        return
+
+    with _cache_lock:
+        if key in _cache:
+            return
+        _cache[key] = (body, mimetype)
+        _cache_size += len(body)
+        while _cache_size > limit:
+            _key, (old, _mimetype) = _cache.popitem(last=False)
+            _cache_size -= len(old)
+
+
+def _compress_response(response):
+    if response.mimetype not in MIMETYPES:
+        return response
+
+    response.vary.add('Accept-Encoding')
+
+    if response.status_code != 200 or response.direct_passthrough or \
+            response.is_streamed or 'Content-Encoding' in response.headers \
+            or response.cache_control.no_transform:
+        return response
+
+    encoding = negotiate()
+    if encoding is None:
+        return response
+
+    data = response.get_data()
+    if len(data) < current_app.config['COMPRESSION_MIN_SIZE']:
+        return response
+
+    key = g.get('compression_key')
+    if key is not None:
+        body = compress(data, encoding, best=True)
+        _store((key, encoding), body, response.mimetype)
+    else:
+        body = compress(data, encoding)
+
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    # Тег сжатого ответа отличается от тега несжатого
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag('%s-%s' % (etag, encoding), weak)
+    return response
+
+
+def init_app(app):
+    """Подключает сжатие ответов к приложению *app*, если параметр
+    приложения *COMPRESSION_ENABLED* истинен.
+
+    :param app: приложение
+    :type app: :class:`flask.Flask`
+    """
+    if app.config['COMPRESSION_ENABLED']:
+        app.after_request(_compress_response)
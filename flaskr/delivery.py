@@ -0,0 +1,235 @@
+"""Модуль **delivery** содержит средства для идемпотентной обработки
+событий веб-хука и сериализации загрузок (ingestion) одного проекта.
+
+Повторные доставки события (с тем же заголовком *X-GitHub-Delivery*)
+отбрасываются функцией :func:`is_duplicate`. Если событие не было
+обработано (ошибка загрузки), то доставка забывается функцией
+:func:`forget`, и повторная доставка обрабатывается заново. Загрузку дерева
+репозитория проекта выполняет только владелец аренды
+(:class:`flaskr.models.ProjectLease`), которую выдает функция
+:func:`acquire`. Событие push, пришедшее во время загрузки, сохраняет
+свой коммит как отложенный, и владелец аренды после завершения
+загрузки загружает самый новый отложенный коммит (см.
+:meth:`Lease.release`). Поэтому одновременные события push сводятся к
+одной загрузке.
+
+Аренда продлевается в каждой контрольной точке загрузки (см.
+:mod:`flaskr.checkpoint`). Если аренда истекла и была выдана другому
+владельцу, то загрузка прерывается исключением
+:class:`ConcurrentIngestionError`.
+"""
+import datetime
+import json
+import uuid
+from flask import current_app
+from flask import g
+from sqlalchemy.exc import IntegrityError
+from flaskr.models import db
+from flaskr.models import ProjectLease
+from flaskr.models import WebhookDelivery
+
+
+class ConcurrentIngestionError(Exception):
+    """Исключение, которое возникает, если загрузку дерева проекта
+    одновременно выполняет другой владелец аренды.
+    """
+
+
+def is_duplicate(delivery_id, project_id, event):
+    """Проверяет, была ли доставка *delivery_id* уже получена, и
+    запоминает ее. Доставки старше *WEBHOOK_DELIVERY_TTL* секунд
+    удаляются.
+
+    :param str delivery_id: идентификатор доставки (*X-GitHub-Delivery*)
+    :param int project_id: идентификатор проекта
+    :param str event: название события веб-хука
+    :returns: True, если доставка повторная
+    :rtype: bool
+    """
+    now = datetime.datetime.utcnow()
+    ttl = datetime.timedelta(
+            seconds=current_app.config['WEBHOOK_DELIVERY_TTL'])
+
+    db.session.execute(db.delete(WebhookDelivery)
+            .where(WebhookDelivery.received_time < now - ttl))
+    db.session.add(WebhookDelivery(delivery_id=delivery_id,
+        project_id=project_id, event=event, received_time=now))
+
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return True
+
+    return False
+
+
+def forget(delivery_id):
+    """Удаляет доставку *delivery_id*, запомненную функцией
+    :func:`is_duplicate`, если ее событие не было обработано, чтобы
+    повторная доставка не отбрасывалась.
+
+    :param str delivery_id: идентификатор доставки (*X-GitHub-Delivery*),
+        None - доставка без идентификатора
+    """
+    if delivery_id is None:
+        return
+
+    db.session.execute(db.delete(WebhookDelivery)
+            .where(WebhookDelivery.delivery_id == delivery_id))
+    db.session.commit()
+
+
+def _expires():
+    return datetime.datetime.utcnow() + datetime.timedelta(
+            seconds=current_app.config['WEBHOOK_LEASE_TTL'])
+
+
+def _update(project_id, *criteria, **values):
+    result = db.session.execute(db.update(ProjectLease)
+            .where(ProjectLease.project_id == project_id, *criteria)
+            .values(**values))
+    return result.rowcount == 1
+
+
+class Lease:
+    """Аренда проекта, выданная функцией :func:`acquire`.
+
+    :param int project_id: идентификатор проекта
+    :param str owner: идентификатор владельца аренды
+    """
+    def __init__(self, project_id, owner):
+        self.project_id = project_id
+        self.owner = owner
+
+    def renew(self):
+        """Продлевает аренду. Изменение фиксируется вместе со следующей
+        фиксацией сессии.
+
+        :raises ConcurrentIngestionError: если аренда была выдана другому владельцу
+        """
+        if not _update(self.project_id, ProjectLease.owner == self.owner,
+                expires=_expires()):
+            raise ConcurrentIngestionError('Аренда проекта %d потеряна'
+                    % self.project_id)
+
+    def release(self):
+        """Освобождает аренду, если отложенного коммита нет. Иначе
+        забирает отложенный коммит и продлевает аренду.
+
+        :returns: кортеж (SHA, JSON-объект репозитория) отложенного
+            коммита или None, если аренда освобождена
+        :rtype: tuple
+        """
+        while True:
+            lease = db.session.execute(db.select(ProjectLease.owner,
+                ProjectLease.pending_sha, ProjectLease.pending_repository)
+                .where(ProjectLease.project_id == self.project_id)).first()
+
+            if lease is None or lease.owner != self.owner:
+                _forget(self)
+                return None
+
+            if lease.pending_sha is None:
+                released = _update(self.project_id,
+                        ProjectLease.owner == self.owner,
+                        ProjectLease.pending_sha.is_(None),
+                        owner=None, expires=None)
+                db.session.commit()
+                if released:
+                    _forget(self)
+                    return None
+                continue
+
+            taken = _update(self.project_id,
+                    ProjectLease.owner == self.owner,
+                    ProjectLease.pending_sha == lease.pending_sha,
+                    pending_sha=None, pending_repository=None,
+                    expires=_expires())
+            db.session.commit()
+            if taken:
+                return lease.pending_sha, json.loads(lease.pending_repository)
+
+    def abandon(self):
+        """Освобождает аренду после ошибки загрузки, отложенный коммит
+        сохраняется и будет загружен следующим владельцем аренды.
+        """
+        db.session.rollback()
+        _update(self.project_id, ProjectLease.owner == self.owner,
+                owner=None, expires=None)
+        db.session.commit()
+        _forget(self)
+
+
+def _forget(lease):
+    if g.get('project_lease') is lease:
+        g.pop('project_lease')
+
+
+def acquire(project_id, sha=None, repository=None):
+    """Арендует проект *project_id* для загрузки. Если проект уже
+    арендован, то коммит *sha* сохраняется как отложенный (заменяя
+    более старый отложенный коммит) и загружается владельцем аренды.
+
+    Выданная аренда хранится в глобальном контексте приложения (в
+    объекте g).
+
+    :param int project_id: идентификатор проекта
+    :param str sha: SHA коммита события push, None - не откладывать
+    :param dict repository: JSON-объект репозитория из события веб-хука
+    :returns: аренда или None, если проект уже арендован
+    :rtype: :class:`Lease`
+    """
+    owner = uuid.uuid4().hex
+
+    if db.session.get(ProjectLease, project_id) is None:
+        db.session.add(ProjectLease(project_id=project_id))
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+
+    while True:
+        now = datetime.datetime.utcnow()
+
+        if _update(project_id, db.or_(ProjectLease.owner.is_(None),
+                ProjectLease.expires < now), owner=owner, expires=_expires()):
+            db.session.commit()
+            g.project_lease = Lease(project_id, owner)
+            return g.project_lease
+
+        if sha is None:
+            db.session.rollback()
+            return None
+
+        if _update(project_id, ProjectLease.owner.isnot(None),
+                ProjectLease.expires >= now, pending_sha=sha,
+                pending_repository=json.dumps(repository)):
+            db.session.commit()
+            return None
+
+        # Аренда была освобождена после первой проверки
+        db.session.rollback()
+
+
+def revoke(project_id):
+    """Отзывает аренду проекта *project_id* и удаляет отложенный коммит
+    (при сбросе веб-хука). Загрузка прежнего владельца прерывается
+    исключением :class:`ConcurrentIngestionError` в следующей
+    контрольной точке, а проект сразу можно арендовать для загрузки
+    нового веб-хука. Изменение фиксируется вместе со следующей фиксацией
+    сессии.
+
+    :param int project_id: идентификатор проекта
+    """
+    _update(project_id, owner=None, expires=None, pending_sha=None,
+            pending_repository=None)
+
+
+def get_lease():
+    """Возвращает аренду проекта текущей загрузки или None, если аренда
+    не была выдана функцией :func:`acquire`.
+
+    :rtype: :class:`Lease`
+    """
+    return g.get('project_lease')
@@ -0,0 +1,159 @@
+"""Модуль **distributions** содержит функции для построения распределений
+метрик файлов проекта: гистограмм и перцентилей количества строк кода и
+производных метрик Холстеда (см. :class:`flaskr.models.HalsteadMetrics`).
+
+Метрики всех файлов текущего дерева проекта загружаются одним запросом в
+столбцы массива NumPy, а распределения вычисляются векторными
+операциями без цикла по файлам. Результат кешируется в памяти процесса
+по Git хешу корня дерева (см. :func:`get_distributions`), поэтому после
+новой загрузки дерева распределения вычисляются заново.
+"""
+import threading
+from collections import OrderedDict
+from flask import current_app
+from flaskr.models import db
+from flaskr.models import Directory
+from flaskr.models import File
+from flaskr.models import HalsteadMetrics
+from flaskr.models import RawMetrics
+
+#: Метрики, для которых строятся распределения
+METRICS = ('loc', 'volume', 'difficulty', 'effort', 'bugs')
+
+#: Перцентили распределений
+PERCENTILES = (50, 90, 99)
+
+#: Кеш распределений {(проект, поколение, Git хеш корня, число
+#: интервалов): распределения}
+_cache = OrderedDict()
+
+#: Блокировка кеша распределений
+_cache_lock = threading.Lock()
+
+
+def _load(root_dir):
+    """Загружает метрики файлов дерева с корнем *root_dir* одним запросом.
+
+    :returns: массив идентификаторов файлов и массив метрик в порядке
+        :data:`METRICS`, отсутствующие метрики равны NaN
+    :rtype: tuple
+    """
+    import numpy as np
+
+    tree = db.select(Directory.id).where(Directory.id == root_dir.id)\
+            .cte('tree', recursive=True)
+    tree = tree.union_all(db.select(Directory.id)
+            .where(Directory.dir_parent_id == tree.c.id))
+
+    # Строки Core запроса преобразуются в кортежи, иначе NumPy обращается
+    # к каждому полю строки SQLAlchemy по отдельности
+    rows = db.session.connection().execute(db.select(File.id,
+        RawMetrics.loc, HalsteadMetrics.unique_n1, HalsteadMetrics.unique_n2,
+        HalsteadMetrics.total_n1, HalsteadMetrics.total_n2)
+        .join(tree, tree.c.id == File.dir_id)
+        .outerjoin(RawMetrics, RawMetrics.file_id == File.id)
+        .outerjoin(HalsteadMetrics, HalsteadMetrics.file_id == File.id)
+        .where(File.skip_reason.is_(None),
+            db.or_(RawMetrics.id.isnot(None),
+                HalsteadMetrics.id.isnot(None)))).all()
+
+    data = np.array(list(map(tuple, rows)), dtype=np.float64)\
+            .reshape(-1, 6)
+    ids = data[:, 0].astype(np.int64)
+    loc, n1, n2, N1, N2 = data[:, 1:].T
+
+    vocabulary = n1 + n2
+    length = N1 + N2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        volume = np.where(vocabulary > 0,
+                length * np.log2(np.maximum(vocabulary, 1)), 0.0)
+        difficulty = np.where(n2 > 0, n1 / 2 * N2 / n2, 0.0)
+    # Метрики Холстеда файлов без них остаются NaN
+    volume[np.isnan(vocabulary)] = np.nan
+    difficulty[np.isnan(vocabulary)] = np.nan
+
+    return ids, np.stack([loc, volume, difficulty, difficulty * volume,
+        volume / 3000])
+
+
+def _distribution(ids, values, bins, outliers):
+    import numpy as np
+
+    present = ~np.isnan(values)
+    ids = ids[present]
+    values = values[present]
+
+    if not values.size:
+        return {'count': 0}
+
+    counts, edges = np.histogram(values, bins=bins)
+    percentiles = np.percentile(values, PERCENTILES)
+
+    # Выбросы - файлы выше последнего перцентиля, по убыванию значения
+    top = np.flatnonzero(values > percentiles[-1])
+    top = top[np.argsort(-values[top], kind='stable')][:outliers]
+
+    return {
+        'count': int(values.size),
+        'min': float(values.min()),
+        'max': float(values.max()),
+        'mean': float(values.mean()),
+        'percentiles': {'p%d' % p: float(v)
+            for p, v in zip(PERCENTILES, percentiles)},
+        'histogram': {'counts': counts.tolist(), 'edges': edges.tolist()},
+        'outliers': [{'file_id': int(ids[i]), 'value': float(values[i])}
+            for i in top]
+    }
+
+
+def compute(root_dir, bins=20, outliers=10):
+    """Вычисляет распределения метрик файлов дерева с корнем *root_dir*.
+
+    :param root_dir: корневая директория дерева проекта
+    :type root_dir: :class:`flaskr.models.Directory`
+    :param int bins: количество интервалов гистограмм
+    :param int outliers: максимальное количество выбросов каждой метрики
+    :returns: словарь {метрика: распределение}, распределение содержит
+        поля *count*, *min*, *max*, *mean*, *percentiles* {p50, p90,
+        p99}, *histogram* {*counts*, *edges*} и *outliers* - файлы
+        выше p99 [{*file_id*, *value*}]
+    :rtype: dict
+    """
+    ids, columns = _load(root_dir)
+
+    return {name: _distribution(ids, values, bins, outliers)
+            for name, values in zip(METRICS, columns)}
+
+
+def get_distributions(project, root_dir, bins=20):
+    """Возвращает распределения метрик текущего дерева проекта из кеша
+    или вычисляет их функцией :func:`compute`. Размер кеша задается
+    параметром приложения *DISTRIBUTIONS_CACHE_SIZE*.
+
+    :param project: проект
+    :type project: :class:`flaskr.models.Project`
+    :param root_dir: корневая директория текущего дерева проекта
+    :type root_dir: :class:`flaskr.models.Directory`
+    :param int bins: количество интервалов гистограмм
+    :rtype: dict
+    """
+    # Пустой хеш у корня прерванной загрузки, такое дерево не кешируется
+    if not root_dir.git_hash:
+        return compute(root_dir, bins)
+
+    key = (project.id, project.generation, root_dir.git_hash,
+            project.analysis_revision, bins)
+
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+
+    result = compute(root_dir, bins)
+
+    with _cache_lock:
+        _cache[key] = result
+        while len(_cache) > current_app.config['DISTRIBUTIONS_CACHE_SIZE']:
+            _cache.popitem(last=False)
+
+    return result
@@ -0,0 +1,282 @@
+"""Модуль **dot** содержит разбор описаний графов на языке DOT в
+словари, которые передаются в браузер для отрисовки графа на стороне
+клиента (см. ``static/js/cfg-render.js``), и обратное преобразование
+словарей в описание на языке DOT (см. :func:`to_dot`).
+
+Поддерживается подмножество языка, которое используется в графах потока
+управления: операторы вершин, ребер (в том числе цепочки ``a -> b ->
+c``), атрибутов и подграфы, которые разворачиваются в общий граф.
+Атрибуты по умолчанию (``node [...]``, ``edge [...]``) применяются к
+последующим вершинам и ребрам.
+"""
+import html
+import re
+
+
+class DotSyntaxError(ValueError):
+    """Исключение, которое возникает, если описание графа не удалось
+    разобрать.
+    """
+
+
+_TOKEN_RE = re.compile(r'''
+    (?P<space>\s+|//[^\n]*|/\*.*?\*/|^\#[^\n]*)
+  | (?P<string>"(?:\\.|[^"\\])*")
+  | (?P<html><)
+  | (?P<edge>->|--)
+  | (?P<punct>[{}\[\]=;,:])
+  | (?P<id>-?(?:\.\d+|\d+(?:\.\d*)?)|[A-Za-z_\x80-\U0010ffff][\w\x80-\U0010ffff]*)
+''', re.VERBOSE | re.DOTALL | re.MULTILINE)
+
+_KEYWORDS = ('graph', 'digraph', 'subgraph', 'node', 'edge', 'strict')
+
+
+def _html_end(text, start):
+    depth = 0
+    for i in range(start, len(text)):
+        if text[i] == '<':
+            depth += 1
+        elif text[i] == '>':
+            depth -= 1
+            if depth == 0:
+                return i + 1
+    raise DotSyntaxError('Незакрытая HTML строка')
+
+
+def _tokenize(text):
+    """Возвращает список лексем (тип, значение) описания графа."""
+    tokens = []
+    pos = 0
+    while pos < len(text):
+        m = _TOKEN_RE.match(text, pos)
+        if m is None:
+            raise DotSyntaxError('Неожиданный символ %r в позиции %d'
+                    % (text[pos], pos))
+        kind = m.lastgroup
+        if kind == 'html':
+            end = _html_end(text, pos)
+            # Из HTML метки остается только текст
+            value = re.sub(r'<br[^>]*>', '\n', text[pos + 1:end - 1])
+            tokens.append(('id', html.unescape(re.sub(r'<[^>]*>', '', value))))
+            pos = end
+            continue
+        pos = m.end()
+        if kind == 'space':
+            continue
+        value = m.group()
+        if kind == 'string':
+            value = re.sub(r'\\(["\\\n])', lambda e: '' if e.group(1) == '\n'
+                    else e.group(1), value[1:-1])
+        elif kind == 'id' and value.lower() in _KEYWORDS:
+            kind, value = 'keyword', value.lower()
+        tokens.append((kind, value))
+    return tokens
+
+
+class _Parser:
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+        self.nodes = {}
+        self.edges = []
+        # Вершины открытых подграфов
+        self.scopes = []
+
+    def peek(self, offset=0):
+        i = self.pos + offset
+        return self.tokens[i] if i < len(self.tokens) else (None, None)
+
+    def take(self, kind=None, value=None):
+        token = self.peek()
+        if (kind is not None and token[0] != kind) or \
+                (value is not None and token[1] != value):
+            raise DotSyntaxError('Ожидалось %s, получено %r'
+                    % (value or kind, token[1]))
+        self.pos += 1
+        return token[1]
+
+    def accept(self, kind, value=None):
+        token = self.peek()
+        if token[0] == kind and (value is None or token[1] == value):
+            self.pos += 1
+            return True
+        return False
+
+    def attr_list(self):
+        attrs = {}
+        while self.accept('punct', '['):
+            while not self.accept('punct', ']'):
+                key = self.take('id')
+                value = 'true'
+                if self.accept('punct', '='):
+                    value = self.take('id') if self.peek()[0] == 'id' \
+                            else self.take('string')
+                attrs[key] = value
+                self.accept('punct', ',') or self.accept('punct', ';')
+        return attrs
+
+    def node_id(self):
+        kind = self.peek()[0]
+        if kind not in ('id', 'string'):
+            raise DotSyntaxError('Ожидался идентификатор вершины, получено %r'
+                    % (self.peek()[1],))
+        name = self.take()
+        # Порт вершины (a:port:compass) не влияет на раскладку
+        while self.accept('punct', ':'):
+            self.take()
+        return name
+
+    def add_node(self, name, attrs, defaults):
+        if name not in self.nodes:
+            self.nodes[name] = dict(defaults)
+        self.nodes[name].update(attrs)
+        for scope in self.scopes:
+            scope.setdefault(name)
+
+    def endpoint(self, defaults):
+        """Возвращает имена вершин конца ребра: одной вершины или всех
+        вершин подграфа.
+        """
+        if self.peek() in (('punct', '{'), ('keyword', 'subgraph')):
+            return self.subgraph(defaults)
+        name = self.node_id()
+        self.add_node(name, {}, defaults['node'])
+        return [name]
+
+    def subgraph(self, defaults):
+        if self.accept('keyword', 'subgraph'):
+            if self.peek()[0] in ('id', 'string'):
+                self.take()
+        self.take('punct', '{')
+        self.scopes.append({})
+        self.statements({'node': dict(defaults['node']),
+            'edge': dict(defaults['edge'])})
+        self.take('punct', '}')
+        return list(self.scopes.pop())
+
+    def statements(self, defaults):
+        while self.peek() != ('punct', '}') and self.peek()[0] is not None:
+            self.statement(defaults)
+            self.accept('punct', ';')
+
+    def statement(self, defaults):
+        kind, value = self.peek()
+
+        if kind == 'keyword' and value in ('node', 'edge') and \
+                self.peek(1) == ('punct', '['):
+            self.take()
+            defaults[value].update(self.attr_list())
+            return
+
+        if kind == 'keyword' and value == 'graph':
+            self.take()
+            self.attr_list()
+            return
+
+        if kind in ('id', 'string') and self.peek(1) == ('punct', '='):
+            self.take()
+            self.take()
+            self.take()
+            return
+
+        sources = self.endpoint(defaults)
+        if self.peek()[0] != 'edge':
+            if self.peek() == ('punct', '['):
+                attrs = self.attr_list()
+                for name in sources:
+                    self.add_node(name, attrs, defaults['node'])
+            return
+
+        chain = [sources]
+        while self.accept('edge'):
+            chain.append(self.endpoint(defaults))
+        attrs = dict(defaults['edge'])
+        attrs.update(self.attr_list())
+        for tails, heads in zip(chain, chain[1:]):
+            for tail in tails:
+                for head in heads:
+                    self.edges.append((tail, head, attrs))
+
+    def graph(self):
+        self.accept('keyword', 'strict')
+        directed = self.take('keyword') == 'digraph'
+        name = None
+        if self.peek()[0] in ('id', 'string'):
+            name = self.take()
+        self.take('punct', '{')
+        self.statements({'node': {}, 'edge': {}})
+        self.take('punct', '}')
+        return name, directed
+
+
+def _label(attrs, default):
+    label = attrs.get('label', default)
+    if label == '\\N':
+        return default
+    # Переводы строк DOT (\n, \l, \r) заменяются обычными
+    return re.sub(r'\\[nlr]', '\n', label).rstrip('\n')
+
+
+def parse(text):
+    """Разбирает описание графа *text* на языке DOT.
+
+    :param str text: описание графа
+    :returns: словарь с полями *name* - название графа, *directed* -
+        признак ориентированного графа, *nodes* - вершины [{*id*,
+        *label*, *shape*}] и *edges* - ребра [{*source*, *target*,
+        *label*}]
+    :rtype: dict
+    :raises DotSyntaxError: если описание графа не удалось разобрать
+    """
+    parser = _Parser(_tokenize(text))
+    name, directed = parser.graph()
+
+    return {
+        'name': name,
+        'directed': directed,
+        'nodes': [{'id': node_id, 'label': _label(attrs, node_id),
+            'shape': attrs.get('shape', 'ellipse')}
+            for node_id, attrs in parser.nodes.items()],
+        'edges': [{'source': tail, 'target': head,
+            'label': _label(attrs, '') if 'label' in attrs else None}
+            for tail, head, attrs in parser.edges]
+    }
+
+
+def _quote(value):
+    return '"%s"' % str(value).replace('\\', '\\\\').replace('"', '\\"')\
+            .replace('\n', '\\n')
+
+
+def to_dot(graph, urls=None):
+    """Возвращает описание графа *graph* в формате :func:`parse` на языке 
+    DOT.
+
+    :param dict graph: граф
+    :param dict urls: ссылки вершин {идентификатор вершины: URL}, в SVG 
+        Graphviz вершины со ссылками становятся гиперссылками
+    :rtype: str
+    """
+    urls = urls or {}
+    arrow = '->' if graph['directed'] else '--'
+    lines = ['%s %s {' % ('digraph' if graph['directed'] else 'graph', 
+        _quote(graph['name'] or 'G'))]
+
+    for node in graph['nodes']:
+        attrs = ['label=%s' % _quote(node['label']), 
+                'shape=%s' % _quote(node['shape'])]
+        if node['id'] in urls:
+            attrs.append('URL=%s' % _quote(urls[node['id']]))
+        if node.get('expandable'):
+            attrs.append('style="filled,bold"')
+            attrs.append('fillcolor="#eef3fb"')
+        lines.append('  %s [%s];' % (_quote(node['id']), ', '.join(attrs)))
+
+    for edge in graph['edges']:
+        attrs = ' [label=%s]' % _quote(edge['label']) \
+                if edge['label'] is not None else ''
+        lines.append('  %s %s %s%s;' % (_quote(edge['source']), arrow, 
+            _quote(edge['target']), attrs))
+
+    lines.append('}')
+    return '\n'.join(lines)
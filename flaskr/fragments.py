@@ -0,0 +1,104 @@
+"""Модуль **fragments** содержит кеш HTML фрагментов страниц проекта:
+списка файлов директории и панелей с метриками и графами файла.
+
+Содержимое фрагмента меняется, только если загрузка изменила Git хеш
+директории или файла, поэтому фрагмент хранится по ключу
+(директория или файл, Git хеш, ревизия результатов анализа проекта,
+локаль) (см. :func:`key`), а страница
+вокруг него (шапка, навигация пользователя) отрисовывается при каждом
+запросе. В кеше хранится не больше *FRAGMENT_CACHE_SIZE* фрагментов,
+давно не используемые фрагменты вытесняются.
+
+Фрагмент хранится не дольше *FRAGMENT_CACHE_TTL* секунд, так как в
+списке файлов выводится относительное время обновления ("час назад").
+После загрузки дерева фрагменты проекта удаляются из кеша функцией
+:func:`invalidate`.
+"""
+import locale
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app
+from flask import render_template
+from markupsafe import Markup
+
+#: Кеш фрагментов {ключ: (время устаревания, HTML)}
+_cache = OrderedDict()
+
+#: Блокировка кеша фрагментов
+_cache_lock = threading.Lock()
+
+
+def key(project, obj, *extra):
+    """Возвращает ключ фрагмента директории или файла *obj* проекта.
+
+    :param project: проект
+    :type project: :class:`flaskr.models.Project`
+    :param obj: директория или файл
+    :type obj: :class:`flaskr.models.Directory` или
+        :class:`flaskr.models.File`
+    :param extra: параметры фрагмента, например, вид панели
+    :returns: ключ или None, если у *obj* нет Git хеша (корень
+        прерванной загрузки), такой фрагмент не кешируется
+    :rtype: tuple
+    """
+    if not obj.git_hash:
+        return None
+
+    return (project.id, type(obj).__name__, obj.id, obj.git_hash,
+            project.analysis_revision, locale.setlocale(locale.LC_TIME)) \
+                    + extra
+
+
+def render(fragment_key, template, make_context, when=None):
+    """Возвращает HTML фрагмента из кеша или отрисовывает шаблон
+    *template* и сохраняет фрагмент в кеше.
+
+    :param tuple fragment_key: ключ фрагмента (см. :func:`key`) или
+        None, если фрагмент не кешируется
+    :param str template: шаблон фрагмента
+    :param make_context: функция без параметров, которая возвращает
+        словарь с контекстом шаблона, вызывается только при промахе
+        кеша
+    :param when: функция, которая по контексту шаблона определяет, можно
+        ли сохранить фрагмент в кеше, по умолчанию фрагмент сохраняется
+        всегда
+    :rtype: :class:`markupsafe.Markup`
+    """
+    if fragment_key is not None:
+        with _cache_lock:
+            entry = _cache.get(fragment_key)
+            if entry is not None and entry[0] > time.monotonic():
+                _cache.move_to_end(fragment_key)
+                return Markup(entry[1])
+
+    context = make_context()
+    html = render_template(template, **context)
+
+    if fragment_key is None or (when is not None and not when(context)):
+        return Markup(html)
+
+    config = current_app.config
+    with _cache_lock:
+        _cache[fragment_key] = (time.monotonic()
+                + config['FRAGMENT_CACHE_TTL'], html)
+        _cache.move_to_end(fragment_key)
+        while len(_cache) > config['FRAGMENT_CACHE_SIZE']:
+            _cache.popitem(last=False)
+
+    return Markup(html)
+
+
+def invalidate(project_id):
+    """Удаляет из кеша фрагменты проекта.
+
+    :param int project_id: идентификатор проекта
+    :returns: количество удаленных фрагментов
+    :rtype: int
+    """
+    with _cache_lock:
+        keys = [k for k in _cache if k[0] == project_id]
+        for k in keys:
+            del _cache[k]
+
+    return len(keys)
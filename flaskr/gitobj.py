@@ -0,0 +1,49 @@
+"""Модуль **gitobj** содержит функции для вычисления Git хешей объектов
+(blob'ов и деревьев) локально, без обращения к репозиторию. Хеши
+совпадают с хешами, которые вычисляет Git (SHA-1 в hex формате).
+"""
+import hashlib
+
+#: Режим (mode) узла дерева для директории
+TREE_MODE = '40000'
+#: Режим (mode) узла дерева для обычного файла
+BLOB_MODE = '100644'
+#: Режим (mode) узла дерева для исполняемого файла
+EXEC_MODE = '100755'
+#: Режим (mode) узла дерева для символической ссылки
+LINK_MODE = '120000'
+
+
+def blob_sha(data):
+    """Вычисляет Git хеш blob'а с содержимым *data*.
+
+    :param bytes data: содержимое файла
+    :returns: SHA-1 в hex формате
+    :rtype: str
+    """
+    h = hashlib.sha1(b'blob %d\0' % len(data))
+    h.update(data)
+    return h.hexdigest()
+
+
+def _sort_key(entry):
+    mode, name, _sha = entry
+    if mode == TREE_MODE:
+        return name.encode('utf-8') + b'/'
+    return name.encode('utf-8')
+
+
+def tree_sha(entries):
+    """Вычисляет Git хеш дерева с узлами *entries*. Узлы сортируются так
+    же, как в Git (имена директорий сравниваются с завершающим ``/``).
+
+    :param entries: список кортежей (режим, имя, SHA в hex формате)
+    :returns: SHA-1 в hex формате
+    :rtype: str
+    """
+    body = b''.join(
+            b'%s %s\0%s' % (mode.encode('ascii'), name.encode('utf-8'),
+                bytes.fromhex(sha))
+            for mode, name, sha in sorted(entries, key=_sort_key))
+
+    return hashlib.sha1(b'tree %d\0' % len(body) + body).hexdigest()
@@ -0,0 +1,383 @@
+"""Модуль **history** содержит средства для хранения истории метрик
+проекта по коммитам.
+
+Для каждой загрузки (ingestion) дерева создается снимок
+(:class:`flaskr.models.CommitSnapshot`), в который записываются дельты
+(:class:`flaskr.models.MetricsDelta`) только для файлов, которые были
+проанализированы заново, т.е. Git хеш которых изменился. Поэтому объем
+истории растет с количеством изменений, а не с размером репозитория,
+умноженным на количество коммитов.
+
+Каждый *HISTORY_FULL_INTERVAL*-й снимок - полный: в него дописываются
+метрики всех остальных файлов дерева. Состояние метрик на любом коммите
+восстанавливается функцией :func:`state_at` из ближайшего предыдущего
+полного снимка и дельт следующих за ним снимков.
+"""
+import hashlib
+import json
+from flask import current_app
+from flask import g
+from flaskr.models import db
+from flaskr.models import CommitSnapshot
+from flaskr.models import Directory
+from flaskr.models import File
+from flaskr.models import GraphType
+from flaskr.models import GraphVisualization
+from flaskr.models import HalsteadMetrics
+from flaskr.models import MetricsDelta
+from flaskr.models import RawMetrics
+
+#: Поля метрик дельты, которые восстанавливает функция :func:`state_at`
+FIELDS = ('git_hash', 'skipped', 'loc', 'lloc', 'ploc', 'comments',
+        'blanks', 'unique_n1', 'unique_n2', 'total_n1', 'total_n2',
+        'cfg_hashes')
+
+#: Числовые поля метрик, для которых вычисляется разница (см. :func:`diff`)
+METRICS = FIELDS[2:-1]
+
+#: Количество строк, которые записываются (или запрашиваются по путям) 
+#: за один раз
+_FULL_CHUNK = 500
+
+
+def cfg_hash(dot):
+    """Возвращает хеш графа потока управления в DOT формате.
+
+    :param str dot: граф в DOT формате
+    :returns: SHA-1 в hex формате
+    :rtype: str
+    """
+    return hashlib.sha1(dot.encode('utf-8')).hexdigest()
+
+
+class SnapshotRecorder:
+    """Записывает дельты метрик файлов в снимок *snapshot_id*.
+
+    Рекордер хранит только идентификатор снимка, т.к. модели удаляются
+    из сессии в контрольных точках загрузки (см. :mod:`flaskr.checkpoint`).
+
+    :param int snapshot_id: идентификатор снимка метрик
+    :param bool fill: признак того, что снимок нужно дописать до
+        полного при завершении (см. :meth:`finish`)
+    """
+    def __init__(self, snapshot_id, fill=False):
+        self.snapshot_id = snapshot_id
+        self.fill = fill
+
+    def record(self, path, git_hash, results=None):
+        """Записывает дельту метрик файла *path*.
+
+        :param str path: путь к файлу относительно корня репозитория
+        :param str git_hash: Git хеш содержимого файла
+        :param dict results: результаты анализаторов {имя анализатора:
+            результат} (см. :func:`flaskr.analyzers.analyze`), None -
+            если файл не был проанализирован
+        """
+        delta = MetricsDelta(snapshot_id=self.snapshot_id, path=path,
+                git_hash=git_hash, skipped=results is None)
+
+        if results is not None:
+            for name in ('raw', 'halstead'):
+                for key, value in results.get(name, {}).items():
+                    setattr(delta, key, value)
+
+            if 'cfg' in results:
+                delta.cfg_hashes = json.dumps({func_name: cfg_hash(dot)
+                    for func_name, dot in results['cfg'].items()},
+                    sort_keys=True)
+
+        db.session.add(delta)
+
+    def finish(self, root_dir, tree_sha=None):
+        """Завершает снимок. Если снимок должен быть полным, то в него
+        дописываются метрики всех файлов дерева с корнем *root_dir*, для
+        которых нет дельт в снимке.
+
+        :param root_dir: корневая директория дерева проекта
+        :type root_dir: :class:`flaskr.models.Directory`
+        :param str tree_sha: Git хеш дерева, если он стал известен только
+            после загрузки
+        """
+        if tree_sha is not None:
+            db.session.get(CommitSnapshot, self.snapshot_id).tree_sha = \
+                    tree_sha
+
+        if self.fill:
+            _fill(self.snapshot_id, root_dir)
+
+        if g.get('snapshot_recorder') is self:
+            g.pop('snapshot_recorder')
+
+
+def tree_paths(root_dir):
+    """Возвращает пути директорий дерева с корнем *root_dir*.
+
+    :returns: словарь {идентификатор директории: путь с завершающим ``/``}
+    :rtype: dict
+    """
+    children = {}
+    for id, name, parent_id in db.session.execute(db.select(Directory.id,
+            Directory.dir_name, Directory.dir_parent_id)
+            .where(Directory.project_id == root_dir.project_id)):
+        children.setdefault(parent_id, []).append((id, name))
+
+    paths = {root_dir.id: ''}
+    stack = [root_dir.id]
+    while stack:
+        parent_id = stack.pop()
+        for id, name in children.get(parent_id, ()):
+            paths[id] = paths[parent_id] + name + '/'
+            stack.append(id)
+
+    return paths
+
+
+def _fill(snapshot_id, root_dir):
+    """Дописывает в снимок *snapshot_id* метрики файлов дерева, для которых
+    нет дельт в снимке.
+    """
+    db.session.flush()
+    paths = tree_paths(root_dir)
+    recorded = set(db.session.execute(db.select(MetricsDelta.path)
+        .where(MetricsDelta.snapshot_id == snapshot_id)).scalars())
+
+    rows = db.session.execute(db.select(File.id, File.dir_id,
+        File.file_name, File.git_hash, File.skip_reason,
+        RawMetrics.loc, RawMetrics.lloc, RawMetrics.ploc,
+        RawMetrics.comments, RawMetrics.blanks,
+        HalsteadMetrics.unique_n1, HalsteadMetrics.unique_n2,
+        HalsteadMetrics.total_n1, HalsteadMetrics.total_n2)
+        .outerjoin(RawMetrics, RawMetrics.file_id == File.id)
+        .outerjoin(HalsteadMetrics, HalsteadMetrics.file_id == File.id)
+        .where(File.dir_id.in_(list(paths)))).all()
+
+    missing = {}
+    for row in rows:
+        path = paths[row.dir_id] + row.file_name
+        if path in recorded:
+            continue
+        # Файлы без метрик не анализировались и не попадают в историю
+        if row.skip_reason is None and row.loc is None:
+            continue
+        missing[row.id] = (path, row)
+
+    cfgs = {}
+    ids = list(missing)
+    for i in range(0, len(ids), _FULL_CHUNK):
+        for file_id, func_name, dot in db.session.execute(db.select(
+                GraphVisualization.file_id, GraphVisualization.func_name,
+                GraphVisualization.graph_dot)
+                .where(GraphVisualization.file_id.in_(ids[i:i + _FULL_CHUNK]),
+                    GraphVisualization.graph_type == GraphType.CFG)):
+            cfgs.setdefault(file_id, {})[func_name] = cfg_hash(dot)
+
+    mappings = []
+    for file_id, (path, row) in missing.items():
+        mappings.append({'snapshot_id': snapshot_id, 'path': path,
+            'filled': True, 'git_hash': row.git_hash, 'skipped': row.skip_reason is not None,
+            'loc': row.loc, 'lloc': row.lloc, 'ploc': row.ploc,
+            'comments': row.comments, 'blanks': row.blanks,
+            'unique_n1': row.unique_n1, 'unique_n2': row.unique_n2,
+            'total_n1': row.total_n1, 'total_n2': row.total_n2,
+            'cfg_hashes': json.dumps(cfgs[file_id], sort_keys=True)
+                if file_id in cfgs else None})
+
+    for i in range(0, len(mappings), _FULL_CHUNK):
+        db.session.execute(db.insert(MetricsDelta),
+                mappings[i:i + _FULL_CHUNK])
+
+    current_app.logger.info('history.full snapshot=%d filled=%d',
+            snapshot_id, len(mappings))
+
+
+def begin(job, generation, tree_sha, commit_sha=None):
+    """Начинает снимок метрик для задания загрузки *job*. Если задание
+    продолжает прерванную загрузку, то продолжается и ее снимок.
+
+    Первый снимок поколения дерева проекта и каждый
+    *HISTORY_FULL_INTERVAL*-й снимок - полные. Рекордер снимка хранится
+    в глобальном контексте приложения (в объекте g).
+
+    :param job: задание загрузки
+    :type job: :class:`flaskr.models.IngestionJob`
+    :param int generation: поколение дерева проекта
+    :param str tree_sha: Git хеш загружаемого дерева
+    :param str commit_sha: SHA коммита
+    :rtype: :class:`SnapshotRecorder`
+    """
+    snapshot = CommitSnapshot.query.filter_by(job_id=job.id).first()
+
+    if snapshot is None:
+        previous = CommitSnapshot.query.filter_by(project_id=job.project_id,
+                generation=generation).order_by(CommitSnapshot.id.desc())
+        last_full = previous.filter_by(is_full=True).first()
+        since_full = previous.filter(CommitSnapshot.id > last_full.id)\
+                .count() if last_full is not None else None
+
+        snapshot = CommitSnapshot(project_id=job.project_id,
+                generation=generation, job_id=job.id, tree_sha=tree_sha,
+                commit_sha=commit_sha)
+        snapshot.is_full = since_full is None or since_full + 1 >= \
+                current_app.config['HISTORY_FULL_INTERVAL']
+        db.session.add(snapshot)
+        db.session.flush()
+
+    # Первый снимок поколения полон сам по себе, т.к. загрузка
+    # анализирует все файлы
+    fill = snapshot.is_full and CommitSnapshot.query.filter(
+            CommitSnapshot.project_id == job.project_id,
+            CommitSnapshot.generation == generation,
+            CommitSnapshot.id < snapshot.id).first() is not None
+
+    g.snapshot_recorder = SnapshotRecorder(snapshot.id, fill)
+    return g.snapshot_recorder
+
+
+def get_recorder():
+    """Возвращает рекордер снимка текущей загрузки или None, если снимок
+    не был начат функцией :func:`begin`.
+
+    :rtype: :class:`SnapshotRecorder`
+    """
+    return g.get('snapshot_recorder')
+
+
+def find_snapshot(project, ref):
+    """Возвращает последний снимок текущего поколения проекта для
+    коммита или дерева *ref*.
+
+    :param project: проект
+    :type project: :class:`flaskr.models.Project`
+    :param str ref: SHA коммита или дерева
+    :rtype: :class:`flaskr.models.CommitSnapshot`
+    """
+    return CommitSnapshot.query.filter(
+            CommitSnapshot.project_id == project.id,
+            CommitSnapshot.generation == project.generation,
+            db.or_(CommitSnapshot.commit_sha == ref,
+                CommitSnapshot.tree_sha == ref))\
+            .order_by(CommitSnapshot.id.desc()).first()
+
+
+def _base_id(snapshot):
+    """Возвращает идентификатор ближайшего полного снимка, не позднее 
+    снимка *snapshot*, или 0.
+    """
+    base = CommitSnapshot.query.filter(
+            CommitSnapshot.project_id == snapshot.project_id,
+            CommitSnapshot.generation == snapshot.generation,
+            CommitSnapshot.is_full.is_(True),
+            CommitSnapshot.id <= snapshot.id)\
+            .order_by(CommitSnapshot.id.desc()).first()
+    return base.id if base is not None else 0
+
+
+def _deltas(snapshot, first_id, last_id, *criteria):
+    columns = [getattr(MetricsDelta, name) for name in FIELDS]
+    return db.session.execute(db.select(MetricsDelta.path, *columns)
+            .join(CommitSnapshot, CommitSnapshot.id == MetricsDelta.snapshot_id)
+            .where(CommitSnapshot.project_id == snapshot.project_id,
+                CommitSnapshot.generation == snapshot.generation,
+                CommitSnapshot.id >= first_id,
+                CommitSnapshot.id <= last_id, *criteria)
+            .order_by(MetricsDelta.snapshot_id, MetricsDelta.id))
+
+
+def state_at(snapshot, paths=None):
+    """Восстанавливает состояние метрик проекта на снимке *snapshot* из
+    ближайшего предыдущего полного снимка и дельт следующих снимков.
+
+    :param snapshot: снимок метрик
+    :type snapshot: :class:`flaskr.models.CommitSnapshot`
+    :param paths: пути файлов, состояние которых нужно восстановить, 
+        None - все файлы
+    :returns: словарь {путь: словарь метрик с полями :data:`FIELDS`}
+    :rtype: dict
+    """
+    base_id = _base_id(snapshot)
+
+    if paths is None:
+        chunks = [()]
+    else:
+        paths = list(paths)
+        chunks = [(MetricsDelta.path.in_(paths[i:i + _FULL_CHUNK]),)
+                for i in range(0, len(paths), _FULL_CHUNK)]
+
+    state = {}
+    for criteria in chunks:
+        for row in _deltas(snapshot, base_id, snapshot.id, *criteria):
+            state[row.path] = {name: getattr(row, name) for name in FIELDS}
+
+    return state
+
+
+def changed_paths(from_snapshot, to_snapshot):
+    """Возвращает пути файлов, которые изменялись в коммитах между 
+    снимками *from_snapshot* и *to_snapshot* (в любом порядке). Дельты, 
+    дописанные в полные снимки, не учитываются.
+
+    :rtype: set
+    """
+    first, last = sorted((from_snapshot.id, to_snapshot.id))
+    return set(row.path for row in _deltas(to_snapshot, first + 1, last,
+        MetricsDelta.filled.is_(False)))
+
+
+def _functions_diff(old, new):
+    old = json.loads(old) if old else {}
+    new = json.loads(new) if new else {}
+
+    return {
+        'added': sorted(set(new) - set(old)),
+        'removed': sorted(set(old) - set(new)),
+        'changed': sorted(name for name in set(old) & set(new)
+            if old[name] != new[name])
+    }
+
+
+def diff(from_snapshot, to_snapshot):
+    """Сравнивает метрики проекта на снимках *from_snapshot* и 
+    *to_snapshot*. Сравниваются только файлы, которые изменялись между 
+    снимками, файлы с одинаковым Git хешем пропускаются.
+
+    :param from_snapshot: снимок метрик исходного коммита
+    :type from_snapshot: :class:`flaskr.models.CommitSnapshot`
+    :param to_snapshot: снимок метрик конечного коммита
+    :type to_snapshot: :class:`flaskr.models.CommitSnapshot`
+    :returns: генератор словарей с полями *path*, *status* (added, 
+        removed, modified), *from*, *to* (метрики :data:`METRICS`), *delta* 
+        (разница метрик) и *functions* (функции, граф потока управления 
+        которых добавлен, удален или изменен), упорядоченных по пути
+    """
+    paths = changed_paths(from_snapshot, to_snapshot)
+    old_state = state_at(from_snapshot, paths)
+    new_state = state_at(to_snapshot, paths)
+
+    for path in sorted(paths):
+        old = old_state.get(path)
+        new = new_state.get(path)
+
+        if old is None and new is None or (old is not None 
+                and new is not None and old['git_hash'] == new['git_hash']):
+            continue
+
+        if old is None:
+            status = 'added'
+        elif new is None:
+            status = 'removed'
+        else:
+            status = 'modified'
+
+        before = {name: old[name] if old else None for name in METRICS}
+        after = {name: new[name] if new else None for name in METRICS}
+
+        yield {
+            'path': path,
+            'status': status,
+            'from': before,
+            'to': after,
+            'delta': {name: (after[name] or 0) - (before[name] or 0)
+                for name in METRICS},
+            'functions': _functions_diff(old and old['cfg_hashes'],
+                new and new['cfg_hashes'])
+        }
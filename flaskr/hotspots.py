@@ -0,0 +1,160 @@
+"""Модуль **hotspots** содержит средства для поддержки рейтинга горячих
+точек проекта (:class:`flaskr.models.Hotspot`) - файлов, которые часто
+изменяются и имеют высокую сложность.
+
+Количество изменений файла (:attr:`flaskr.models.File.churn`)
+увеличивается при каждой загрузке, в которой Git хеш файла изменился.
+После анализа файла его горячая точка пересчитывается из количества
+изменений и новых метрик, поэтому рейтинг обновляется инкрементально и
+читается по индексу *(project_id, generation, score)*. Горячие точки
+существующего проекта строятся функцией :func:`rebuild` (команда
+``flask rebuild-hotspots``).
+"""
+from flask import g
+from flaskr.models import db
+from flaskr.models import File
+from flaskr.models import HalsteadMetrics
+from flaskr.models import Hotspot
+from flaskr.models import RawMetrics
+
+
+def score(churn, loc, volume):
+    """Возвращает оценку горячей точки: произведение количества
+    изменений на объем Холстеда или, если он не вычислялся, на
+    количество строк кода.
+
+    :param int churn: количество изменений файла
+    :param int loc: количество строк кода
+    :param float volume: объем Холстеда
+    :rtype: float
+    """
+    complexity = volume if volume is not None else (loc or 0)
+    return float(churn * complexity)
+
+
+class HotspotTracker:
+    """Обновляет горячие точки проекта при загрузке дерева.
+
+    :param int project_id: идентификатор проекта
+    :param int generation: поколение дерева проекта
+    """
+    def __init__(self, project_id, generation):
+        self.project_id = project_id
+        self.generation = generation
+
+    def update(self, f, path, results):
+        """Пересчитывает горячую точку файла *f* по результатам
+        анализаторов *results*.
+
+        :param f: модель файла
+        :type f: :class:`flaskr.models.File`
+        :param str path: путь к файлу относительно корня репозитория
+        :param dict results: результаты анализаторов {имя анализатора:
+            результат} (см. :func:`flaskr.analyzers.analyze`)
+        """
+        if 'raw' not in results and 'halstead' not in results:
+            return
+
+        loc = results['raw']['loc'] if 'raw' in results else None
+        volume = HalsteadMetrics(**results['halstead']).volume \
+                if 'halstead' in results else None
+
+        hotspot = db.session.get(Hotspot, f.id)
+        if hotspot is None:
+            hotspot = Hotspot(file_id=f.id)
+            db.session.add(hotspot)
+
+        hotspot.project_id = self.project_id
+        hotspot.generation = self.generation
+        hotspot.path = path
+        hotspot.churn = f.churn
+        hotspot.loc = loc
+        hotspot.volume = volume
+        hotspot.score = score(f.churn, loc, volume)
+
+
+def remove(file_id):
+    """Удаляет горячую точку файла *file_id*.
+
+    :param int file_id: идентификатор файла
+    """
+    db.session.execute(db.delete(Hotspot).where(Hotspot.file_id == file_id))
+
+
+def begin(project_id, generation):
+    """Начинает обновление горячих точек проекта при загрузке, трекер
+    хранится в глобальном контексте приложения (в объекте g).
+
+    :param int project_id: идентификатор проекта
+    :param int generation: поколение дерева проекта
+    :rtype: :class:`HotspotTracker`
+    """
+    g.hotspot_tracker = HotspotTracker(project_id, generation)
+    return g.hotspot_tracker
+
+
+def get_tracker():
+    """Возвращает трекер текущей загрузки или None, если обновление
+    горячих точек не было начато функцией :func:`begin`.
+
+    :rtype: :class:`HotspotTracker`
+    """
+    return g.get('hotspot_tracker')
+
+
+def rebuild(project):
+    """Перестраивает горячие точки текущего поколения дерева проекта по
+    метрикам в БД.
+
+    :param project: проект
+    :type project: :class:`flaskr.models.Project`
+    :returns: количество горячих точек
+    :rtype: int
+    """
+    from flaskr.history import tree_paths
+
+    db.session.execute(db.delete(Hotspot).where(
+        Hotspot.project_id == project.id))
+
+    root_dir = project.get_root_dir()
+    if root_dir is None:
+        return 0
+
+    paths = tree_paths(root_dir)
+    rows = db.session.execute(db.select(File.id, File.dir_id,
+        File.file_name, File.churn, RawMetrics.loc, HalsteadMetrics)
+        .outerjoin(RawMetrics, RawMetrics.file_id == File.id)
+        .outerjoin(HalsteadMetrics, HalsteadMetrics.file_id == File.id)
+        .where(File.dir_id.in_(list(paths)), File.skip_reason.is_(None),
+            db.or_(RawMetrics.id.isnot(None), HalsteadMetrics.id.isnot(None))))
+
+    mappings = []
+    for file_id, dir_id, file_name, churn, loc, halstead in rows:
+        volume = halstead.volume if halstead is not None else None
+        mappings.append({'file_id': file_id, 'project_id': project.id,
+            'generation': project.generation,
+            'path': paths[dir_id] + file_name, 'churn': churn, 'loc': loc,
+            'volume': volume, 'score': score(churn, loc, volume)})
+
+    if mappings:
+        db.session.execute(db.insert(Hotspot), mappings)
+
+    return len(mappings)
+
+
+def top(project, offset=0, limit=20):
+    """Возвращает горячие точки текущего поколения дерева проекта по
+    убыванию оценки. Горячие точки с равной оценкой упорядочиваются по 
+    идентификатору файла, чтобы страницы рейтинга не пересекались.
+
+    :param project: проект
+    :type project: :class:`flaskr.models.Project`
+    :param int offset: количество пропускаемых горячих точек
+    :param int limit: количество горячих точек
+    :returns: список моделей :class:`flaskr.models.Hotspot`
+    :rtype: list
+    """
+    return Hotspot.query.filter_by(project_id=project.id,
+            generation=project.generation)\
+            .order_by(Hotspot.score.desc(), Hotspot.file_id.desc())\
+            .offset(offset).limit(limit).all()
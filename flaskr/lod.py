@@ -0,0 +1,326 @@
+"""Модуль **lod** содержит построение сокращенного представления (уровня
+детализации) больших графов потока управления.
+
+Граф, разобранный функцией :func:`flaskr.dot.parse`, сокращается
+функцией :func:`summarize` в несколько шагов:
+
+* циклы (сильно связные компоненты) сворачиваются в одну вершину,
+  вложенные циклы видны после раскрытия внешнего цикла;
+* линейные цепочки базовых блоков (у каждого блока цепочки один
+  преемник, у следующего - один предшественник) объединяются;
+* параллельные вершины с одинаковыми предшественниками и преемниками
+  (например, ветви ``switch``) объединяются в группу;
+* если вершин все равно больше бюджета, то показываются первые вершины
+  в порядке обхода в ширину от входа, а остальные - одной вершиной.
+
+Каждая свернутая вершина имеет идентификатор, по которому ее можно
+раскрыть (параметр *expand*), поэтому на сервере раскладывается и
+клиенту передается только видимая часть графа.
+"""
+from collections import deque
+
+#: Виды вершин сокращенного графа: *node* - базовый блок, *loop* - цикл,
+#: *chain* - цепочка блоков, *group* - параллельные блоки, *rest* -
+#: блоки, которые не поместились в бюджет
+KINDS = ('node', 'loop', 'chain', 'group', 'rest')
+
+#: Идентификатор вершины с блоками, которые не поместились в бюджет,
+#: она раскрывается увеличением бюджета
+REST_ID = 'rest:'
+
+
+class _Loop:
+    """Цикл графа: заголовок, все вершины цикла и вложенные элементы."""
+    def __init__(self, header, members, children):
+        self.id = 'loop:' + header
+        self.header = header
+        self.members = members
+        self.children = children
+
+
+def _sccs(nodes, succ):
+    """Возвращает сильно связные компоненты подграфа на вершинах *nodes*
+    (алгоритм Тарьяна без рекурсии) в порядке вершин *nodes*.
+    """
+    allowed = set(nodes)
+    index = {}
+    low = {}
+    on_stack = set()
+    stack = []
+    components = []
+
+    for root in nodes:
+        if root in index:
+            continue
+        work = [(root, iter(succ[root]))]
+        index[root] = low[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        while work:
+            v, children = work[-1]
+            for w in children:
+                if w not in allowed:
+                    continue
+                if w not in index:
+                    index[w] = low[w] = len(index)
+                    stack.append(w)
+                    on_stack.add(w)
+                    work.append((w, iter(succ[w])))
+                    break
+                if w in on_stack:
+                    low[v] = min(low[v], index[w])
+            else:
+                work.pop()
+                if work:
+                    low[work[-1][0]] = min(low[work[-1][0]], low[v])
+                if low[v] == index[v]:
+                    component = set()
+                    while True:
+                        w = stack.pop()
+                        on_stack.discard(w)
+                        component.add(w)
+                        if w == v:
+                            break
+                    components.append(component)
+
+    order = {n: i for i, n in enumerate(nodes)}
+    components.sort(key=lambda c: min(order[n] for n in c))
+    return components
+
+
+def _loops(nodes, succ, pred):
+    """Строит дерево вложенности циклов подграфа на вершинах *nodes*.
+
+    :returns: список элементов: идентификаторов вершин и циклов
+        :class:`_Loop`
+    """
+    items = []
+    order = {n: i for i, n in enumerate(nodes)}
+
+    for component in _sccs(nodes, succ):
+        members = sorted(component, key=order.get)
+        # Вершина с петлей не сворачивается, петля видна и так
+        if len(members) == 1:
+            items.append(members[0])
+            continue
+
+        # Заголовок цикла - вершина, в которую входят ребра извне
+        header = next((n for n in members
+            if any(p not in component for p in pred[n])), members[0])
+        # Вложенные циклы - компоненты цикла без ребер в заголовок
+        inner_succ = {n: [w for w in succ[n] if w != header]
+                for n in members}
+        children = _loops(members, inner_succ, pred)
+        items.append(_Loop(header, component, children))
+
+    return items
+
+
+def _first_line(label):
+    return label.split('\n', 1)[0]
+
+
+class _Builder:
+    """Сокращенный граф: видимые вершины и ребра между ними."""
+    def __init__(self, graph):
+        self.nodes = {}
+        self.order = []
+        self.labels = {n['id']: n['label'] for n in graph['nodes']}
+        self.shapes = {n['id']: n['shape'] for n in graph['nodes']}
+
+    def add(self, node_id, kind, label, size, members, shape='box'):
+        self.nodes[node_id] = {'id': node_id, 'kind': kind,
+                'label': label, 'shape': shape, 'size': size,
+                'expandable': kind != 'node', 'members': members}
+        self.order.append(node_id)
+
+
+def _collapse_loops(builder, items, expand, owner, bodies):
+    """Добавляет видимые вершины элементов *items* и возвращает их
+    идентификаторы. Видимые вершины тела каждого раскрытого цикла
+    добавляются в *bodies*.
+    """
+    visible = []
+    for item in items:
+        if isinstance(item, str):
+            owner[item] = item
+            builder.add(item, 'node', builder.labels[item], 1, [item],
+                    builder.shapes[item])
+            visible.append(item)
+        elif item.id in expand:
+            body = _collapse_loops(builder, item.children, expand, owner,
+                    bodies)
+            bodies.append(frozenset(body))
+            visible.extend(body)
+        else:
+            for n in item.members:
+                owner[n] = item.id
+            builder.add(item.id, 'loop', 'цикл: %s\n(блоков: %d)' % (
+                _first_line(builder.labels[item.header]), len(item.members)),
+                len(item.members), sorted(item.members))
+            visible.append(item.id)
+    return visible
+
+
+def _edges(builder, edges, owner):
+    """Возвращает ребра между видимыми вершинами без повторов."""
+    succ = {n: [] for n in builder.order}
+    pred = {n: [] for n in builder.order}
+    labels = {}
+    for tail, head, label in edges:
+        tail, head = owner[tail], owner[head]
+        # Ребра внутри свернутой вершины не показываются
+        if tail == head and builder.nodes[tail]['kind'] != 'node':
+            continue
+        if (tail, head) in labels:
+            continue
+        labels[(tail, head)] = label
+        succ[tail].append(head)
+        pred[head].append(tail)
+    return succ, pred, labels
+
+
+def _merge(builder, groups, kind, make_label, owner):
+    """Заменяет каждую группу видимых вершин из *groups* одной вершиной
+    на месте первой вершины группы.
+    """
+    if not groups:
+        return
+
+    merged = {}
+    for group in groups:
+        for n in group:
+            merged[n] = group
+
+    order = builder.order
+    builder.order = []
+    for n in order:
+        group = merged.get(n)
+        if group is None:
+            builder.order.append(n)
+            continue
+        if n != group[0]:
+            continue
+        members = [m for g in group for m in builder.nodes[g]['members']]
+        size = sum(builder.nodes[g]['size'] for g in group)
+        label = make_label(group, size)
+        for g in group:
+            del builder.nodes[g]
+        builder.add(kind + ':' + group[0], kind, label, size, members)
+        for m in members:
+            owner[m] = kind + ':' + group[0]
+
+
+def summarize(graph, budget=200, expand=()):
+    """Возвращает сокращенное представление графа *graph*.
+
+    Если в графе не больше *budget* вершин и ничего не раскрыто, то граф
+    возвращается без изменений.
+
+    :param dict graph: граф (см. :func:`flaskr.dot.parse`)
+    :param int budget: максимальное количество видимых вершин
+    :param expand: идентификаторы свернутых вершин, которые нужно раскрыть
+    :returns: граф в формате :func:`flaskr.dot.parse`, у вершин есть поля
+        *kind* (см. :data:`KINDS`), *size* - количество базовых блоков и
+        *expandable* - можно ли раскрыть вершину, в поле *total* -
+        количество вершин исходного графа, в поле *budget* - бюджет
+    :rtype: dict
+    """
+    if len(graph['nodes']) <= budget and not expand:
+        return graph
+
+    expand = set(expand)
+    nodes = [n['id'] for n in graph['nodes']]
+    edges = [(e['source'], e['target'], e['label']) for e in graph['edges']]
+    succ = {n: [] for n in nodes}
+    pred = {n: [] for n in nodes}
+    for tail, head, _label in edges:
+        succ[tail].append(head)
+        pred[head].append(tail)
+
+    builder = _Builder(graph)
+    owner = {}
+    bodies = []
+    _collapse_loops(builder, _loops(nodes, succ, pred), expand, owner,
+            bodies)
+
+    vsucc, vpred, _labels = _edges(builder, edges, owner)
+    # Цепочки: у вершины один преемник, у преемника один предшественник,
+    # свернутые циклы в цепочки не входят. Цепочка, которая покрывает все
+    # тело раскрытого цикла, не сворачивается, иначе раскрытие цикла
+    # ничего не меняет
+    linear = lambda n: builder.nodes[n]['kind'] == 'node'
+    chains = []
+    seen = set()
+    for n in builder.order:
+        if n in seen or not linear(n) or (len(vpred[n]) == 1 and
+                linear(vpred[n][0]) and len(vsucc[vpred[n][0]]) == 1 and
+                vpred[n][0] != n):
+            continue
+        chain = [n]
+        while len(vsucc[chain[-1]]) == 1:
+            nxt = vsucc[chain[-1]][0]
+            if len(vpred[nxt]) != 1 or nxt in chain or not linear(nxt):
+                break
+            chain.append(nxt)
+        seen.update(chain)
+        if len(chain) > 1 and 'chain:' + chain[0] not in expand and \
+                not any(body <= set(chain) for body in bodies):
+            chains.append(chain)
+
+    _merge(builder, chains, 'chain', lambda chain, size: '%s\n...\n%s\n(блоков: %d)'
+            % (_first_line(builder.nodes[chain[0]]['label']),
+                _first_line(builder.nodes[chain[-1]]['label']), size), owner)
+
+    # Параллельные вершины с одинаковыми соседями
+    vsucc, vpred, _labels = _edges(builder, edges, owner)
+    similar = {}
+    for n in builder.order:
+        if vpred[n] and n not in vsucc[n]:
+            key = (frozenset(vpred[n]), frozenset(vsucc[n]))
+            similar.setdefault(key, []).append(n)
+    groups = [group for group in similar.values()
+            if len(group) > 1 and 'group:' + group[0] not in expand]
+    _merge(builder, groups, 'group', lambda group, size: 'ветвей: %d\n(блоков: %d)'
+            % (len(group), size), owner)
+
+    vsucc, vpred, labels = _edges(builder, edges, owner)
+
+    # Бюджет: вершины в порядке обхода в ширину от входа
+    if len(builder.order) > budget:
+        visited = set()
+        limit = budget - 1
+        queue = deque()
+        for start in [n for n in builder.order if not vpred[n]] + \
+                builder.order:
+            if len(visited) >= limit:
+                break
+            queue.append(start)
+            while queue and len(visited) < limit:
+                n = queue.popleft()
+                if n not in visited:
+                    visited.add(n)
+                    queue.extend(vsucc[n])
+            queue.clear()
+
+        hidden = [n for n in builder.order if n not in visited]
+        members = [m for n in hidden for m in builder.nodes[n]['members']]
+        size = sum(builder.nodes[n]['size'] for n in hidden)
+        for n in hidden:
+            del builder.nodes[n]
+        builder.order = [n for n in builder.order if n in visited]
+        builder.add(REST_ID, 'rest', 'еще блоков: %d' % size, size, members)
+        for m in members:
+            owner[m] = REST_ID
+        vsucc, vpred, labels = _edges(builder, edges, owner)
+
+    return {
+        'name': graph['name'],
+        'directed': graph['directed'],
+        'total': len(nodes),
+        'budget': budget,
+        'nodes': [{key: value for key, value in builder.nodes[n].items()
+            if key != 'members'} for n in builder.order],
+        'edges': [{'source': tail, 'target': head, 'label': label}
+            for (tail, head), label in labels.items()]
+    }
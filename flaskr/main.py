@@ -16,7 +16,6 @@ from flaskr.models import File
 from flaskr.models import RawMetrics
 from flaskr.models import HalsteadMetrics
 from flaskr.models import GraphVisualization
-from flaskr.models import GraphType
 import locale
 from flask import request
 from flask import flash
@@ -24,7 +23,6 @@ from datetime import datetime
 from flaskr.models import db
 import functools
 from flask import current_app
-from graphviz import Source
 
 #: main - это Blueprint, который содержит представления данного модуля.
 #:
@@ -110,6 +108,11 @@ def project(username, project_name, path=None):
     Принимает параметр *username*, т.к. для каждой панели настроек 
     пользователя выделяется отдельный ресурс /<*username*>.
 
+    Если для корня проекта передан параметр запроса *q*, то выводятся 
+    результаты поиска функций и файлов (см. :mod:`flaskr.search`), а 
+    если передан параметр *view=hotspots* - страница *page* рейтинга 
+    горячих точек (см. :mod:`flaskr.hotspots`).
+
     :param str username: имя пользователя
     """
     user = User.query.filter_by(
@@ -125,37 +128,61 @@ def project(username, project_name, path=None):
             abort(400, 'Необходим параметр запроса type')
 
         if file_type == 'dir':
-	        dirs = path.split('/')
-	
-	        d = Directory.query.filter_by(dir_name=None, project_id=user_project.id).first()
-	
-	        if not d:
-	            abort(404, 'Директории с указанными названием не существует')
-	
-	        for child in dirs:
-	            if not child:
-	                continue
-	
-	            d = Directory.query.filter_by(dir_parent_id=d.id, dir_name=child).first()
-	            if not d:
-	                abort(404, 'Директории с указанными названием не существует')
+            from flaskr import treeindex
+
+            d = user_project.get_root_dir()
+
+            if not d:
+                abort(404, 'Директории с указанными названием не существует')
+
+            d = treeindex.resolve_dir(user_project, d, path)
+            if not d:
+                abort(404, 'Директории с указанными названием не существует')
         elif file_type == 'file':
             return file_info(user, user_project, path)
         else:
             abort(400, 'Неверное значение параметра type')
     else:
-        d = Directory.query.filter_by(
-                dir_name=None,
-                project_id=user_project.id).first()
+        d = user_project.get_root_dir()
 
     if not d:
         return render_template('user_panel/no_webhook.html',
                 user=user, gravatar_avatar_url=gravatar_avatar_url,
                 project=user_project, project_dir=None)
+
+    query = request.args.get('q')
+    if path is None and query:
+        from flaskr import search
+
+        return render_template('user_panel/search_results.html', 
+                user=user, gravatar_avatar_url=gravatar_avatar_url, 
+                project=user_project, project_dir=d, query=query,
+                results=search.search(user_project, query, limit=50))
+
+    if path is None and request.args.get('view') == 'hotspots':
+        from flaskr import hotspots
+
+        page = max(request.args.get('page', 1, type=int), 1)
+        per_page = current_app.config['HOTSPOTS_PER_PAGE']
+        rows = hotspots.top(user_project, (page - 1) * per_page, 
+                per_page + 1)
+
+        return render_template('user_panel/hotspots.html', 
+                user=user, gravatar_avatar_url=gravatar_avatar_url, 
+                project=user_project, project_dir=d, page=page,
+                hotspots=rows[:per_page], has_next=len(rows) > per_page)
             
+    from flaskr import fragments
+    from flaskr import treeindex
+
+    tree_listing = fragments.render(fragments.key(user_project, d), 
+            'user_panel/tree_listing.html', 
+            lambda: dict(user=user, project=user_project, 
+                entries=treeindex.listing(user_project, d)))
+
     return render_template('user_panel/project.html', 
             user=user, gravatar_avatar_url=gravatar_avatar_url, 
-            project=user_project, project_dir=d)
+            project=user_project, project_dir=d, tree_listing=tree_listing)
 
 
 def file_info(user, project, path):
@@ -165,18 +192,17 @@ def file_info(user, project, path):
 
     info = request.args.get('info')
 
-    parent = Directory.query.filter_by(dir_name=None, 
-            project_id=project.id).first()
+    parent = project.get_root_dir()
 
     if not parent:
         abort(406, 'Веб-хук не был подключен к проекту.')
 
-    for child in dirs:
-        parent = Directory.query.filter_by(
-                dir_parent_id=parent.id, dir_name=child).first()
+    from flaskr import treeindex
+
+    parent = treeindex.resolve_dir(project, parent, '/'.join(dirs))
 
-        if not parent:
-            abort(404, 'Директории с указанным именем не существует.')
+    if not parent:
+        abort(404, 'Директории с указанным именем не существует.')
 
     f = File.query.filter_by(
             dir_id=parent.id, file_name=filename).first()
@@ -184,48 +210,112 @@ def file_info(user, project, path):
     if not f:
         abort(404, 'Файла с указанным именем не существует.')
 
+    from flaskr import fragments
+
     if info == 'halstead':
-        halstead_metrics = HalsteadMetrics.query.filter_by(
-                file_id=f.id).first()
+        details = fragments.render(fragments.key(project, f, 'halstead'), 
+                'user_panel/halstead_panel.html', 
+                lambda: dict(halstead=HalsteadMetrics.query.filter_by(
+                    file_id=f.id).first()))
 
         return render_template('user_panel/halstead_info.html', 
                 file_path=path, file=f, project=project, user=user, 
                 gravatar_avatar_url=gravatar_avatar_url, 
-                project_dir=parent, halstead=halstead_metrics,
-                raw=None)
+                project_dir=parent, details=details)
     elif info == 'cfg':
-        func_name = request.args.get('func_name')
+        from flaskr import render
 
-        visualizations = GraphVisualization.query.filter_by(
-                file_id=f.id,
-                graph_type=GraphType.CFG).all()
+        mode = request.args.get('render', 
+                current_app.config['CFG_RENDER_MODE'])
+        if mode not in render.RENDER_MODES:
+            abort(400, 'Неверное значение параметра render')
 
-        if func_name:
-            try:
-                dot = next(v.graph_dot for v in visualizations if v.func_name == func_name)
-            except StopIteration:
-                abort(404, 'Функции с указанным именем не существует.')
-        else:
-            dot = visualizations[0].graph_dot
-            func_name = visualizations[0].func_name
-
-        s = Source(dot, filename='temp.dot', format='svg')
+        func_name = request.args.get('func_name')
+        expand = request.args.getlist('expand')
+        budget = request.args.get('budget', 
+                current_app.config['CFG_LOD_BUDGET'], type=int)
+
+        # Панель с графом, который не удалось отрисовать из-за нагрузки, 
+        # не кешируется
+        details = fragments.render(fragments.key(project, f, 'cfg', 
+            func_name, mode, request.args.get('render'), budget, 
+            tuple(expand)), 'user_panel/cfg_panel.html', 
+            lambda: _cfg_context(user, project, path, f, func_name, mode, 
+                expand, budget),
+            when=lambda context: context['render_status'] 
+                not in ('busy', 'timeout'))
 
         return render_template('user_panel/cfg_info.html', 
                 file_path=path, file=f, project=project, user=user, 
                 gravatar_avatar_url=gravatar_avatar_url, 
-                project_dir=parent, raw=None, 
-                chart_output=s.pipe().decode('utf-8'),
-                func_name = func_name,
-                visualizations=visualizations)
+                project_dir=parent, details=details)
     else:
-        raw_metrics = RawMetrics.query.filter_by(
-                file_id=f.id).first()
+        details = fragments.render(fragments.key(project, f, 'raw'), 
+                'user_panel/raw_panel.html', 
+                lambda: dict(raw=RawMetrics.query.filter_by(
+                    file_id=f.id).first()))
 
         return render_template('user_panel/file_info.html', 
                 file_path=path, file=f, project=project, user=user, 
                 gravatar_avatar_url=gravatar_avatar_url, 
-                project_dir=parent, raw=raw_metrics)
+                project_dir=parent, details=details)
+
+
+def _cfg_context(user, project, path, f, func_name, mode, expand, budget):
+    """Возвращает контекст шаблона панели с графом потока управления 
+    функции *func_name* файла *f*.
+    """
+    from flaskr import render
+
+    # Для списка функций описания графов не загружаются, загружается 
+    # только граф выбранной функции
+    visualizations = GraphVisualization.functions(f.id)
+
+    if not func_name and visualizations:
+        func_name = visualizations[0].func_name
+
+    dot = None
+    if func_name:
+        dot = GraphVisualization.get_dot(f.id, func_name)
+        if dot is None:
+            abort(404, 'Функции с указанным именем не существует.')
+
+    chart_output = ''
+    render_status = None
+    graphs = None
+    summary = None
+    if mode == 'client':
+        graphs = {func_name: render.client_graph(dot)} \
+                if dot is not None else {}
+
+    if dot is not None and (graphs is None or graphs[func_name] is None):
+        summary = render.summarize_dot(dot, max(budget, 1), expand)
+
+        if summary is not None:
+            from flaskr.dot import to_dot
+
+            # Свернутые вершины - ссылки на страницу с раскрытой 
+            # вершиной, вершина rest: увеличивает бюджет
+            args = dict(username=user.username, 
+                    project_name=project.project_name, path=path, 
+                    type='file', info='cfg', func_name=func_name, 
+                    render=mode)
+            urls = {n['id']: url_for('.project', expand=expand, 
+                budget=budget * 2, **args) if n['kind'] == 'rest' 
+                else url_for('.project', expand=expand + [n['id']], 
+                    budget=budget, **args)
+                for n in summary['nodes'] if n['expandable']}
+            dot = to_dot(summary, urls)
+
+        chart_output, render_status = render.render_svg(dot)
+
+    return dict(file_path=path, project=project, user=user, 
+            chart_output=chart_output,
+            render_status=render_status,
+            graphs=graphs,
+            summary=summary,
+            func_name=func_name,
+            visualizations=visualizations)
 
 
 @main.route('/<username>/settings/tokens', methods=['GET', 'POST'])
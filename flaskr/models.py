@@ -6,6 +6,7 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask import current_app
 import enum
+import math
 import datetime
 import jwt
 import sys
@@ -136,6 +137,9 @@ class Token(db.Model):
 class Project(db.Model):
     """Модель проект, хранит свойства с информацией о проекте пользователя
     : *id*, *user_id*, *project_name*.
+
+    Метод :meth:`get_root_dir` возвращает корневую директорию дерева 
+    текущего поколения проекта.
     """
     __table_args__ = (
             db.UniqueConstraint('user_id', 'project_name'),
@@ -152,7 +156,35 @@ class Project(db.Model):
     update_time = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow)
     #: hook_id (*int*) - идентификатор веб-хука подключенного к проекту
     hook_id = db.Column(db.Integer)
+    #: max_blob_size (*int*) - максимальный размер анализируемого файла в 
+    #: байтах, если не указан, то используется параметр приложения 
+    #: *INGESTION_MAX_BLOB_SIZE*
+    max_blob_size = db.Column(db.Integer)
+    #: exclude_globs (*str*) - шаблоны путей файлов, которые не 
+    #: анализируются, по одному шаблону на строку
+    exclude_globs = db.Column(db.Text)
+    #: use_gitattributes (*bool*) - признак того, что файлы с атрибутом 
+    #: linguist-generated в .gitattributes не анализируются
+    use_gitattributes = db.Column(db.Boolean, nullable=False, default=True)
+    #: generation (*int*) - поколение дерева проекта, увеличивается при 
+    #: сбросе веб-хука, деревья прошлых поколений удаляются в фоне (см. 
+    #: :mod:`flaskr.collector`)
+    generation = db.Column(db.Integer, nullable=False, default=0)
+    #: analysis_revision (*int*) - ревизия результатов анализа, 
+    #: увеличивается, когда повторный анализ заменяет результаты файлов 
+    #: без изменения Git хешей (см. :mod:`flaskr.reanalysis`), входит в 
+    #: ключи кешей, которые зависят от результатов анализа
+    analysis_revision = db.Column(db.Integer, nullable=False, default=0)
     #: user (:class:`User`) - ссылка на модель владельца проекта (пользователя)
+
+    def get_root_dir(self):
+        """Возвращает корневую директорию дерева текущего поколения 
+        проекта или None, если дерево еще не загружено.
+
+        :rtype: :class:`Directory`
+        """
+        return Directory.query.filter_by(project_id=self.id, dir_name=None,
+                dir_parent_id=None, generation=self.generation).first()
     
     def __repr__(self):
         return '<Project %r>' % self.project_name
@@ -161,7 +193,7 @@ class Project(db.Model):
 class Directory(db.Model):
     """Модель директории, хранит свойства с информацией о директории 
     внутри проекта: *id*, *project_id*, *dir_name*, *dir_parent_id*, 
-    *git_hash*.
+    *git_hash*, *generation*.
     """
     __tablename__ = 'directory'
 
@@ -176,6 +208,9 @@ class Directory(db.Model):
     #: git_hash (*str*) - Git хеш содержимого директории, SHA-1 в hex 
     #: формате
     git_hash = db.Column(db.String(40), nullable=False) # Git использует SHA-1 и колонка хранит значения в hex формате
+    #: generation (*int*) - поколение дерева проекта (см. 
+    #: :attr:`Project.generation`), значимо только для корневой директории
+    generation = db.Column(db.Integer, nullable=False, default=0)
     #: files (*list*) - атрибут для задания связи один-ко-многим, список моделей файлов :class:`File` директории
     files = db.relationship('File', lazy=True, backref='parent_dir', cascade='all, delete', passive_deletes=True)
     #dir_parent = db.relationship('Directory', remote_side=[id], cascade='all, delete')
@@ -200,11 +235,17 @@ class File(db.Model):
     #: id (*int*) - идентификатор файла
     id = db.Column(db.Integer, primary_key=True)
     #: dir_id (*int*) - идентификатор директории файла
-    dir_id = db.Column(db.Integer, db.ForeignKey('directory.id', ondelete='CASCADE'), nullable=False)
+    dir_id = db.Column(db.Integer, db.ForeignKey('directory.id', ondelete='CASCADE'), nullable=False, index=True)
     #: file_name (*str*) - имя файла
     file_name = db.Column(db.String(80), nullable=False)
     #: git_hash (*str*) - Git хеш содержимого файла, SHA-1 в hex формате
     git_hash = db.Column(db.String(40), nullable=False) # Git использует SHA-1 и колонка хранит значения в hex формате
+    #: skip_reason (*str*) - причина, по которой файл не был 
+    #: проанализирован, None - если файл был проанализирован
+    skip_reason = db.Column(db.String(255))
+    #: churn (*int*) - количество загруженных изменений файла (Git хеш 
+    #: которых отличался), включая добавление файла
+    churn = db.Column(db.Integer, nullable=False, default=1)
     #: raw_metrics (*list*) - атрибут для задания связи один-к-одному, метрики файла :class:`RawMetrics`
     raw_metrics = db.relationship('RawMetrics', uselist=False, lazy=True, backref='file', cascade='all, delete', passive_deletes=True)
     #: halstead_metrics (*list*) - атрибут для задания связи один-к-одному, метрики файла :class:`HalsteadMetrics`
@@ -237,12 +278,20 @@ class RawMetrics(db.Model):
     comments = db.Column(db.Integer, nullable=False)
     #: blanks (*int*) - количество пустых строк
     blanks = db.Column(db.Integer, nullable=False)
+    #: analyzer_version (*str*) - версия анализатора, которым вычислены 
+    #: метрики (см. :func:`flaskr.analyzers.analyzer_version`), None - 
+    #: версия неизвестна
+    analyzer_version = db.Column(db.String(64))
  
 
 class HalsteadMetrics(db.Model):
     """Модель метрик Холстеда, хранит свойства с различными показателями 
     этой метрики:
     *id*, *n1*, *n2*, *N1*, *N2*.
+
+    Производные метрики Холстеда вычисляются свойствами 
+    :attr:`vocabulary`, :attr:`length`, :attr:`volume`, 
+    :attr:`difficulty`, :attr:`effort`, :attr:`bugs`.
     """
     #: id (*int*) - идентификатор метрик Холстеда
     id = db.Column(db.Integer, primary_key=True)
@@ -256,6 +305,44 @@ class HalsteadMetrics(db.Model):
     total_n1 = db.Column(db.Integer, nullable=False)
     #: total_n2 (*int*) - общее количество операндов N2
     total_n2 = db.Column(db.Integer, nullable=False)
+    #: analyzer_version (*str*) - версия анализатора, которым вычислены 
+    #: метрики (см. :func:`flaskr.analyzers.analyzer_version`), None - 
+    #: версия неизвестна
+    analyzer_version = db.Column(db.String(64))
+
+    @property
+    def vocabulary(self):
+        """Словарь программы n = n1 + n2."""
+        return self.unique_n1 + self.unique_n2
+
+    @property
+    def length(self):
+        """Длина программы N = N1 + N2."""
+        return self.total_n1 + self.total_n2
+
+    @property
+    def volume(self):
+        """Объем программы V = N * log2(n)."""
+        if self.vocabulary <= 0:
+            return 0.0
+        return self.length * math.log2(self.vocabulary)
+
+    @property
+    def difficulty(self):
+        """Сложность программы D = n1 / 2 * N2 / n2."""
+        if self.unique_n2 <= 0:
+            return 0.0
+        return self.unique_n1 / 2 * self.total_n2 / self.unique_n2
+
+    @property
+    def effort(self):
+        """Трудоемкость программирования E = D * V."""
+        return self.difficulty * self.volume
+
+    @property
+    def bugs(self):
+        """Оценка количества ошибок B = V / 3000."""
+        return self.volume / 3000
 
 
 class GraphType(enum.Enum):
@@ -273,7 +360,15 @@ class GraphVisualization(db.Model):
     """Модель визуализации в виде графа, хранит свойства с различными 
     описанием этой визуализации и саму визуализацию в dot формате:
     *id*, *graph_type*, *func_name*, *graph_dot*
+
+    Столбец *graph_dot* загружается отложенно, при первом обращении к 
+    нему. Список функций файла без описаний графов возвращает метод 
+    :meth:`functions`, описание графа одной функции - метод 
+    :meth:`get_dot`.
     """
+    __table_args__ = (
+            db.Index('ix_graph_visualization_file', 'file_id', 'graph_type', 'func_name'),
+    )
     #: id (*int*) - идентификатор визуализации
     id = db.Column(db.Integer, primary_key=True)
     #: file_id (*int*) - идетификатор файла, для которого хранится визуализация
@@ -283,5 +378,376 @@ class GraphVisualization(db.Model):
     #: func_name (*str*) - имя функции, для которой построен граф
     func_name = db.Column(db.String(255), nullable=False)
     #: graph_dot (*str*) - представление графа в DOT формате, которое хранится в строке
-    graph_dot = db.Column(db.Text(65535), nullable=False)
+    graph_dot = db.deferred(db.Column(db.Text(65535), nullable=False))
+    #: analyzer_version (*str*) - версия анализатора, которым вычислены 
+    #: граф (см. :func:`flaskr.analyzers.analyzer_version`), None - 
+    #: версия неизвестна
+    analyzer_version = db.Column(db.String(64))
+
+    @staticmethod
+    def functions(file_id, graph_type=GraphType.CFG):
+        """Возвращает функции файла, для которых построены графы, без 
+        загрузки описаний графов.
+
+        :param int file_id: идентификатор файла
+        :param graph_type: тип графа
+        :type graph_type: :class:`GraphType`
+        :returns: список строк с полями *func_name*, *graph_type* и 
+            *dot_size* - длина описания графа
+        :rtype: list
+        """
+        return db.session.execute(db.select(GraphVisualization.func_name,
+            GraphVisualization.graph_type,
+            db.func.length(GraphVisualization.graph_dot).label('dot_size'))
+            .where(GraphVisualization.file_id == file_id,
+                GraphVisualization.graph_type == graph_type)
+            .order_by(GraphVisualization.id)).all()
+
+    @staticmethod
+    def get_dot(file_id, func_name, graph_type=GraphType.CFG):
+        """Возвращает описание графа функции *func_name* файла или None, 
+        если граф не построен.
+
+        :param int file_id: идентификатор файла
+        :param str func_name: имя функции
+        :param graph_type: тип графа
+        :type graph_type: :class:`GraphType`
+        :rtype: str
+        """
+        return db.session.execute(db.select(GraphVisualization.graph_dot)
+            .where(GraphVisualization.file_id == file_id,
+                GraphVisualization.graph_type == graph_type,
+                GraphVisualization.func_name == func_name)).scalar()
+
+
+class IngestionJob(db.Model):
+    """Модель задания загрузки (ingestion) дерева репозитория, хранит 
+    сводку по загрузке и контрольную точку: *id*, *project_id*, 
+    *git_hash*, *start_time*, *duration*, *files_count*, *bytes_count*, 
+    *status*, *files_done*, *checkpoint_path*.
+
+    Трассировки отдельных файлов хранятся в модели :class:`FileTrace`.
+    """
+    #: id (*int*) - идентификатор задания
+    id = db.Column(db.Integer, primary_key=True)
+    #: project_id (*int*) - идентификатор проекта
+    project_id = db.Column(db.Integer, db.ForeignKey('project.id', ondelete='CASCADE'), nullable=False, index=True)
+    #: git_hash (*str*) - Git хеш загружаемого дерева, SHA-1 в hex формате
+    git_hash = db.Column(db.String(40), nullable=False)
+    #: start_time (*DateTime*) - время начала загрузки
+    start_time = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow)
+    #: duration (*float*) - длительность загрузки в секундах
+    duration = db.Column(db.Float, nullable=False, default=0.0)
+    #: files_count (*int*) - количество проанализированных файлов
+    files_count = db.Column(db.Integer, nullable=False, default=0)
+    #: bytes_count (*int*) - суммарный размер проанализированных файлов в байтах
+    bytes_count = db.Column(db.Integer, nullable=False, default=0)
+    #: status (*str*) - статус задания (running, done)
+    status = db.Column(db.String(16), nullable=False, default='running')
+    #: files_done (*int*) - количество обработанных узлов-файлов дерева на 
+    #: момент последней контрольной точки
+    files_done = db.Column(db.Integer, nullable=False, default=0)
+    #: checkpoint_path (*str*) - путь последнего обработанного файла на 
+    #: момент последней контрольной точки
+    checkpoint_path = db.Column(db.String(1024))
+    #: file_traces (*list*) - атрибут для задания связи один-ко-многим, трассировки файлов :class:`FileTrace`
+    file_traces = db.relationship('FileTrace', lazy='dynamic', backref='job', cascade='all, delete', passive_deletes=True)
+
+    @property
+    def files_per_second(self):
+        """Пропускная способность загрузки в файлах в секунду."""
+        if not self.duration:
+            return 0.0
+        return self.files_count / self.duration
+
+    @property
+    def mb_per_second(self):
+        """Пропускная способность загрузки в мегабайтах в секунду."""
+        if not self.duration:
+            return 0.0
+        return self.bytes_count / (1024 * 1024) / self.duration
+
+    def slowest_files(self, limit=10):
+        """Возвращает трассировки самых медленных файлов задания.
+
+        :param int limit: максимальное количество трассировок
+        :returns: список моделей :class:`FileTrace`, отсортированный по убыванию общего времени
+        :rtype: list
+        """
+        return self.file_traces.order_by(FileTrace.total_time.desc())\
+                .limit(limit).all()
+
+    def __repr__(self):
+        return '<IngestionJob %r [ %r ]>' % (self.id, self.git_hash)
+
+
+class FileTrace(db.Model):
+    """Модель трассировки загрузки файла, хранит время каждого этапа 
+    обработки файла и размеры данных: *id*, *job_id*, *path*, 
+    *blob_size*, *dot_size*, *fetch_time*, *decode_time*, *raw_time*, 
+    *halstead_time*, *cfg_time*, *db_time*, *total_time*.
+
+    Время хранится в секундах.
+    """
+    __table_args__ = (
+            db.Index('ix_file_trace_job_total', 'job_id', 'total_time'),
+    )
+    #: id (*int*) - идентификатор трассировки
+    id = db.Column(db.Integer, primary_key=True)
+    #: job_id (*int*) - идентификатор задания загрузки :class:`IngestionJob`
+    job_id = db.Column(db.Integer, db.ForeignKey('ingestion_job.id', ondelete='CASCADE'), nullable=False)
+    #: path (*str*) - путь к файлу относительно корня репозитория
+    path = db.Column(db.String(1024), nullable=False)
+    #: blob_size (*int*) - размер содержимого файла в байтах
+    blob_size = db.Column(db.Integer, nullable=False, default=0)
+    #: dot_size (*int*) - суммарный размер построенных графов в DOT формате в байтах
+    dot_size = db.Column(db.Integer, nullable=False, default=0)
+    #: fetch_time (*float*) - время получения содержимого файла
+    fetch_time = db.Column(db.Float, nullable=False, default=0.0)
+    #: decode_time (*float*) - время декодирования содержимого файла
+    decode_time = db.Column(db.Float, nullable=False, default=0.0)
+    #: raw_time (*float*) - время вычисления LOC метрик
+    raw_time = db.Column(db.Float, nullable=False, default=0.0)
+    #: halstead_time (*float*) - время вычисления метрик Холстеда
+    halstead_time = db.Column(db.Float, nullable=False, default=0.0)
+    #: cfg_time (*float*) - время построения графов потока управления
+    cfg_time = db.Column(db.Float, nullable=False, default=0.0)
+    #: db_time (*float*) - время записи результатов в БД
+    db_time = db.Column(db.Float, nullable=False, default=0.0)
+    #: total_time (*float*) - общее время обработки файла
+    total_time = db.Column(db.Float, nullable=False, default=0.0)
+
+    def __repr__(self):
+        return '<FileTrace %r [ %r ]>' % (self.path, self.total_time)
+
+
+class WebhookDelivery(db.Model):
+    """Модель доставки события веб-хука, хранит идентификаторы уже 
+    обработанных доставок (заголовок *X-GitHub-Delivery*), чтобы 
+    повторные доставки отбрасывались: *delivery_id*, *project_id*, 
+    *event*, *received_time*.
+
+    Записи старше *WEBHOOK_DELIVERY_TTL* секунд удаляются (см. 
+    :func:`flaskr.delivery.is_duplicate`).
+    """
+    #: delivery_id (*str*) - идентификатор доставки Github
+    delivery_id = db.Column(db.String(64), primary_key=True)
+    #: project_id (*int*) - идентификатор проекта
+    project_id = db.Column(db.Integer, db.ForeignKey('project.id', ondelete='CASCADE'), nullable=False)
+    #: event (*str*) - название события веб-хука
+    event = db.Column(db.String(32), nullable=False)
+    #: received_time (*DateTime*) - время получения доставки
+    received_time = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow, index=True)
+
+    def __repr__(self):
+        return '<WebhookDelivery %r [ %r ]>' % (self.delivery_id, self.event)
+
+
+class ProjectLease(db.Model):
+    """Модель аренды (lease) проекта, сериализует загрузки дерева 
+    репозитория одного проекта: *project_id*, *owner*, *expires*, 
+    *pending_sha*, *pending_repository*.
+
+    Загрузку выполняет только владелец аренды. Событие push, которое 
+    пришло во время загрузки, сохраняет свой коммит в *pending_sha*, 
+    и владелец после завершения загрузки загружает самый новый из 
+    отложенных коммитов (см. :mod:`flaskr.delivery`).
+    """
+    #: project_id (*int*) - идентификатор проекта
+    project_id = db.Column(db.Integer, db.ForeignKey('project.id', ondelete='CASCADE'), primary_key=True)
+    #: owner (*str*) - идентификатор владельца аренды, None - если 
+    #: проект не арендован
+    owner = db.Column(db.String(64))
+    #: expires (*DateTime*) - время окончания аренды
+    expires = db.Column(db.DateTime)
+    #: pending_sha (*str*) - SHA отложенного коммита
+    pending_sha = db.Column(db.String(40))
+    #: pending_repository (*str*) - JSON-объект репозитория из события 
+    #: веб-хука отложенного коммита
+    pending_repository = db.Column(db.Text)
+
+    def __repr__(self):
+        return '<ProjectLease %r [ %r ]>' % (self.project_id, self.owner)
+
 
+class CommitSnapshot(db.Model):
+    """Модель снимка метрик проекта на коммите, хранит свойства: *id*, 
+    *project_id*, *generation*, *job_id*, *commit_sha*, *tree_sha*, 
+    *is_full*, *create_time*.
+
+    Снимок хранит только изменения (дельты) метрик файлов, Git хеш 
+    которых изменился в коммите (модель :class:`MetricsDelta`). Полный 
+    снимок хранит метрики всех файлов дерева. Состояние метрик на 
+    коммите восстанавливается из ближайшего предыдущего полного снимка 
+    и дельт следующих за ним снимков (см. :mod:`flaskr.history`).
+    """
+    __table_args__ = (
+            db.Index('ix_commit_snapshot_project', 'project_id', 'generation', 'id'),
+    )
+    #: id (*int*) - идентификатор снимка, снимки проекта упорядочены по 
+    #: идентификатору
+    id = db.Column(db.Integer, primary_key=True)
+    #: project_id (*int*) - идентификатор проекта
+    project_id = db.Column(db.Integer, db.ForeignKey('project.id', ondelete='CASCADE'), nullable=False)
+    #: generation (*int*) - поколение дерева проекта (см. 
+    #: :attr:`Project.generation`)
+    generation = db.Column(db.Integer, nullable=False, default=0)
+    #: job_id (*int*) - идентификатор задания загрузки :class:`IngestionJob`
+    job_id = db.Column(db.Integer, db.ForeignKey('ingestion_job.id', ondelete='SET NULL'), index=True)
+    #: commit_sha (*str*) - SHA коммита, None - если коммит неизвестен 
+    #: (например, при подключении веб-хука)
+    commit_sha = db.Column(db.String(40), index=True)
+    #: tree_sha (*str*) - Git хеш дерева коммита
+    tree_sha = db.Column(db.String(40), nullable=False)
+    #: is_full (*bool*) - признак полного снимка
+    is_full = db.Column(db.Boolean, nullable=False, default=False)
+    #: create_time (*DateTime*) - время создания снимка
+    create_time = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow)
+    #: deltas (*list*) - атрибут для задания связи один-ко-многим, дельты метрик снимка :class:`MetricsDelta`
+    deltas = db.relationship('MetricsDelta', lazy='dynamic', backref='snapshot', cascade='all, delete', passive_deletes=True)
+
+    def __repr__(self):
+        return '<CommitSnapshot %r [ %r ]>' % (self.id, self.commit_sha)
+
+
+class MetricsDelta(db.Model):
+    """Модель дельты метрик файла в снимке :class:`CommitSnapshot`, 
+    хранит метрики файла после коммита: *id*, *snapshot_id*, *path*, 
+    *git_hash*, *skipped*, *filled*, LOC метрики, метрики Холстеда и хеши графов 
+    потока управления функций *cfg_hashes*.
+
+    Метрики, которые не вычислялись для файла, равны None.
+    """
+    __table_args__ = (
+            db.Index('ix_metrics_delta_snapshot_path', 'snapshot_id', 'path'),
+            db.Index('ix_metrics_delta_path', 'path'),
+    )
+    #: id (*int*) - идентификатор дельты
+    id = db.Column(db.Integer, primary_key=True)
+    #: snapshot_id (*int*) - идентификатор снимка
+    snapshot_id = db.Column(db.Integer, db.ForeignKey('commit_snapshot.id', ondelete='CASCADE'), nullable=False)
+    #: path (*str*) - путь к файлу относительно корня репозитория
+    path = db.Column(db.String(1024), nullable=False)
+    #: git_hash (*str*) - Git хеш содержимого файла
+    git_hash = db.Column(db.String(40), nullable=False)
+    #: skipped (*bool*) - признак того, что файл не был проанализирован 
+    #: (см. :attr:`File.skip_reason`)
+    skipped = db.Column(db.Boolean, nullable=False, default=False)
+    #: filled (*bool*) - признак того, что дельта дописана в полный 
+    #: снимок, а файл в коммите не изменялся
+    filled = db.Column(db.Boolean, nullable=False, default=False)
+    #: loc (*int*) - общее количество строк кода
+    loc = db.Column(db.Integer)
+    #: lloc (*int*) - количество логических строк кода
+    lloc = db.Column(db.Integer)
+    #: ploc (*int*) - количество физических строк кода
+    ploc = db.Column(db.Integer)
+    #: comments (*int*) - количество строк комментариев
+    comments = db.Column(db.Integer)
+    #: blanks (*int*) - количество пустых строк
+    blanks = db.Column(db.Integer)
+    #: unique_n1 (*int*) - количество уникальных операторов n1
+    unique_n1 = db.Column(db.Integer)
+    #: unique_n2 (*int*) - количество уникальных операндов n2
+    unique_n2 = db.Column(db.Integer)
+    #: total_n1 (*int*) - общее количество операторов N1
+    total_n1 = db.Column(db.Integer)
+    #: total_n2 (*int*) - общее количество операндов N2
+    total_n2 = db.Column(db.Integer)
+    #: cfg_hashes (*str*) - JSON-объект {имя функции: SHA-1 графа в DOT 
+    #: формате}, None - если графы не строились
+    cfg_hashes = db.Column(db.Text)
+
+    def __repr__(self):
+        return '<MetricsDelta %r [ %r ]>' % (self.path, self.git_hash)
+
+
+class SearchEntry(db.Model):
+    """Модель записи поискового индекса проекта, хранит имя функции или 
+    файла и путь к файлу: *id*, *project_id*, *generation*, *file_id*, 
+    *kind*, *name*, *name_lower*, *path*, *path_lower*.
+
+    Поиск по префиксу выполняется запросом диапазона по индексу имени 
+    (или пути) в нижнем регистре, нечеткий поиск - по триграммам имени 
+    (модель :class:`SearchTrigram`). Индекс поддерживается загрузкой 
+    дерева репозитория (см. :mod:`flaskr.search`).
+    """
+    __table_args__ = (
+            db.Index('ix_search_entry_name', 'project_id', 'generation', 'name_lower'),
+            db.Index('ix_search_entry_path', 'project_id', 'generation', 'path_lower'),
+    )
+    #: id (*int*) - идентификатор записи
+    id = db.Column(db.Integer, primary_key=True)
+    #: project_id (*int*) - идентификатор проекта
+    project_id = db.Column(db.Integer, db.ForeignKey('project.id', ondelete='CASCADE'), nullable=False)
+    #: generation (*int*) - поколение дерева проекта (см. 
+    #: :attr:`Project.generation`)
+    generation = db.Column(db.Integer, nullable=False, default=0)
+    #: file_id (*int*) - идентификатор файла
+    file_id = db.Column(db.Integer, db.ForeignKey('file.id', ondelete='CASCADE'), nullable=False, index=True)
+    #: kind (*str*) - тип записи: file - файл, function - функция
+    kind = db.Column(db.String(16), nullable=False)
+    #: name (*str*) - имя функции или файла
+    name = db.Column(db.String(255), nullable=False)
+    #: name_lower (*str*) - имя в нижнем регистре
+    name_lower = db.Column(db.String(255), nullable=False)
+    #: path (*str*) - путь к файлу относительно корня репозитория
+    path = db.Column(db.String(1024), nullable=False)
+    #: path_lower (*str*) - путь к файлу в нижнем регистре
+    path_lower = db.Column(db.String(1024), nullable=False)
+
+    def __repr__(self):
+        return '<SearchEntry %r [ %r ]>' % (self.name, self.path)
+
+
+class SearchTrigram(db.Model):
+    """Модель триграммы имени записи поискового индекса 
+    :class:`SearchEntry`: *entry_id*, *project_id*, *generation*, 
+    *trigram*.
+    """
+    __table_args__ = (
+            db.Index('ix_search_trigram', 'project_id', 'generation', 'trigram', 'entry_id'),
+    )
+    #: entry_id (*int*) - идентификатор записи поискового индекса
+    entry_id = db.Column(db.Integer, db.ForeignKey('search_entry.id', ondelete='CASCADE'), primary_key=True)
+    #: trigram (*str*) - триграмма имени в нижнем регистре
+    trigram = db.Column(db.String(3), primary_key=True)
+    #: project_id (*int*) - идентификатор проекта
+    project_id = db.Column(db.Integer, nullable=False)
+    #: generation (*int*) - поколение дерева проекта
+    generation = db.Column(db.Integer, nullable=False)
+
+
+class Hotspot(db.Model):
+    """Модель горячей точки проекта - файла, который часто изменяется и 
+    имеет высокую сложность: *file_id*, *project_id*, *generation*, 
+    *path*, *churn*, *loc*, *volume*, *score*.
+
+    Оценка *score* равна произведению количества изменений файла на его 
+    сложность (объем Холстеда, а если он не вычислялся - количество 
+    строк кода). Горячие точки поддерживаются загрузкой дерева 
+    репозитория (см. :mod:`flaskr.hotspots`), а рейтинг читается по 
+    индексу без обхода всех файлов проекта.
+    """
+    __table_args__ = (
+            db.Index('ix_hotspot_score', 'project_id', 'generation', 'score'),
+    )
+    #: file_id (*int*) - идентификатор файла
+    file_id = db.Column(db.Integer, db.ForeignKey('file.id', ondelete='CASCADE'), primary_key=True)
+    #: project_id (*int*) - идентификатор проекта
+    project_id = db.Column(db.Integer, db.ForeignKey('project.id', ondelete='CASCADE'), nullable=False)
+    #: generation (*int*) - поколение дерева проекта
+    generation = db.Column(db.Integer, nullable=False, default=0)
+    #: path (*str*) - путь к файлу относительно корня репозитория
+    path = db.Column(db.String(1024), nullable=False)
+    #: churn (*int*) - количество изменений файла (см. :attr:`File.churn`)
+    churn = db.Column(db.Integer, nullable=False)
+    #: loc (*int*) - общее количество строк кода
+    loc = db.Column(db.Integer)
+    #: volume (*float*) - объем Холстеда
+    volume = db.Column(db.Float)
+    #: score (*float*) - оценка горячей точки
+    score = db.Column(db.Float, nullable=False)
+
+    def __repr__(self):
+        return '<Hotspot %r [ %r ]>' % (self.path, self.score)
@@ -0,0 +1,177 @@
+"""Модуль **policy** содержит политики загрузки (ingestion) файлов
+проекта. Политика определяет, какие файлы не нужно анализировать:
+файлы больше максимального размера, файлы, которые подходят под
+шаблоны исключений (например, ``vendor/**`` или ``*_generated.c``), и
+файлы, которые помечены в *.gitattributes* атрибутом
+*linguist-generated*.
+
+Политика применяется до получения содержимого файла, размер файла
+берется из узла дерева коммита.
+"""
+import fnmatch
+from flask import current_app
+from flask import g
+
+
+def _match_parts(pattern, parts):
+    """Сравнивает части пути *parts* с частями шаблона *pattern*. Часть
+    шаблона ``**`` подходит под любое количество частей пути.
+    """
+    if not pattern:
+        return not parts
+
+    if pattern[0] == '**':
+        return any(_match_parts(pattern[1:], parts[i:])
+                for i in range(len(parts) + 1))
+
+    return bool(parts) and fnmatch.fnmatchcase(parts[0], pattern[0]) \
+            and _match_parts(pattern[1:], parts[1:])
+
+
+def match_path(pattern, path):
+    """Проверяет, подходит ли путь *path* под шаблон *pattern*.
+
+    Шаблоны без символа ``/`` сравниваются с именем файла в любой
+    директории, остальные шаблоны - с путем относительно корня
+    репозитория (как в *.gitattributes*). Символ ``*`` не подходит под
+    ``/``, часть шаблона ``**`` подходит под любое количество
+    директорий. Шаблон с ``/`` на конце (например, ``vendor/``)
+    обозначает директорию, под него подходят все файлы этой директории
+    и ее поддиректорий.
+
+    :param str pattern: шаблон пути
+    :param str path: путь к файлу относительно корня репозитория
+    :rtype: bool
+    """
+    pattern = pattern.strip()
+    is_dir = pattern.endswith('/')
+    is_anchored = '/' in pattern.rstrip('/')
+    pattern = pattern.strip('/')
+    parts = path.split('/')
+
+    if is_dir:
+        dirs = parts[:-1]
+        if is_anchored:
+            return _match_parts(pattern.split('/') + ['**'], dirs)
+        return any(fnmatch.fnmatchcase(d, pattern) for d in dirs)
+
+    if not is_anchored:
+        return fnmatch.fnmatchcase(parts[-1], pattern)
+
+    return _match_parts(pattern.split('/'), parts)
+
+
+def parse_gitattributes(text):
+    """Разбирает содержимое файла *.gitattributes* и возвращает правила
+    для атрибута *linguist-generated*.
+
+    :param str text: содержимое файла *.gitattributes*
+    :returns: список пар (шаблон, признак сгенерированного файла)
+    :rtype: list
+    """
+    rules = []
+
+    for line in text.splitlines():
+        line = line.strip()
+
+        if not line or line.startswith('#'):
+            continue
+
+        pattern, *attrs = line.split()
+
+        for attr in attrs:
+            if attr in ('linguist-generated', 'linguist-generated=true'):
+                rules.append((pattern, True))
+            elif attr in ('-linguist-generated', '!linguist-generated',
+                    'linguist-generated=false'):
+                rules.append((pattern, False))
+
+    return rules
+
+
+class IngestionPolicy:
+    """Политика загрузки файлов проекта.
+
+    :param int max_blob_size: максимальный размер файла в байтах, None - без ограничения
+    :param excludes: шаблоны путей, которые не анализируются
+    :param generated: правила *linguist-generated* из :func:`parse_gitattributes`
+    """
+    def __init__(self, max_blob_size=None, excludes=(), generated=()):
+        self.max_blob_size = max_blob_size
+        self.excludes = [e for e in excludes if e.strip()]
+        self.generated = list(generated)
+
+    @classmethod
+    def from_project(cls, project, gitattributes=None):
+        """Создает политику по настройкам проекта *project*. Если у
+        проекта не указаны настройки, то используются параметры
+        приложения *INGESTION_MAX_BLOB_SIZE* и *INGESTION_EXCLUDES*.
+
+        :param project: модель проекта
+        :type project: :class:`flaskr.models.Project`
+        :param str gitattributes: содержимое файла *.gitattributes* из корня репозитория
+        :rtype: :class:`IngestionPolicy`
+        """
+        max_blob_size = project.max_blob_size
+        if max_blob_size is None:
+            max_blob_size = current_app.config.get('INGESTION_MAX_BLOB_SIZE')
+
+        if project.exclude_globs is not None:
+            excludes = project.exclude_globs.splitlines()
+        else:
+            excludes = current_app.config.get('INGESTION_EXCLUDES', ())
+
+        generated = ()
+        if gitattributes and project.use_gitattributes:
+            generated = parse_gitattributes(gitattributes)
+
+        return cls(max_blob_size, excludes, generated)
+
+    def skip_reason(self, path, size=None):
+        """Возвращает причину, по которой файл не анализируется, или None,
+        если файл нужно анализировать.
+
+        :param str path: путь к файлу относительно корня репозитория
+        :param int size: размер файла в байтах
+        :rtype: str
+        """
+        if self.max_blob_size is not None and size is not None \
+                and size > self.max_blob_size:
+            return 'Размер файла (%d байт) превышает ограничение %d байт' \
+                    % (size, self.max_blob_size)
+
+        for pattern in self.excludes:
+            if match_path(pattern, path):
+                return 'Файл исключен шаблоном %s' % pattern
+
+        is_generated = False
+        for pattern, value in self.generated:
+            if match_path(pattern, path):
+                is_generated = value
+
+        if is_generated:
+            return 'Файл помечен как сгенерированный (linguist-generated) в .gitattributes'
+
+        return None
+
+
+def begin(policy):
+    """Устанавливает политику *policy* для текущей загрузки, политика
+    хранится в глобальном контексте приложения (в объекте g).
+
+    :param policy: политика загрузки
+    :type policy: :class:`IngestionPolicy`
+    """
+    g.ingestion_policy = policy
+
+
+def get_policy():
+    """Возвращает политику текущей загрузки. Если политика не была
+    установлена функцией :func:`begin`, то возвращается политика без
+    ограничений.
+
+    :rtype: :class:`IngestionPolicy`
+    """
+    if 'ingestion_policy' not in g:
+        g.ingestion_policy = IngestionPolicy()
+    return g.ingestion_policy
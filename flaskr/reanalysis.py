@@ -0,0 +1,322 @@
+"""Модуль **reanalysis** содержит повторный анализ файлов после
+обновления анализаторов (пакетов *metrics* и *visualization*).
+
+Результаты анализа (:class:`flaskr.models.RawMetrics`,
+:class:`flaskr.models.HalsteadMetrics`,
+:class:`flaskr.models.GraphVisualization`) помечены версией
+анализатора (см. :func:`flaskr.analyzers.analyzer_version`).
+Результаты с другой или неизвестной версией считаются устаревшими
+(см. :func:`stale_files`), и файл анализируется заново только теми
+анализаторами, результаты которых устарели. Содержимое файлов читается
+по Git хешу из хранилища содержимого (см. :mod:`flaskr.blobstore`),
+зеркала репозитория проекта или локальной копии репозитория (см.
+:class:`ContentReader`), без обращения к Github API.
+
+Файлы анализируются в пуле процессов, а результаты заменяются частями
+по *REANALYSIS_BATCH_SIZE* файлов: старые результаты файла удаляются и
+новые записываются в одной транзакции, поэтому до фиксации части сайт
+показывает старые результаты. Между частями делается пауза
+*REANALYSIS_BATCH_PAUSE* секунд, чтобы не загружать БД. Каждая часть
+увеличивает ревизию результатов анализа проекта
+(:attr:`flaskr.models.Project.analysis_revision`), которая входит в
+ключи кешей.
+
+Версии хранятся в самих результатах, поэтому прерванный анализ
+продолжается повторным запуском команды ``flask reanalyze``. Снимки
+метрик коммитов (см. :mod:`flaskr.history`) не пересчитываются.
+"""
+import collections
+import os
+import time
+from contextlib import closing
+from flask import current_app
+from flaskr import analyzers
+from flaskr import blobstore
+from flaskr import delivery
+from flaskr import gitobj
+from flaskr import sources
+from flaskr import tracing
+from flaskr.hotspots import HotspotTracker
+from flaskr.models import db
+from flaskr.models import Directory
+from flaskr.models import File
+from flaskr.models import GraphVisualization
+from flaskr.models import HalsteadMetrics
+from flaskr.models import Project
+from flaskr.models import RawMetrics
+from flaskr.search import SearchIndexer
+
+#: Модели результатов анализаторов {имя анализатора: модель}
+MODELS = {
+    'raw': RawMetrics,
+    'halstead': HalsteadMetrics,
+    'cfg': GraphVisualization
+}
+
+#: Анализаторы, результаты которых вместе нужны для пересчета горячей
+#: точки файла (см. :meth:`flaskr.hotspots.HotspotTracker.update`)
+_HOTSPOT_ANALYZERS = ('raw', 'halstead')
+
+
+class ContentReader:
+    """Читает содержимое файлов проекта по Git хешу из хранилища
+    содержимого (см. :mod:`flaskr.blobstore`), затем из зеркала
+    репозитория (см. :class:`flaskr.sources.GitMirrorSource`), если оно
+    есть, и из локальной копии репозитория *checkout*. Содержимое из
+    зеркала и локальной копии сохраняется в хранилище.
+
+    :param int project_id: идентификатор проекта
+    :param str checkout: путь к локальной копии репозитория, файлы
+        которой используются, только если их Git хеш совпадает
+    """
+    def __init__(self, project_id, checkout=None):
+        path = sources.mirror_path(project_id)
+        self.mirror = sources.GitMirrorSource(path) \
+                if os.path.isdir(path) else None
+        self.checkout = checkout
+
+    def read(self, path, sha):
+        """Возвращает содержимое файла *path* с Git хешем *sha* или None,
+        если содержимое недоступно.
+
+        :param str path: путь к файлу относительно корня репозитория
+        :param str sha: Git хеш файла
+        :rtype: bytes
+        """
+        data = blobstore.get(sha)
+        if data is not None:
+            return data
+
+        if self.mirror is not None:
+            try:
+                data = self.mirror.blob({'sha': sha})
+            except KeyError:
+                pass
+
+        if data is None and self.checkout is not None:
+            full = os.path.join(self.checkout, *path.split('/'))
+            if os.path.isfile(full) and not os.path.islink(full):
+                with open(full, 'rb') as f:
+                    data = f.read()
+                if gitobj.blob_sha(data) != sha:
+                    data = None
+
+        if data is not None:
+            blobstore.put(sha, data)
+        return data
+
+    def close(self):
+        """Освобождает ресурсы зеркала."""
+        if self.mirror is not None:
+            self.mirror.close()
+
+
+def stale_files(root_dir):
+    """Возвращает файлы дерева с корнем *root_dir*, у которых есть
+    результаты анализа с устаревшей версией. Файлы, пропущенные
+    политикой загрузки, не возвращаются.
+
+    :param root_dir: корневая директория дерева проекта
+    :type root_dir: :class:`flaskr.models.Directory`
+    :returns: список строк с полями *id*, *dir_id*, *file_name*,
+        *git_hash* и признаками устаревания результатов для каждого
+        анализатора из :data:`MODELS` (поле с именем анализатора),
+        отсортированный по *id*
+    :rtype: list
+    """
+    tree = db.select(Directory.id).where(Directory.id == root_dir.id)\
+            .cte('tree', recursive=True)
+    tree = tree.union_all(db.select(Directory.id)
+            .where(Directory.dir_parent_id == tree.c.id))
+
+    stale = {name: File.id.in_(db.select(model.file_id).where(
+        model.analyzer_version.is_distinct_from(
+            analyzers.analyzer_version(name))))
+        for name, model in MODELS.items()}
+
+    return db.session.execute(db.select(File.id, File.dir_id,
+        File.file_name, File.git_hash,
+        *(condition.label(name) for name, condition in stale.items()))
+        .where(File.dir_id.in_(db.select(tree.c.id)),
+            File.skip_reason.is_(None), db.or_(*stale.values()))
+        .order_by(File.id)).all()
+
+
+def _analyze(task):
+    """Декодирует содержимое файла и запускает анализаторы. Функция
+    выполняется в процессах пула :func:`reanalyze` и не обращается к БД.
+
+    :param tuple task: путь к файлу, содержимое, имена анализаторов,
+        кодировка для недекодируемых файлов
+    :returns: результаты анализаторов {имя: результат}, время этапов
+        {этап: секунды}
+    :rtype: tuple
+    """
+    from flaskr.webhook import decode_bytes
+
+    path, data, names, fallback = task
+    times = {}
+
+    start = time.perf_counter()
+    content = decode_bytes(data, fallback)
+    times['decode'] = time.perf_counter() - start
+
+    results = {}
+    for name in names:
+        start = time.perf_counter()
+        results[name] = analyzers.run_analyzer(name, path, content)
+        times[name] = time.perf_counter() - start
+
+    return results, times
+
+
+def _swap(f, path, results, indexer, tracker):
+    """Заменяет результаты анализа файла *f* результатами *results*,
+    обновляет поисковый индекс функций и горячую точку файла.
+    """
+    from flaskr.webhook import _STORE_FUNCS
+
+    for name, result in results.items():
+        _STORE_FUNCS[name](f, result, True)
+    if 'cfg' in results:
+        indexer.index_functions(f, path, results['cfg'])
+    tracker.update(f, path, results)
+
+
+def reanalyze(project, checkout=None, workers=None, batch_size=None,
+        pause=None, progress=None):
+    """Повторно анализирует файлы текущего дерева проекта *project* с
+    устаревшими результатами анализа.
+
+    На время анализа проект арендуется (см. :func:`flaskr.delivery.acquire`),
+    поэтому загрузки веб-хука не изменяют дерево одновременно с
+    анализом, а коммиты событий push, пришедших во время анализа,
+    загружаются после него.
+
+    :param project: проект
+    :type project: :class:`flaskr.models.Project`
+    :param str checkout: путь к локальной копии репозитория (см.
+        :class:`ContentReader`)
+    :param int workers: количество процессов, по умолчанию - количество
+        процессоров
+    :param int batch_size: количество файлов в одной части, по умолчанию
+        параметр приложения *REANALYSIS_BATCH_SIZE*
+    :param float pause: пауза между частями в секундах, по умолчанию
+        параметр приложения *REANALYSIS_BATCH_PAUSE*
+    :param progress: функция ``progress(summary)``, которая вызывается
+        после фиксации каждой части
+    :returns: сводка (см. :meth:`flaskr.tracing.IngestionTracer.summary`)
+        с дополнительными полями *stale* - количество файлов с
+        устаревшими результатами и *missing* - количество файлов,
+        содержимое которых недоступно, или None, если дерево проекта не
+        загружено или загружается
+    :rtype: dict
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    from flaskr.filters import dir_path
+    from flaskr.webhook import update_to_commit
+
+    if batch_size is None:
+        batch_size = current_app.config['REANALYSIS_BATCH_SIZE']
+    if pause is None:
+        pause = current_app.config['REANALYSIS_BATCH_PAUSE']
+
+    project_id = project.id
+    lease = delivery.acquire(project_id)
+    if lease is None:
+        return None
+
+    try:
+        root_dir = project.get_root_dir()
+        if root_dir is None or not root_dir.git_hash:
+            lease.release()
+            return None
+
+        rows = stale_files(root_dir)
+        indexer = SearchIndexer(project_id, project.generation)
+        tracker = HotspotTracker(project_id, project.generation)
+        tracer = tracing.IngestionTracer()
+        fallback = current_app.config.get('SOURCE_FALLBACK_ENCODING',
+                'latin-1')
+        missing = 0
+
+        def tasks(batch):
+            nonlocal missing
+            for row in batch:
+                f = db.session.get(File, row.id)
+                path = dir_path(f.parent_dir) + f.file_name
+                stale = {name for name in MODELS if row._mapping[name]}
+                # Горячая точка пересчитывается по обеим метрикам
+                if stale & set(_HOTSPOT_ANALYZERS):
+                    stale.update(_HOTSPOT_ANALYZERS)
+                names = [name for name in analyzers.analyzers_for(path)
+                        if name in stale]
+                if not names:
+                    continue
+
+                start = time.perf_counter()
+                data = reader.read(path, row.git_hash)
+                fetch_time = time.perf_counter() - start
+                if data is None:
+                    current_app.logger.info('reanalysis.missing %s', path)
+                    missing += 1
+                    continue
+
+                yield (path, data, names, fallback), \
+                        (f, path, len(data), fetch_time)
+
+        def store(future, item):
+            f, path, size, fetch_time = item
+            results, times = future.result()
+            tracer.start_file(path)
+            tracer.add_size('blob_size', size)
+            tracer.add_time('fetch', fetch_time)
+            for stage, seconds in times.items():
+                tracer.add_time(stage, seconds)
+            with tracer.stage('db'):
+                _swap(f, path, results, indexer, tracker)
+            tracer.finish_file()
+
+        workers = workers or os.cpu_count() or 1
+        with closing(ContentReader(project_id, checkout)) as reader, \
+                ProcessPoolExecutor(workers) as executor:
+            for i in range(0, len(rows), batch_size):
+                files_count = tracer.files_count
+                pending = collections.deque()
+                for task, item in tasks(rows[i:i + batch_size]):
+                    pending.append((executor.submit(_analyze, task), item))
+                    if len(pending) >= 4 * workers:
+                        store(*pending.popleft())
+                while pending:
+                    store(*pending.popleft())
+
+                if tracer.files_count > files_count:
+                    project = db.session.get(Project, project_id)
+                    project.analysis_revision += 1
+                lease.renew()
+                db.session.commit()
+                # Зафиксированные модели больше не нужны
+                db.session.expunge_all()
+
+                if progress is not None:
+                    progress(dict(tracer.summary(), stale=len(rows),
+                        missing=missing))
+                if pause and i + batch_size < len(rows):
+                    time.sleep(pause)
+
+        summary = dict(tracer.finish(), stale=len(rows), missing=missing)
+        current_app.logger.info('reanalysis.done project=%d files=%d '
+                'missing=%d', project_id, summary['files'], missing)
+
+        pending = lease.release()
+        while pending is not None:
+            sha, repository = pending
+            update_to_commit(project_id, repository, sha)
+            pending = lease.release()
+    except BaseException:
+        # Аренда освобождается и при прерывании команды (Ctrl+C), чтобы
+        # повторный запуск продолжил анализ
+        lease.abandon()
+        raise
+
+    return summary
@@ -0,0 +1,228 @@
+"""Модуль **render** содержит пул отрисовки графов в формате DOT в SVG.
+
+Графы отрисовываются программой ``dot`` из Graphviz в отдельных
+процессах, которые запускают потоки пула (см. :func:`render_svg`).
+Описание графа передается через стандартный ввод, поэтому временные
+файлы не создаются. Количество одновременных отрисовок ограничено
+размером пула *RENDER_WORKERS*, а количество ожидающих - размером
+очереди *RENDER_QUEUE_SIZE*: если очередь заполнена, то граф не
+отрисовывается.
+
+Время отрисовки ограничено *RENDER_TIMEOUT* секундами с момента запроса,
+включая ожидание в очереди, а память процесса Graphviz -
+*RENDER_MEMORY_LIMIT* байтами. Ограничение памяти устанавливается
+командой ``ulimit`` оболочки, которая затем заменяется процессом
+Graphviz (см. :func:`_command`): функция *preexec_fn* модуля
+:mod:`subprocess` небезопасна в потоках пула. Графы, в которых больше
+*RENDER_CHEAP_FROM* вершин, отрисовываются более быстрой программой
+*RENDER_CHEAP_ENGINE*, а графы, в которых больше *RENDER_MAX_NODES*
+вершин, не отрисовываются.
+
+Если параметр приложения *CFG_RENDER_MODE* (или параметр запроса
+*render*) равен ``client``, то графы не отрисовываются на сервере:
+страница получает граф выбранной функции в виде JSON (см.
+:func:`client_graph`), а графы других функций запрашивает при
+переключении (см. :class:`flaskr.api.GraphSummary`), и раскладывает их
+в браузере, а отрисовка на сервере остается запасной для
+графов, которые не удалось разобрать.
+
+Графы, в которых больше *CFG_LOD_BUDGET* вершин, в обоих режимах
+заменяются сокращенным представлением (см. :mod:`flaskr.lod`).
+"""
+import os
+import re
+import subprocess
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from flask import current_app
+
+#: Результат отрисовки: *svg* - изображение или None, если граф не был
+#: отрисован, *status* - один из :data:`STATUSES`
+Rendered = namedtuple('Rendered', ['svg', 'status'])
+
+#: Статусы отрисовки: *ok* - граф отрисован, *cheap* - отрисован быстрой
+#: программой, *too_large* - граф слишком большой, *busy* - очередь
+#: заполнена, *timeout* - время истекло, *error* - ошибка Graphviz
+STATUSES = ('ok', 'cheap', 'too_large', 'busy', 'timeout', 'error')
+
+#: Режимы отрисовки графов: на сервере или в браузере
+RENDER_MODES = ('server', 'client')
+
+#: Определение вершины в описании графа на языке DOT:
+#: ``имя [атрибуты]`` без ребра ``->``
+_NODE_RE = re.compile(r'^\s*("[^"]*"|\w+)\s*\[(?![^\]]*->)', re.MULTILINE)
+
+#: Пул потоков отрисовки
+_executor = None
+
+#: Места в пуле и очереди отрисовки
+_slots = None
+
+#: Блокировка создания пула
+_lock = threading.Lock()
+
+
+def count_nodes(dot):
+    """Возвращает количество определений вершин в описании графа *dot*
+    на языке DOT без его разбора.
+
+    :param str dot: описание графа
+    :rtype: int
+    """
+    return len(_NODE_RE.findall(dot))
+
+
+def _pool():
+    global _executor, _slots
+
+    with _lock:
+        if _executor is None:
+            config = current_app.config
+            _executor = ThreadPoolExecutor(config['RENDER_WORKERS'],
+                    thread_name_prefix='styx-render')
+            _slots = threading.BoundedSemaphore(config['RENDER_WORKERS']
+                    + config['RENDER_QUEUE_SIZE'])
+
+    return _executor, _slots
+
+
+def _command(binary, engine, memory_limit):
+    """Возвращает команду запуска Graphviz. Если задано ограничение
+    памяти *memory_limit* в байтах, то Graphviz запускается оболочкой
+    ``sh``, которая устанавливает ограничение командой ``ulimit -v`` и
+    заменяет себя процессом Graphviz (``exec``).
+
+    :rtype: list
+    """
+    command = [binary, '-K' + engine, '-Tsvg']
+
+    if memory_limit and os.name == 'posix':
+        command = ['sh', '-c', 'ulimit -v %d && exec "$0" "$@"'
+                % (memory_limit // 1024)] + command
+
+    return command
+
+
+def _run(binary, engine, dot, deadline, memory_limit):
+    """Запускает Graphviz и возвращает изображение SVG или статус ошибки.
+    """
+    timeout = deadline - time.monotonic()
+    if timeout <= 0:
+        return None, 'timeout'
+
+    try:
+        completed = subprocess.run(_command(binary, engine, memory_limit),
+                input=dot.encode('utf-8'), stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return None, 'timeout'
+    except OSError:
+        return None, 'error'
+
+    if completed.returncode != 0:
+        return None, 'error'
+
+    return completed.stdout.decode('utf-8'), 'ok'
+
+
+def render_svg(dot):
+    """Отрисовывает граф *dot* в SVG в пуле отрисовки.
+
+    :param str dot: описание графа на языке DOT
+    :rtype: :class:`Rendered`
+    """
+    config = current_app.config
+    nodes = count_nodes(dot)
+
+    if nodes > config['RENDER_MAX_NODES']:
+        return Rendered(None, 'too_large')
+
+    engine, status = 'dot', 'ok'
+    if nodes > config['RENDER_CHEAP_FROM']:
+        engine, status = config['RENDER_CHEAP_ENGINE'], 'cheap'
+
+    executor, slots = _pool()
+    if not slots.acquire(blocking=False):
+        return Rendered(None, 'busy')
+
+    timeout = config['RENDER_TIMEOUT']
+    deadline = time.monotonic() + timeout
+
+    try:
+        future = executor.submit(_run, config['RENDER_DOT_BINARY'], engine,
+                dot, deadline, config['RENDER_MEMORY_LIMIT'])
+    except BaseException:
+        slots.release()
+        raise
+    # Место освобождается, когда отрисовка завершится, даже если ее
+    # результат уже не ждут
+    future.add_done_callback(lambda _: slots.release())
+
+    try:
+        # Процесс Graphviz завершается по своему таймауту, здесь
+        # небольшой запас на запуск процесса
+        svg, result = future.result(timeout + 1)
+    except FutureTimeoutError:
+        return Rendered(None, 'timeout')
+
+    if svg is None:
+        current_app.logger.warning('render.%s nodes=%d engine=%s',
+                result, nodes, engine)
+        return Rendered(None, result)
+
+    return Rendered(svg, status)
+
+
+def summarize_dot(text, budget, expand=()):
+    """Возвращает сокращенное представление графа *text* (см. 
+    :func:`flaskr.lod.summarize`), если в графе больше *budget* вершин 
+    или раскрыты свернутые вершины.
+
+    :param str text: описание графа на языке DOT
+    :param int budget: максимальное количество видимых вершин
+    :param expand: идентификаторы раскрытых вершин
+    :returns: сокращенный граф или None, если граф помещается в бюджет 
+        или не разбирается
+    :rtype: dict
+    """
+    from flaskr import dot
+    from flaskr import lod
+
+    if not expand and count_nodes(text) <= budget:
+        return None
+
+    try:
+        graph = dot.parse(text)
+    except dot.DotSyntaxError as e:
+        current_app.logger.warning('render.parse_error: %s', e)
+        return None
+
+    return lod.summarize(graph, budget, expand)
+
+
+def client_graph(text):
+    """Разбирает граф функции для отрисовки в браузере (см. 
+    :func:`flaskr.dot.parse`), большой граф сокращается до 
+    *CFG_LOD_BUDGET* вершин. Граф, описание которого длиннее 
+    *CFG_CLIENT_MAX_DOT_SIZE* символов или не разбирается, отрисовывается 
+    на сервере.
+
+    :param str text: описание графа на языке DOT
+    :returns: граф или None, если граф нужно отрисовать на сервере
+    :rtype: dict
+    """
+    from flaskr import dot
+    from flaskr import lod
+
+    if len(text) > current_app.config['CFG_CLIENT_MAX_DOT_SIZE']:
+        return None
+
+    try:
+        return lod.summarize(dot.parse(text), 
+                current_app.config['CFG_LOD_BUDGET'])
+    except dot.DotSyntaxError as e:
+        current_app.logger.warning('render.parse_error: %s', e)
+        return None
@@ -0,0 +1,244 @@
+"""Модуль **search** содержит поисковый индекс функций и файлов проекта.
+
+Индекс хранится в моделях :class:`flaskr.models.SearchEntry` и
+:class:`flaskr.models.SearchTrigram` и поддерживается загрузкой
+(ingestion) дерева репозитория: при добавлении файла создается запись
+файла, при построении графов потока управления - записи функций файла.
+Записи удаляются каскадно вместе с файлом. Индекс существующего
+проекта строится функцией :func:`rebuild` (команда
+``flask rebuild-search``).
+
+Функция :func:`search` сначала ищет имена (или пути, если запрос
+содержит ``/``), которые начинаются с запроса, запросом диапазона по
+индексу. Если найдено меньше записей, чем нужно, то выполняется
+нечеткий поиск по количеству общих триграмм имени и запроса.
+"""
+from flask import g
+from flaskr.models import db
+from flaskr.models import File
+from flaskr.models import GraphType
+from flaskr.models import GraphVisualization
+from flaskr.models import SearchEntry
+from flaskr.models import SearchTrigram
+
+#: Типы записей поискового индекса
+KINDS = ('file', 'function')
+
+#: Минимальная доля триграмм запроса, которые должны быть в имени при
+#: нечетком поиске
+FUZZY_THRESHOLD = 0.5
+
+
+#: Количество триграмм запроса, начиная с которого при нечетком поиске 
+#: используются только неперекрывающиеся триграммы
+SAMPLE_FROM = 6
+
+
+def _ordered_trigrams(name):
+    padded = '$' + name.lower() + '$'
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+
+def trigrams(name):
+    """Возвращает множество триграмм имени *name* в нижнем регистре. Имя
+    дополняется по краям символом ``$``, поэтому у коротких имен тоже
+    есть триграммы.
+
+    :param str name: имя
+    :rtype: set
+    """
+    return set(_ordered_trigrams(name))
+
+
+class SearchIndexer:
+    """Обновляет поисковый индекс проекта при загрузке дерева.
+
+    :param int project_id: идентификатор проекта
+    :param int generation: поколение дерева проекта
+    """
+    def __init__(self, project_id, generation):
+        self.project_id = project_id
+        self.generation = generation
+
+    def _add(self, file_id, kind, names, path):
+        entries = [SearchEntry(project_id=self.project_id,
+            generation=self.generation, file_id=file_id, kind=kind,
+            name=name, name_lower=name.lower(), path=path,
+            path_lower=path.lower()) for name in names]
+
+        if not entries:
+            return
+
+        db.session.add_all(entries)
+        db.session.flush()
+        db.session.execute(db.insert(SearchTrigram), [
+            {'entry_id': entry.id, 'trigram': trigram,
+                'project_id': self.project_id, 'generation': self.generation}
+            for entry in entries for trigram in trigrams(entry.name)])
+
+    def index_file(self, f, path):
+        """Добавляет запись нового файла *f*.
+
+        :param f: модель файла
+        :type f: :class:`flaskr.models.File`
+        :param str path: путь к файлу относительно корня репозитория
+        """
+        self._add(f.id, 'file', [f.file_name], path)
+
+    def index_functions(self, f, path, func_names):
+        """Заменяет записи функций файла *f*.
+
+        :param f: модель файла
+        :type f: :class:`flaskr.models.File`
+        :param str path: путь к файлу относительно корня репозитория
+        :param func_names: имена функций файла
+        """
+        remove_functions(f.id)
+        self._add(f.id, 'function', sorted(set(func_names)), path)
+
+
+def remove_functions(file_id):
+    """Удаляет записи функций файла *file_id* из поискового индекса.
+
+    :param int file_id: идентификатор файла
+    """
+    db.session.execute(db.delete(SearchEntry).where(
+        SearchEntry.file_id == file_id, SearchEntry.kind == 'function'))
+
+
+def begin(project_id, generation):
+    """Начинает обновление поискового индекса проекта при загрузке,
+    индексатор хранится в глобальном контексте приложения (в объекте g).
+
+    :param int project_id: идентификатор проекта
+    :param int generation: поколение дерева проекта
+    :rtype: :class:`SearchIndexer`
+    """
+    g.search_indexer = SearchIndexer(project_id, generation)
+    return g.search_indexer
+
+
+def get_indexer():
+    """Возвращает индексатор текущей загрузки или None, если обновление
+    индекса не было начато функцией :func:`begin`.
+
+    :rtype: :class:`SearchIndexer`
+    """
+    return g.get('search_indexer')
+
+
+def rebuild(project):
+    """Перестраивает поисковый индекс текущего поколения дерева проекта
+    по файлам и графам потока управления в БД.
+
+    :param project: проект
+    :type project: :class:`flaskr.models.Project`
+    :returns: количество записей индекса
+    :rtype: int
+    """
+    from flaskr.history import tree_paths
+
+    db.session.execute(db.delete(SearchEntry).where(
+        SearchEntry.project_id == project.id))
+
+    root_dir = project.get_root_dir()
+    if root_dir is None:
+        return 0
+
+    paths = tree_paths(root_dir)
+    functions = {}
+    for file_id, func_name in db.session.execute(db.select(
+            GraphVisualization.file_id, GraphVisualization.func_name)
+            .join(File, File.id == GraphVisualization.file_id)
+            .where(File.dir_id.in_(list(paths)),
+                GraphVisualization.graph_type == GraphType.CFG)):
+        functions.setdefault(file_id, []).append(func_name)
+
+    indexer = SearchIndexer(project.id, project.generation)
+    count = 0
+    for f in File.query.filter(File.dir_id.in_(list(paths))):
+        path = paths[f.dir_id] + f.file_name
+        names = sorted(set(functions.get(f.id, ())))
+        indexer.index_file(f, path)
+        indexer._add(f.id, 'function', names, path)
+        count += 1 + len(names)
+
+    return count
+
+
+def _result(entry, score):
+    return {'kind': entry.kind, 'name': entry.name, 'path': entry.path,
+            'file_id': entry.file_id, 'score': score}
+
+
+def search(project, query, kind=None, limit=20):
+    """Ищет функции и файлы текущего поколения дерева проекта.
+
+    :param project: проект
+    :type project: :class:`flaskr.models.Project`
+    :param str query: строка запроса
+    :param str kind: тип записей (см. :data:`KINDS`), None - все типы
+    :param int limit: максимальное количество результатов
+    :returns: список словарей с полями *kind*, *name*, *path*,
+        *file_id* и *score* (1.0 - совпадение по префиксу, иначе доля
+        общих триграмм), упорядоченный по убыванию *score*
+    :rtype: list
+    """
+    q = query.strip().lower()
+    if not q:
+        return []
+
+    criteria = [SearchEntry.project_id == project.id,
+            SearchEntry.generation == project.generation]
+    if kind is not None:
+        criteria.append(SearchEntry.kind == kind)
+
+    column = SearchEntry.path_lower if '/' in q else SearchEntry.name_lower
+    prefix = SearchEntry.query.filter(*criteria).filter(column >= q,
+            column < q + '\U0010ffff').order_by(column).limit(limit).all()
+
+    results = [_result(entry, 1.0) for entry in prefix]
+    if len(results) >= limit:
+        return results
+
+    query_trigrams = trigrams(q)
+    found = set(entry.id for entry in prefix)
+
+    # Для длинных запросов кандидаты ищутся по неперекрывающимся 
+    # триграммам, это втрое уменьшает количество строк индекса, а 
+    # точная оценка считается по всем триграммам
+    candidates = set(_ordered_trigrams(q)[::3]) \
+            if len(query_trigrams) > SAMPLE_FROM else query_trigrams
+    needed = max(1, int(len(candidates) * FUZZY_THRESHOLD))
+
+    candidates_query = db.select(SearchTrigram.entry_id,
+        db.func.count().label('hits'))\
+        .where(SearchTrigram.project_id == project.id,
+            SearchTrigram.generation == project.generation,
+            SearchTrigram.trigram.in_(candidates))
+    if kind is not None:
+        # Тип фильтруется до ограничения количества кандидатов, иначе
+        # записи другого типа могут занять все кандидаты
+        candidates_query = candidates_query.join(SearchEntry,
+                SearchEntry.id == SearchTrigram.entry_id)\
+                .where(SearchEntry.kind == kind)
+
+    matches = db.session.execute(candidates_query
+        .group_by(SearchTrigram.entry_id)
+        .having(db.func.count() >= needed)
+        .order_by(db.func.count().desc())
+        .limit(limit * 4)).all()
+
+    hits = [entry_id for entry_id, _count in matches if entry_id not in found]
+    if not hits:
+        return results
+
+    fuzzy = []
+    for entry in SearchEntry.query.filter(*criteria)\
+            .filter(SearchEntry.id.in_(hits)):
+        name_trigrams = trigrams(entry.name)
+        fuzzy.append(_result(entry, len(query_trigrams & name_trigrams) / 
+            len(query_trigrams | name_trigrams)))
+
+    fuzzy.sort(key=lambda r: (-r['score'], r['name']))
+    return results + fuzzy[:limit - len(results)]
@@ -0,0 +1,236 @@
+"""Модуль **sources** содержит источники (backend'ы), из которых читаются
+деревья коммитов и содержимое файлов репозитория при загрузке
+(ingestion) проекта.
+
+Источник реализует следующий интерфейс, который используют функции
+:func:`flaskr.webhook.add_tree_objs_to_db` и
+:func:`flaskr.webhook.update_tree_objs_in_db`:
+
+   * ``tree_of_default_branch(repository)`` - ссылка на дерево последнего коммита главной ветви
+   * ``tree_of_commit(repository, sha)`` - ссылка на дерево коммита *sha*
+   * ``root_tree(ref)`` - SHA и узлы дерева по ссылке *ref*
+   * ``subtree(o)`` - узлы поддерева для узла *o* типа tree
+   * ``blob(o)`` - содержимое файла для узла *o* типа blob в байтах
+   * ``close()`` - освобождает ресурсы источника
+
+Узлы дерева - это словари с полями *path*, *mode*, *type*, *sha* и
+*size* (для узлов типа blob), как в Github API.
+
+Источник через Github API реализован классом
+:class:`flaskr.webhook.GithubSource`, источник через локальное зеркало
+репозитория - классом :class:`GitMirrorSource`.
+"""
+import os
+import subprocess
+from flask import current_app
+from flask import g
+
+#: Количество объектов, размеры которых запрашиваются у
+#: ``git cat-file --batch-check`` за один раз.
+_BATCH_CHECK_CHUNK = 256
+
+
+class GitMirrorSource:
+    """Источник дерева и содержимого файлов из локального голого (bare)
+    зеркала репозитория.
+
+    Зеркало создается командой ``git clone --mirror`` и обновляется
+    командой ``git fetch``. Деревья и содержимое файлов читаются через
+    один долгоживущий процесс ``git cat-file --batch``, размеры файлов -
+    через процесс ``git cat-file --batch-check``.
+
+    :param str path: путь к зеркалу репозитория
+    """
+    def __init__(self, path):
+        self.path = path
+        self._batch = None
+        self._check = None
+
+    def _git(self, *args):
+        subprocess.run(['git', '--git-dir', self.path] + list(args),
+                check=True, stdout=subprocess.DEVNULL)
+
+    def update(self, clone_url):
+        """Создает зеркало репозитория *clone_url* или загружает в него
+        новые коммиты.
+
+        :param str clone_url: URL для клонирования репозитория
+        """
+        self.close()
+
+        if not os.path.isdir(self.path):
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)),
+                    exist_ok=True)
+            subprocess.run(['git', 'clone', '--mirror', '--quiet',
+                clone_url, self.path], check=True)
+        else:
+            self._git('fetch', '--prune', '--quiet', 'origin')
+
+    def _start(self, mode):
+        return subprocess.Popen(
+                ['git', '--git-dir', self.path, 'cat-file', mode],
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+    def _read(self, name):
+        """Читает объект *name* через ``git cat-file --batch``.
+
+        :param str name: SHA или другое имя объекта (например, ``<sha>^{tree}``)
+        :returns: кортеж (SHA, тип, содержимое)
+        :rtype: tuple
+        """
+        if self._batch is None:
+            self._batch = self._start('--batch')
+
+        self._batch.stdin.write(name.encode('utf-8') + b'\n')
+        self._batch.stdin.flush()
+
+        header = self._batch.stdout.readline().split()
+        if len(header) != 3:
+            raise KeyError('Объекта %s нет в репозитории %s'
+                    % (name, self.path))
+
+        sha, obj_type, size = header
+        data = self._batch.stdout.read(int(size) + 1)[:-1]
+
+        return sha.decode('ascii'), obj_type.decode('ascii'), data
+
+    def _sizes(self, shas):
+        """Возвращает размеры объектов *shas* через
+        ``git cat-file --batch-check``.
+
+        :param list shas: SHA объектов
+        :returns: словарь {SHA: размер}
+        :rtype: dict
+        """
+        if self._check is None:
+            self._check = self._start('--batch-check')
+
+        sizes = {}
+
+        for i in range(0, len(shas), _BATCH_CHECK_CHUNK):
+            chunk = shas[i:i + _BATCH_CHECK_CHUNK]
+            self._check.stdin.write(''.join(s + '\n' for s in chunk)
+                    .encode('ascii'))
+            self._check.stdin.flush()
+
+            for _ in chunk:
+                sha, _type, size = self._check.stdout.readline().split()
+                sizes[sha.decode('ascii')] = int(size)
+
+        return sizes
+
+    def _parse_tree(self, data):
+        """Разбирает содержимое объекта дерева в список узлов."""
+        entries = []
+        pos = 0
+
+        while pos < len(data):
+            space = data.index(b' ', pos)
+            nul = data.index(b'\0', space)
+            mode = data[pos:space].decode('ascii')
+            name = data[space + 1:nul].decode('utf-8', 'replace')
+            sha = data[nul + 1:nul + 21].hex()
+            pos = nul + 21
+
+            if mode.startswith('40'):
+                obj_type = 'tree'
+            elif mode == '160000':
+                obj_type = 'commit'
+            else:
+                obj_type = 'blob'
+
+            entries.append({'path': name, 'mode': mode.zfill(6),
+                'type': obj_type, 'sha': sha})
+
+        blobs = [o['sha'] for o in entries if o['type'] == 'blob']
+        sizes = self._sizes(blobs) if blobs else {}
+        for o in entries:
+            if o['type'] == 'blob':
+                o['size'] = sizes[o['sha']]
+
+        return entries
+
+    def tree_of_default_branch(self, repository):
+        """Обновляет зеркало и возвращает ссылку на дерево последнего
+        коммита главной ветви репозитория *repository*.
+
+        :param dict repository: JSON-объект репозитория из события веб-хука
+        :rtype: str
+        """
+        self.update(repository['clone_url'])
+        return 'refs/heads/' + repository['default_branch']
+
+    def tree_of_commit(self, repository, sha):
+        """Обновляет зеркало и возвращает ссылку на дерево коммита *sha*.
+
+        :param dict repository: JSON-объект репозитория из события веб-хука
+        :param str sha: SHA коммита
+        :rtype: str
+        """
+        self.update(repository['clone_url'])
+        return sha
+
+    def root_tree(self, ref):
+        """Возвращает SHA и узлы дерева коммита (или дерева) *ref*.
+
+        :param str ref: имя коммита, ветви или дерева
+        :rtype: tuple
+        """
+        sha, _type, data = self._read(ref + '^{tree}')
+        return sha, self._parse_tree(data)
+
+    def subtree(self, o):
+        """Возвращает узлы поддерева для узла *o* типа tree.
+
+        :param dict o: узел дерева
+        :rtype: list
+        """
+        return self._parse_tree(self._read(o['sha'])[2])
+
+    def blob(self, o):
+        """Возвращает содержимое файла для узла *o* типа blob.
+
+        :param dict o: узел дерева
+        :rtype: bytes
+        """
+        return self._read(o['sha'])[2]
+
+    def close(self):
+        """Завершает процессы ``git cat-file``."""
+        for proc in (self._batch, self._check):
+            if proc is not None:
+                proc.stdin.close()
+                proc.wait()
+                proc.stdout.close()
+
+        self._batch = None
+        self._check = None
+
+
+def mirror_path(project_id):
+    """Возвращает путь к зеркалу репозитория проекта в директории из
+    параметра приложения *GIT_MIRRORS_DIR*.
+
+    :param int project_id: идентификатор проекта
+    :rtype: str
+    """
+    return os.path.join(current_app.config['GIT_MIRRORS_DIR'],
+            '%d.git' % project_id)
+
+
+def begin(source):
+    """Устанавливает источник *source* для текущей загрузки, источник
+    хранится в глобальном контексте приложения (в объекте g).
+    """
+    g.ingestion_source = source
+
+
+def get_source():
+    """Возвращает источник текущей загрузки. Если источник не был
+    установлен функцией :func:`begin`, то возвращается источник через
+    Github API (:class:`flaskr.webhook.GithubSource`).
+    """
+    if 'ingestion_source' not in g:
+        from flaskr.webhook import GithubSource
+        g.ingestion_source = GithubSource()
+    return g.ingestion_source
@@ -0,0 +1,358 @@
+// Отрисовка графов потока управления в браузере.
+//
+// Граф приходит в виде JSON (см. модуль flaskr.dot): вершины {id, label,
+// shape} и ребра {source, target, label}. Раскладка по уровням: обратные
+// ребра (циклы) находятся обходом в глубину, уровень вершины - длина
+// самого длинного пути до нее, порядок вершин в уровне уточняется по
+// барицентрам соседей.
+//
+// Большие графы приходят в сокращенном виде (см. модуль flaskr.lod):
+// свернутые вершины (expandable) раскрываются по щелчку запросом
+// сокращенного графа с параметром expand.
+
+const SVG_NS = 'http://www.w3.org/2000/svg'
+const LINE_HEIGHT = 16
+const CHAR_WIDTH = 7.2
+const NODE_PADDING = 12
+const NODE_GAP = 30
+const RANK_GAP = 50
+const SWEEPS = 4
+
+function svgElem(name, attrs) {
+    let elem = document.createElementNS(SVG_NS, name)
+    for (const [key, value] of Object.entries(attrs || {})) {
+        elem.setAttribute(key, value)
+    }
+    return elem
+}
+
+function findBackEdges(count, out, inc) {
+    // Обход в глубину без рекурсии, сначала из вершин без входящих ребер
+    let state = new Array(count).fill(0)
+    let order = []
+    let back = new Set()
+    let roots = []
+    for (let i = 0; i < count; i++) {
+        if (inc[i].length === 0) roots.push(i)
+    }
+    for (let i = 0; i < count; i++) roots.push(i)
+
+    for (const root of roots) {
+        if (state[root] !== 0) continue
+        let stack = [[root, 0]]
+        state[root] = 1
+        while (stack.length) {
+            let top = stack[stack.length - 1]
+            let [v, k] = top
+            if (k < out[v].length) {
+                top[1]++
+                let [w, edgeIndex] = out[v][k]
+                if (state[w] === 1) {
+                    back.add(edgeIndex)
+                } else if (state[w] === 0) {
+                    state[w] = 1
+                    stack.push([w, 0])
+                }
+            } else {
+                state[v] = 2
+                order.push(v)
+                stack.pop()
+            }
+        }
+    }
+    // Топологический порядок - обратный порядку завершения обхода
+    return [back, order.reverse()]
+}
+
+function assignRanks(count, edges, back, topo) {
+    let rank = new Array(count).fill(0)
+    let forward = edges.map(() => [])
+    edges.forEach(([s, t], i) => {
+        if (!back.has(i) && s !== t) forward[s].push(t)
+    })
+    for (const v of topo) {
+        for (const w of forward[v]) {
+            rank[w] = Math.max(rank[w], rank[v] + 1)
+        }
+    }
+    return rank
+}
+
+function orderRanks(count, edges, back, rank, topo) {
+    let ranks = []
+    for (const v of topo) {
+        (ranks[rank[v]] = ranks[rank[v]] || []).push(v)
+    }
+    let up = [...Array(count)].map(() => [])
+    let down = [...Array(count)].map(() => [])
+    edges.forEach(([s, t], i) => {
+        if (back.has(i) || s === t) return
+        down[s].push(t)
+        up[t].push(s)
+    })
+
+    let position = new Array(count).fill(0)
+    const place = (layer) => layer.forEach((v, i) => { position[v] = i })
+    ranks.forEach(place)
+
+    const sweep = (layers, neighbours) => {
+        for (const layer of layers) {
+            let weight = new Map(layer.map((v) => {
+                let ns = neighbours[v]
+                let center = ns.length
+                    ? ns.reduce((sum, w) => sum + position[w], 0) / ns.length
+                    : position[v]
+                return [v, center]
+            }))
+            layer.sort((a, b) => weight.get(a) - weight.get(b))
+            place(layer)
+        }
+    }
+
+    for (let i = 0; i < SWEEPS; i++) {
+        sweep(ranks.slice(1), up)
+        sweep(ranks.slice(0, -1).reverse(), down)
+    }
+    return ranks
+}
+
+function layoutCfg(graph) {
+    let index = new Map(graph.nodes.map((n, i) => [n.id, i]))
+    let count = graph.nodes.length
+    let edges = graph.edges
+        .filter((e) => index.has(e.source) && index.has(e.target))
+        .map((e) => [index.get(e.source), index.get(e.target), e])
+    let out = [...Array(count)].map(() => [])
+    let inc = [...Array(count)].map(() => [])
+    edges.forEach(([s, t], i) => {
+        out[s].push([t, i])
+        inc[t].push(s)
+    })
+
+    let [back, topo] = findBackEdges(count, out, inc)
+    let rank = assignRanks(count, edges, back, topo)
+    let ranks = orderRanks(count, edges, back, rank, topo)
+
+    let nodes = graph.nodes.map((n) => {
+        let lines = String(n.label).split('\n')
+        let longest = Math.max(...lines.map((line) => line.length))
+        return {
+            node: n,
+            lines: lines,
+            width: Math.max(40, longest * CHAR_WIDTH + 2 * NODE_PADDING),
+            height: lines.length * LINE_HEIGHT + NODE_PADDING,
+            x: 0,
+            y: 0
+        }
+    })
+
+    let y = RANK_GAP / 2
+    let width = 0
+    for (const layer of ranks) {
+        let layerWidth = layer.reduce((sum, v) => sum + nodes[v].width, 0)
+            + NODE_GAP * (layer.length - 1)
+        let layerHeight = Math.max(...layer.map((v) => nodes[v].height))
+        let x = -layerWidth / 2
+        for (const v of layer) {
+            nodes[v].x = x + nodes[v].width / 2
+            nodes[v].y = y + layerHeight / 2
+            x += nodes[v].width + NODE_GAP
+        }
+        width = Math.max(width, layerWidth)
+        y += layerHeight + RANK_GAP
+    }
+
+    // Место справа для обратных ребер
+    let margin = NODE_GAP + 20 * Math.min(back.size, 5)
+    nodes.forEach((n) => { n.x += width / 2 + NODE_GAP })
+
+    return {
+        nodes: nodes,
+        edges: edges.map(([s, t, e], i) => ({
+            source: nodes[s], target: nodes[t], label: e.label,
+            back: back.has(i) || s === t
+        })),
+        width: width + 2 * NODE_GAP + margin,
+        height: y
+    }
+}
+
+function drawNode(group, n, onExpand) {
+    let shape = n.node.shape
+    let attrs = {fill: 'white', stroke: 'black'}
+    if (n.node.expandable) {
+        attrs = {fill: '#eef3fb', stroke: 'black', 'stroke-width': 2}
+        let link = svgElem('g', {cursor: 'pointer'})
+        let title = svgElem('title')
+        title.textContent = 'Раскрыть'
+        link.appendChild(title)
+        link.addEventListener('click', () => onExpand(n.node))
+        group.appendChild(link)
+        group = link
+    }
+    let elem
+    if (shape === 'box' || shape === 'rect' || shape === 'rectangle' ||
+            shape === 'record') {
+        elem = svgElem('rect', Object.assign({
+            x: n.x - n.width / 2, y: n.y - n.height / 2,
+            width: n.width, height: n.height}, attrs))
+    } else if (shape === 'diamond') {
+        let w = n.width / 2 + NODE_PADDING
+        let h = n.height / 2 + NODE_PADDING
+        elem = svgElem('polygon', Object.assign({points:
+            `${n.x},${n.y - h} ${n.x + w},${n.y} ${n.x},${n.y + h} ${n.x - w},${n.y}`},
+            attrs))
+    } else {
+        elem = svgElem('ellipse', Object.assign({cx: n.x, cy: n.y,
+            rx: n.width / 2 + NODE_PADDING / 2,
+            ry: n.height / 2 + NODE_PADDING / 2}, attrs))
+    }
+    group.appendChild(elem)
+
+    let text = svgElem('text', {'text-anchor': 'middle',
+        'font-family': 'monospace', 'font-size': 12})
+    let top = n.y - (n.lines.length - 1) * LINE_HEIGHT / 2 + 4
+    n.lines.forEach((line, i) => {
+        let tspan = svgElem('tspan', {x: n.x, y: top + i * LINE_HEIGHT})
+        tspan.textContent = line
+        text.appendChild(tspan)
+    })
+    group.appendChild(text)
+}
+
+function drawEdge(group, e, right) {
+    let s = e.source
+    let t = e.target
+    let d
+    let labelX
+    let labelY
+    if (s === t) {
+        let x = s.x + s.width / 2
+        d = `M ${x} ${s.y - 6} C ${x + 30} ${s.y - 20}, ${x + 30} ${s.y + 20}, ${x} ${s.y + 6}`
+        labelX = x + 28
+        labelY = s.y
+    } else if (e.back) {
+        // Обратное ребро огибает граф справа
+        let x1 = s.x + s.width / 2
+        let x2 = t.x + t.width / 2
+        d = `M ${x1} ${s.y} C ${right} ${s.y}, ${right} ${t.y}, ${x2} ${t.y}`
+        labelX = right - 10
+        labelY = (s.y + t.y) / 2
+    } else {
+        let y1 = s.y + s.height / 2
+        let y2 = t.y - t.height / 2
+        d = `M ${s.x} ${y1} C ${s.x} ${y1 + RANK_GAP / 2}, ${t.x} ${y2 - RANK_GAP / 2}, ${t.x} ${y2}`
+        labelX = (s.x + t.x) / 2 + 6
+        labelY = (y1 + y2) / 2
+    }
+    group.appendChild(svgElem('path', {d: d, fill: 'none', stroke: 'black',
+        'marker-end': 'url(#cfg-arrow)'}))
+
+    if (e.label) {
+        let text = svgElem('text', {x: labelX, y: labelY,
+            'font-family': 'sans-serif', 'font-size': 11})
+        text.textContent = e.label
+        group.appendChild(text)
+    }
+}
+
+function renderCfg(container, graph, onExpand) {
+    let layout = layoutCfg(graph)
+    let svg = svgElem('svg', {width: layout.width, height: layout.height,
+        viewBox: `0 0 ${layout.width} ${layout.height}`})
+    let defs = svgElem('defs')
+    let marker = svgElem('marker', {id: 'cfg-arrow', viewBox: '0 0 10 10',
+        refX: 10, refY: 5, markerWidth: 8, markerHeight: 8,
+        orient: 'auto-start-reverse'})
+    marker.appendChild(svgElem('path', {d: 'M 0 0 L 10 5 L 0 10 z'}))
+    defs.appendChild(marker)
+    svg.appendChild(defs)
+
+    let group = svgElem('g')
+    let right = layout.width - NODE_GAP / 2
+    layout.edges.forEach((e) => drawEdge(group, e, right))
+    layout.nodes.forEach((n) => drawNode(group, n, onExpand))
+    svg.appendChild(group)
+
+    container.replaceChildren(svg)
+}
+
+function fetchSummary(url, funcName, expand, budget) {
+    let params = new URLSearchParams({func_name: funcName})
+    // Без бюджета сервер сокращает граф до бюджета по умолчанию
+    if (budget) params.set('budget', budget)
+    expand.forEach((id) => params.append('expand', id))
+    return fetch(`${url}?${params}`).then((response) => {
+        if (!response.ok) throw new Error(response.statusText)
+        return response.json()
+    })
+}
+
+// Подключает переключение функций без перезагрузки страницы. Граф
+// текущей функции хранится в элементе <script type="application/json">,
+// графы других функций запрашиваются при первом выборе функции и
+// сохраняются. Функции без графа (слишком большие или не разобранные)
+// открываются по ссылке с отрисовкой на сервере. Если renderCurrent
+// ложно, то граф текущей функции уже отрисован на сервере.
+function initCfgViewer(dataElemId, containerId, selectId, renderCurrent = true) {
+    let graphs = JSON.parse(document.getElementById(dataElemId).textContent)
+    let container = document.getElementById(containerId)
+    let select = document.getElementById(selectId)
+    // Раскрытые вершины и бюджет сокращенных графов {функция: состояние}
+    let states = {}
+
+    const draw = (option, graph) => {
+        let funcName = option.dataset.func
+        const expand = (node) => {
+            let state = states[funcName] =
+                states[funcName] || {expand: [], budget: graph.budget}
+            if (node.kind === 'rest') {
+                state.budget *= 2
+            } else {
+                state.expand.push(node.id)
+            }
+            fetchSummary(container.dataset.summaryUrl, funcName,
+                    state.expand, state.budget)
+                .then((summary) => {
+                    graphs[funcName] = summary
+                    draw(option, summary)
+                })
+                .catch(() => { location = option.dataset.serverUrl })
+        }
+        renderCfg(container, graph, expand)
+    }
+
+    const show = (option) => {
+        let funcName = option.dataset.func
+        if (!(funcName in graphs)) {
+            // Большие описания графов отрисовываются на сервере
+            if (Number(option.dataset.size) > Number(container.dataset.maxSize)) {
+                location = option.dataset.serverUrl
+                return
+            }
+            fetchSummary(container.dataset.summaryUrl, funcName, [])
+                .then((graph) => {
+                    graphs[funcName] = graph
+                    show(option)
+                })
+                .catch(() => { location = option.dataset.serverUrl })
+            return
+        }
+        let graph = graphs[funcName]
+        if (!graph) {
+            location = option.dataset.serverUrl
+            return
+        }
+        try {
+            draw(option, graph)
+            history.replaceState(null, '', option.value)
+        } catch (e) {
+            location = option.dataset.serverUrl
+        }
+    }
+
+    select.onchange = () => show(select.options[select.selectedIndex])
+    if (renderCurrent && select.selectedIndex >= 0) {
+        show(select.options[select.selectedIndex])
+    }
+}
@@ -0,0 +1,201 @@
+"""Модуль **tracing** содержит средства для трассировки загрузки
+(ingestion) дерева репозитория. Для каждого файла замеряется время
+этапов обработки (получение, декодирование, анализаторы, запись в БД)
+и размеры данных, а по окончании загрузки формируется сводка с самыми
+медленными файлами и пропускной способностью.
+
+Трассировки сохраняются в БД в моделях :class:`flaskr.models.IngestionJob`
+и :class:`flaskr.models.FileTrace`.
+"""
+import contextlib
+import datetime
+import heapq
+import json
+import time
+from flask import current_app
+from flask import g
+from flaskr.models import db
+from flaskr.models import FileTrace
+from flaskr.models import IngestionJob
+
+#: Этапы обработки файла, время которых сохраняется в
+#: :class:`flaskr.models.FileTrace` (колонка *<этап>_time*).
+STAGES = ('fetch', 'decode', 'raw', 'halstead', 'cfg', 'db')
+
+
+class IngestionTracer:
+    """Трассировщик загрузки дерева репозитория.
+
+    Если задание *job* не передано, то трассировки файлов только
+    записываются в лог и не сохраняются в БД.
+
+    :param job: задание загрузки
+    :type job: :class:`flaskr.models.IngestionJob`
+    """
+    #: Количество самых медленных файлов, которые хранит трассировщик
+    SLOWEST_LIMIT = 10
+
+    def __init__(self, job=None):
+        self.job = job
+        self.files_count = 0
+        self.bytes_count = 0
+        self._slowest = []
+        self._current = None
+        self._file_start = None
+        self._start = time.perf_counter()
+
+    def start_file(self, path):
+        """Начинает трассировку файла *path*.
+
+        :param str path: путь к файлу относительно корня репозитория
+        """
+        self._current = {'path': path, 'blob_size': 0, 'dot_size': 0}
+        for stage in STAGES:
+            self._current[stage + '_time'] = 0.0
+        self._file_start = time.perf_counter()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """Контекстный менеджер, который замеряет время этапа *name*
+        обработки текущего файла.
+
+        :param str name: название этапа, время этапов не из :data:`STAGES` 
+            только записывается в лог
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            if self._current is not None:
+                key = name + '_time'
+                self._current[key] = self._current.get(key, 0.0) + \
+                        time.perf_counter() - start
+
+    def add_time(self, name, seconds):
+        """Увеличивает время этапа *name* текущего файла, если этап 
+        выполнялся не в текущем процессе (см. 
+        :func:`flaskr.webhook.add_local_tree_to_db`).
+
+        :param str name: название этапа
+        :param float seconds: время в секундах
+        """
+        if self._current is not None:
+            key = name + '_time'
+            self._current[key] = self._current.get(key, 0.0) + seconds
+
+    def add_size(self, name, size):
+        """Увеличивает размер *name* (blob_size, dot_size) текущего файла.
+
+        :param str name: название размера
+        :param int size: размер в байтах
+        """
+        if self._current is not None:
+            self._current[name] += size
+
+    def finish_file(self):
+        """Завершает трассировку текущего файла, записывает событие в лог
+        и добавляет модель :class:`flaskr.models.FileTrace` в сессию.
+        """
+        if self._current is None:
+            return
+
+        trace = self._current
+        trace['total_time'] = time.perf_counter() - self._file_start
+        self._current = None
+        self.files_count += 1
+        self.bytes_count += trace['blob_size']
+
+        # Хранятся только самые медленные файлы, чтобы память не росла 
+        # с размером репозитория
+        item = (trace['total_time'], self.files_count, trace['path'])
+        if len(self._slowest) < self.SLOWEST_LIMIT:
+            heapq.heappush(self._slowest, item)
+        else:
+            heapq.heappushpop(self._slowest, item)
+
+        current_app.logger.info('ingestion.file %s', json.dumps(trace))
+
+        if self.job is not None:
+            columns = FileTrace.__table__.columns
+            db.session.add(FileTrace(job_id=self.job.id, 
+                **{k: v for k, v in trace.items() if k in columns}))
+
+    def summary(self):
+        """Возвращает сводку по загрузке.
+
+        :returns: словарь с полями *files*, *bytes*, *duration*,
+            *files_per_second*, *mb_per_second*, *slowest*
+        :rtype: dict
+        """
+        duration = time.perf_counter() - self._start
+        files = self.files_count
+        size = self.bytes_count
+
+        return {
+            'files': files,
+            'bytes': size,
+            'duration': duration,
+            'files_per_second': files / duration if duration else 0.0,
+            'mb_per_second': size / (1024 * 1024) / duration if duration else 0.0,
+            'slowest': [{'path': path, 'total_time': total_time}
+                for total_time, _, path in sorted(self._slowest, reverse=True)]
+        }
+
+    def finish(self):
+        """Завершает трассировку загрузки: записывает сводку в лог и
+        обновляет модель задания загрузки.
+
+        :returns: сводка по загрузке (см. :meth:`summary`)
+        :rtype: dict
+        """
+        summary = self.summary()
+        current_app.logger.info('ingestion.summary %s', json.dumps(summary))
+
+        if self.job is not None:
+            # Задание могло быть продолжено после прерванной загрузки
+            self.job.duration = (self.job.duration or 0.0) + \
+                    summary['duration']
+            self.job.files_count = (self.job.files_count or 0) + \
+                    summary['files']
+            self.job.bytes_count = (self.job.bytes_count or 0) + \
+                    summary['bytes']
+
+        if g.get('ingestion_tracer') is self:
+            g.pop('ingestion_tracer')
+
+        return summary
+
+
+def begin(project_id, git_hash, job=None):
+    """Начинает трассировку загрузки дерева *git_hash* проекта. Создает
+    модель :class:`flaskr.models.IngestionJob`, если не передано
+    задание *job* прерванной загрузки, и сохраняет трассировщик в
+    глобальном контексте приложения (в объекте g).
+
+    :param int project_id: идентификатор проекта
+    :param str git_hash: Git хеш загружаемого дерева
+    :param job: задание прерванной загрузки, которая продолжается
+    :type job: :class:`flaskr.models.IngestionJob`
+    :returns: трассировщик загрузки
+    :rtype: :class:`IngestionTracer`
+    """
+    if job is None:
+        job = IngestionJob(project_id=project_id, git_hash=git_hash,
+                start_time=datetime.datetime.utcnow())
+        db.session.add(job)
+        db.session.flush()
+
+    g.ingestion_tracer = IngestionTracer(job)
+    return g.ingestion_tracer
+
+
+def get_tracer():
+    """Возвращает трассировщик текущей загрузки. Если загрузка не была
+    начата функцией :func:`begin`, то возвращается трассировщик, который
+    не сохраняет трассировки в БД.
+
+    :rtype: :class:`IngestionTracer`
+    """
+    if 'ingestion_tracer' not in g:
+        g.ingestion_tracer = IngestionTracer()
+    return g.ingestion_tracer
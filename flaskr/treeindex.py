@@ -0,0 +1,330 @@
+"""Модуль **treeindex** содержит компактный индекс дерева проекта в
+памяти процесса (см. :class:`TreeIndex`).
+
+Иерархия директорий и файлов меняется только при загрузке дерева,
+поэтому после загрузки индекс строится заново двумя запросами (см.
+:func:`rebuild`) и заменяет старый индекс одним присваиванием: запросы,
+которые уже получили старый индекс, дочитывают его без блокировок.
+Воркеры, в которых загрузка не выполнялась, строят индекс при первом
+обращении после смены Git хеша или поколения корня или ревизии
+результатов анализа проекта (см. :func:`get`).
+
+Индекс используется для разрешения путей (см. :func:`resolve_dir`),
+списков файлов директорий и сумм метрик поддеревьев (см.
+:func:`listing`). Если у корня нет Git хеша (загрузка прервана), то
+индекс не строится и данные читаются из базы данных.
+"""
+import datetime
+import threading
+from array import array
+from collections import namedtuple
+from flaskr.models import db
+from flaskr.models import Directory
+from flaskr.models import File
+from flaskr.models import RawMetrics
+
+#: Элемент списка директории: *name* - имя, *path* - путь относительно
+#: корня, *is_dir* - признак директории, *update_time* - время
+#: обновления, *skip_reason* - причина пропуска файла, *loc* - количество
+#: строк кода файла или поддерева, *files* - количество файлов поддерева
+Entry = namedtuple('Entry', ['name', 'path', 'is_dir', 'update_time',
+    'skip_reason', 'loc', 'files'])
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+#: Индексы проектов {идентификатор проекта: индекс}
+_indexes = {}
+
+#: Блокировка построения индексов
+_lock = threading.Lock()
+
+
+class TreeIndex:
+    """Неизменяемый индекс дерева проекта.
+
+    Вершины дерева (директории и файлы) пронумерованы обходом в ширину,
+    поэтому дети каждой директории занимают непрерывный отрезок номеров
+    (сначала директории, затем файлы). Свойства вершин хранятся в
+    массивах :class:`array.array` по номеру вершины, имена - в таблице
+    уникальных имен, пути - в словаре {путь: номер вершины}.
+
+    :param key: ключ дерева: идентификатор и Git хеш корня, поколение,
+        ревизия результатов анализа
+    :param dirs: строки директорий (id, имя, id родителя, время
+        обновления)
+    :param files: строки файлов (id, id директории, имя, время
+        обновления, причина пропуска, количество строк кода)
+    :param int root_id: идентификатор корневой директории
+    """
+    def __init__(self, key, dirs, files, root_id):
+        self.key = key
+
+        child_dirs = {}
+        for row in dirs:
+            child_dirs.setdefault(row[2], []).append(row)
+        child_files = {}
+        for row in files:
+            child_files.setdefault(row[1], []).append(row)
+
+        #: Таблица имен и номера имен
+        self.names = []
+        name_ids = {}
+        #: Таблица причин пропуска файлов
+        self.reasons = []
+        reason_ids = {}
+
+        self.parent = array('i')
+        self.name = array('i')
+        self.db_id = array('q')
+        self.is_dir = array('b')
+        self.first_child = array('i')
+        self.child_count = array('i')
+        self.update_time = array('d')
+        self.skip_reason = array('i')
+        self.loc = array('q')
+        self.files = array('i')
+        self.paths = {'': 0}
+        self._dir_nodes = {root_id: 0}
+
+        def add(parent, name, db_id, is_dir, update_time, reason, loc):
+            if name not in name_ids:
+                name_ids[name] = len(self.names)
+                self.names.append(name)
+            reason_id = -1
+            if reason is not None:
+                if reason not in reason_ids:
+                    reason_ids[reason] = len(self.reasons)
+                    self.reasons.append(reason)
+                reason_id = reason_ids[reason]
+            node = len(self.db_id)
+            self.parent.append(parent)
+            self.name.append(name_ids[name])
+            self.db_id.append(db_id)
+            self.is_dir.append(is_dir)
+            self.first_child.append(0)
+            self.child_count.append(0)
+            self.update_time.append((update_time - _EPOCH).total_seconds())
+            self.skip_reason.append(reason_id)
+            self.loc.append(loc or 0)
+            self.files.append(0 if is_dir else 1)
+            return node
+
+        root = next((row for row in dirs if row[0] == root_id), None)
+        add(-1, '', root_id, 1, root[3] if root else _EPOCH, None, 0)
+
+        node = 0
+        while node < len(self.db_id):
+            if self.is_dir[node]:
+                db_id = self.db_id[node]
+                prefix = self.path(node)
+                prefix = prefix + '/' if prefix else ''
+                self.first_child[node] = len(self.db_id)
+                for id, name, _parent_id, update_time in sorted(
+                        child_dirs.get(db_id, ())):
+                    child = add(node, name, id, 1, update_time, None, 0)
+                    self.paths[prefix + name] = child
+                    self._dir_nodes[id] = child
+                for id, _dir_id, name, update_time, reason, loc in sorted(
+                        child_files.get(db_id, ())):
+                    child = add(node, name, id, 0, update_time, reason, loc)
+                    self.paths[prefix + name] = child
+                self.child_count[node] = len(self.db_id) \
+                        - self.first_child[node]
+            node += 1
+
+        # Суммы поддеревьев: дети имеют большие номера, чем родители
+        for node in range(len(self.db_id) - 1, 0, -1):
+            parent = self.parent[node]
+            self.loc[parent] += self.loc[node]
+            self.files[parent] += self.files[node]
+
+    def __len__(self):
+        return len(self.db_id)
+
+    def resolve(self, path):
+        """Возвращает номер вершины с путем *path* относительно корня
+        или None.
+
+        :param str path: путь без начального и завершающего ``/``
+        :rtype: int
+        """
+        return self.paths.get(path)
+
+    def node(self, dir_id):
+        """Возвращает номер вершины директории с идентификатором *dir_id*
+        или None.
+
+        :rtype: int
+        """
+        return self._dir_nodes.get(dir_id)
+
+    def path(self, node):
+        """Возвращает путь вершины *node* относительно корня.
+
+        :rtype: str
+        """
+        parts = []
+        while node > 0:
+            parts.append(self.names[self.name[node]])
+            node = self.parent[node]
+        return '/'.join(reversed(parts))
+
+    def entries(self, node):
+        """Возвращает список директории *node*: сначала директории, затем
+        файлы.
+
+        :rtype: list of :class:`Entry`
+        """
+        prefix = self.path(node)
+        prefix = prefix + '/' if prefix else ''
+        result = []
+        start = self.first_child[node]
+        for child in range(start, start + self.child_count[node]):
+            name = self.names[self.name[child]]
+            reason = self.skip_reason[child]
+            result.append(Entry(name, prefix + name, bool(self.is_dir[child]),
+                _EPOCH + datetime.timedelta(seconds=self.update_time[child]),
+                self.reasons[reason] if reason >= 0 else None,
+                self.loc[child], self.files[child]))
+        return result
+
+    def rollup(self, node):
+        """Возвращает суммы метрик поддерева вершины *node*.
+
+        :returns: словарь с полями *loc* и *files*
+        :rtype: dict
+        """
+        return {'loc': self.loc[node], 'files': self.files[node]}
+
+
+def build(root_dir, revision=0):
+    """Строит индекс дерева с корнем *root_dir* двумя запросами.
+
+    :param root_dir: корневая директория дерева проекта
+    :type root_dir: :class:`flaskr.models.Directory`
+    :param int revision: ревизия результатов анализа проекта (см.
+        :attr:`flaskr.models.Project.analysis_revision`)
+    :rtype: :class:`TreeIndex`
+    """
+    tree = db.select(Directory.id).where(Directory.id == root_dir.id)\
+            .cte('tree', recursive=True)
+    tree = tree.union_all(db.select(Directory.id)
+            .where(Directory.dir_parent_id == tree.c.id))
+
+    connection = db.session.connection()
+    dirs = connection.execute(db.select(Directory.id, Directory.dir_name,
+        Directory.dir_parent_id, Directory.update_time)
+        .join(tree, tree.c.id == Directory.id)).all()
+    files = connection.execute(db.select(File.id, File.dir_id,
+        File.file_name, File.update_time, File.skip_reason, RawMetrics.loc)
+        .join(tree, tree.c.id == File.dir_id)
+        .outerjoin(RawMetrics, RawMetrics.file_id == File.id)).all()
+
+    return TreeIndex((root_dir.id, root_dir.git_hash, root_dir.generation,
+        revision),
+            [tuple(row) for row in dirs], [tuple(row) for row in files],
+            root_dir.id)
+
+
+def get(project, root_dir=None):
+    """Возвращает индекс текущего дерева проекта, при необходимости
+    строит его.
+
+    :param project: проект
+    :type project: :class:`flaskr.models.Project`
+    :param root_dir: корневая директория текущего дерева проекта, по
+        умолчанию - :meth:`flaskr.models.Project.get_root_dir`
+    :returns: индекс или None, если дерева нет или его загрузка прервана
+    :rtype: :class:`TreeIndex`
+    """
+    root_dir = root_dir or project.get_root_dir()
+    if not root_dir or not root_dir.git_hash:
+        return None
+
+    key = (root_dir.id, root_dir.git_hash, root_dir.generation,
+            project.analysis_revision)
+    index = _indexes.get(project.id)
+    if index is not None and index.key == key:
+        return index
+
+    with _lock:
+        index = _indexes.get(project.id)
+        if index is None or index.key != key:
+            index = build(root_dir, project.analysis_revision)
+            _indexes[project.id] = index
+
+    return index
+
+
+def rebuild(project):
+    """Строит индекс текущего дерева проекта после загрузки и заменяет
+    им старый индекс.
+
+    :param project: проект
+    :type project: :class:`flaskr.models.Project`
+    """
+    root_dir = project.get_root_dir()
+    if not root_dir or not root_dir.git_hash:
+        _indexes.pop(project.id, None)
+        return
+
+    index = build(root_dir, project.analysis_revision)
+    with _lock:
+        _indexes[project.id] = index
+
+
+def resolve_dir(project, root_dir, path):
+    """Возвращает директорию с путем *path* относительно корня
+    *root_dir* или None. Путь разрешается по индексу дерева, без индекса
+    - запросом на каждую часть пути.
+
+    :param project: проект
+    :type project: :class:`flaskr.models.Project`
+    :param root_dir: корневая директория текущего дерева проекта
+    :type root_dir: :class:`flaskr.models.Directory`
+    :param str path: путь, пустые части пути пропускаются
+    :rtype: :class:`flaskr.models.Directory`
+    """
+    parts = [part for part in path.split('/') if part]
+    if not parts:
+        return root_dir
+
+    index = get(project, root_dir)
+    if index is not None:
+        node = index.resolve('/'.join(parts))
+        if node is None or not index.is_dir[node]:
+            return None
+        return db.session.get(Directory, index.db_id[node])
+
+    d = root_dir
+    for part in parts:
+        d = Directory.query.filter_by(dir_parent_id=d.id,
+                dir_name=part).first()
+        if not d:
+            return None
+    return d
+
+
+def listing(project, d):
+    """Возвращает список директории *d* текущего дерева проекта с
+    суммами метрик поддиректорий. Без индекса список читается из базы
+    данных, суммы метрик не вычисляются.
+
+    :param project: проект
+    :type project: :class:`flaskr.models.Project`
+    :param d: директория
+    :type d: :class:`flaskr.models.Directory`
+    :rtype: list of :class:`Entry`
+    """
+    index = get(project)
+    node = index.node(d.id) if index is not None else None
+    if node is not None:
+        return index.entries(node)
+
+    from flaskr.filters import dir_path
+
+    prefix = dir_path(d)
+    return [Entry(c.dir_name, prefix + c.dir_name, True, c.update_time,
+            None, None, None) for c in d.child_dirs] + \
+        [Entry(f.file_name, prefix + f.file_name, False, f.update_time,
+            f.skip_reason, None, None) for f in d.files]
@@ -3,6 +3,13 @@
 import requests
 import urllib
 import base64
+import codecs
+import tarfile
+import collections
+import os
+import stat
+import time
+from contextlib import closing
 from flaskr.models import File
 from flaskr.models import Directory
 from flaskr.models import RawMetrics
@@ -11,13 +18,24 @@ from flaskr.models import db
 from flaskr.models import GraphVisualization
 from flaskr.models import GraphType
 from flaskr.models import Project
+from flaskr.models import IngestionJob
 from flask import current_app
-from metrics import raw
-from metrics import halstead
 #from cpgqls_client import CPGQLSClient
-from visualization import graph
-import re
 from flaskr.custom_async import get_set_event_loop
+from flaskr import tracing
+from flaskr import policy
+from flaskr import analyzers
+from flaskr import sources
+from flaskr import gitobj
+from flaskr import checkpoint
+from flaskr import delivery
+from flaskr import history
+from flaskr import search
+from flaskr import hotspots
+from flaskr import fragments
+from flaskr import treeindex
+from flaskr import blobstore
+from flaskr.filters import dir_path
 import datetime
 
 def apply_args_to_url(url, **kwargs):
@@ -57,113 +75,390 @@ def get_commit_of_default_branch(repo):
     return response.json()['commit']
 
 
+class GithubSource:
+    """Источник дерева и содержимого файлов через Github API (см. 
+    :mod:`flaskr.sources`). Каждое поддерево и каждый файл запрашиваются 
+    отдельным HTTP запросом.
+    """
+    def tree_of_default_branch(self, repository):
+        """Возвращает URL дерева последнего коммита главной ветви 
+        репозитория *repository*.
+
+        :param dict repository: JSON-объект репозитория
+        :rtype: str
+        """
+        commit = get_commit_of_default_branch(repository)
+        return commit['commit']['tree']['url']
+
+    def tree_of_commit(self, repository, sha):
+        """Возвращает URL дерева коммита *sha*.
+
+        :param dict repository: JSON-объект репозитория
+        :param str sha: SHA коммита
+        :rtype: str
+        """
+        return get_commit(repository['git_commits_url'], sha)['tree']['url']
+
+    def root_tree(self, ref):
+        """Возвращает SHA и узлы дерева по URL *ref*.
+
+        :param str ref: URL дерева
+        :rtype: tuple
+        """
+        body = requests.get(ref).json()
+        return body['sha'], body['tree']
+
+    def subtree(self, o):
+        """Возвращает узлы поддерева для узла *o* типа tree.
+
+        :param dict o: узел дерева
+        :rtype: list
+        """
+        return requests.get(o['url']).json()['tree']
+
+    def blob(self, o):
+        """Возвращает содержимое файла для узла *o* типа blob (см. 
+        :func:`fetch_blob`). Размер содержимого ограничен политикой 
+        текущей загрузки (см. :mod:`flaskr.policy`).
+
+        :param dict o: узел дерева
+        :rtype: bytes
+        :raises BlobTooLargeError: если файл больше максимального размера
+        """
+        return fetch_blob(o['url'], policy.get_policy().max_blob_size)
+
+    def close(self):
+        pass
+
+
+def get_source(project):
+    """Возвращает источник дерева и содержимого файлов для проекта 
+    *project* в зависимости от параметра приложения *INGESTION_SOURCE*:
+
+       * *github* - :class:`GithubSource`
+       * *mirror* - :class:`flaskr.sources.GitMirrorSource`, зеркало 
+         хранится в директории из параметра *GIT_MIRRORS_DIR*
+       * *tarball* - :class:`GithubSource`, первая загрузка проекта 
+         выполняется из архива коммита (см. :func:`add_tarball_to_db`)
+
+    :param project: модель проекта
+    :type project: :class:`flaskr.models.Project`
+    """
+    if current_app.config.get('INGESTION_SOURCE') == 'mirror':
+        return sources.GitMirrorSource(sources.mirror_path(project.id))
+
+    return GithubSource()
+
+
+#: MIME тип Github API, с которым содержимое blob'а возвращается в сыром
+#: виде (без JSON-обертки и кодирования в base64).
+GITHUB_RAW_MEDIA_TYPE = 'application/vnd.github.raw'
+
+#: Метки порядка байтов (BOM) и соответствующие им кодировки.
+_BOMS = (
+    (codecs.BOM_UTF8, 'utf-8'),
+    (codecs.BOM_UTF32_LE, 'utf-32-le'),
+    (codecs.BOM_UTF32_BE, 'utf-32-be'),
+    (codecs.BOM_UTF16_LE, 'utf-16-le'),
+    (codecs.BOM_UTF16_BE, 'utf-16-be'),
+)
+
+
+def decode_bytes(data, fallback='latin-1'):
+    """Переводит байты *data* в юникод строку.
+
+    Кодировка определяется по метке порядка байтов (BOM). Если метки нет, 
+    то байты декодируются как utf-8, а в случае ошибки - в кодировке 
+    *fallback*. Байты, которые нельзя декодировать в кодировке *fallback*, 
+    заменяются символом U+FFFD.
+
+    :param bytes data: содержимое файла
+    :param str fallback: кодировка, которая используется, если содержимое не в utf-8
+    :returns: юникод строка
+    :rtype: string
+    """
+    for bom, encoding in _BOMS:
+        if data.startswith(bom):
+            return codecs.decode(data[len(bom):], encoding, 'replace')
+
+    try:
+        return codecs.decode(data, 'utf-8')
+    except UnicodeDecodeError:
+        return codecs.decode(data, fallback, 'replace')
+
+
 def base64_decode(s):
-    """Переводит строку в формате base64 в юникод (utf-8) строку.
+    """Переводит строку в формате base64 в юникод строку (см. 
+    :func:`decode_bytes`).
+
+    Переводы строк и другие символы, которые не входят в алфавит base64, 
+    пропускаются, поэтому содержимое декодируется в один буфер без 
+    разбиения на строки.
 
     :param string s: строка в base64
     :returns: юникод строка
     :rtype: string
     """
-    return base64.b64decode(s).decode('utf-8')
+    return decode_bytes(base64.b64decode(s))
 
 
 def decode_content(content, encoding):
-    """Переводит строку с содержимым *content* в юникод (utf-8) строку в зависимости от формата *encoding*, в котором хранится *content*.
+    """Переводит строку с содержимым *content* в юникод строку в зависимости от формата *encoding*, в котором хранится *content*.
 
     :param string content: строка с содержимым
-    :param string encoding: формат строки (base64,..)
+    :param string encoding: формат строки (base64, utf-8)
     :returns: юникод строка
     :rtype: string
     """
     decode_func = {
-        'base64': base64_decode
+        'base64': base64_decode,
+        'utf-8': lambda s: s
     }
 
-    lines = content.split('\n')
-    return ''.join([decode_func[encoding](l) for l in lines])
+    return decode_func[encoding](content)
+
+
+class BlobTooLargeError(Exception):
+    """Исключение, которое возникает, если размер blob'а превысил 
+    максимальный размер при получении содержимого (см. :func:`fetch_blob`).
+
+    :param int size: размер blob'а или количество байт, полученных до 
+        прерывания
+    """
+    def __init__(self, size):
+        super().__init__('Размер blob\'а больше %d байт' % size)
+        self.size = size
+
+
+def fetch_blob(url, max_size=None):
+    """Получает содержимое blob'а по его *url* в Github API.
+
+    Если в настройках приложения включен параметр *GITHUB_RAW_BLOBS*, то 
+    содержимое запрашивается в сыром виде (заголовок *Accept* со значением 
+    :data:`GITHUB_RAW_MEDIA_TYPE`) и читается по частям в один буфер. 
+    Чтение прерывается, как только размер полученных данных превышает 
+    *max_size*, поэтому в памяти не бывает больше *max_size* байт 
+    содержимого и одной части. Если сервер вернул JSON-представление 
+    blob'а, то содержимое декодируется из base64, а размер проверяется по 
+    полю *size* до декодирования.
+
+    :param string url: URL blob'а
+    :param int max_size: максимальный размер blob'а в байтах, None - без 
+        ограничения
+    :returns: содержимое blob'а
+    :rtype: bytes
+    :raises BlobTooLargeError: если blob больше *max_size*
+    """
+    if current_app.config.get('GITHUB_RAW_BLOBS', True):
+        response = requests.get(url, 
+                headers={'Accept': GITHUB_RAW_MEDIA_TYPE}, stream=True)
+
+        if not response.headers.get('Content-Type', '')\
+                .startswith('application/json'):
+            with closing(response):
+                length = response.headers.get('Content-Length')
+                if max_size is not None and length is not None \
+                        and int(length) > max_size:
+                    raise BlobTooLargeError(int(length))
+
+                data = bytearray()
+                for chunk in response.iter_content(chunk_size=64 * 1024):
+                    data += chunk
+                    if max_size is not None and len(data) > max_size:
+                        raise BlobTooLargeError(len(data))
+                return data
+    else:
+        response = requests.get(url)
+
+    body = response.json()
+
+    if max_size is not None and body.get('size', 0) > max_size:
+        raise BlobTooLargeError(body['size'])
+
+    if body['encoding'] == 'base64':
+        return base64.b64decode(body['content'])
+
+    return body['content'].encode('utf-8')
+
+
+def _store_raw_metrics(f, result, is_updating):
+    raw_metrics = None
+    if is_updating:
+        raw_metrics = RawMetrics.query.filter_by(file_id=f.id).first()
+
+    if raw_metrics is None:
+        raw_metrics = RawMetrics(file_id=f.id)
+        db.session.add(raw_metrics)
+
+    for name, value in result.items():
+        setattr(raw_metrics, name, value)
+    raw_metrics.analyzer_version = analyzers.analyzer_version('raw')
+
+
+def _store_halstead_metrics(f, result, is_updating):
+    halstead_metrics = None
+    if is_updating:
+        halstead_metrics = HalsteadMetrics.query.filter_by(
+                file_id=f.id).first()
+
+    if halstead_metrics is None:
+        halstead_metrics = HalsteadMetrics(file_id=f.id)
+        db.session.add(halstead_metrics)
+
+    for name, value in result.items():
+        setattr(halstead_metrics, name, value)
+    halstead_metrics.analyzer_version = \
+            analyzers.analyzer_version('halstead')
 
 
-def _add_metrics_for_file(tree_obj, f, is_updating=False):
+def _store_cfgs(f, result, is_updating):
+    if is_updating:
+        GraphVisualization.query.filter_by(file_id=f.id,
+                graph_type=GraphType.CFG).delete()
+
+    version = analyzers.analyzer_version('cfg')
+    for func_name, dot in result.items():
+        tracing.get_tracer().add_size('dot_size', len(dot))
+        graph_vis = GraphVisualization(
+                graph_type=GraphType.CFG,
+                func_name=func_name,
+                graph_dot=dot,
+                file_id=f.id,
+                analyzer_version=version
+                )
+        db.session.add(graph_vis)
+
+
+#: Функции, которые сохраняют результаты анализаторов из 
+#: :mod:`flaskr.analyzers` в БД {имя анализатора: функция}
+_STORE_FUNCS = {
+    'raw': _store_raw_metrics,
+    'halstead': _store_halstead_metrics,
+    'cfg': _store_cfgs
+}
+
+
+def _skip_file(f, path, git_hash, reason, is_updating):
+    """Записывает в лог причину пропуска файла *f* политикой загрузки и 
+    удаляет метрики, визуализации, записи поискового индекса и горячую 
+    точку обновляемого файла.
+    """
+    current_app.logger.info('skip file %s: %s', path, reason)
+    if is_updating:
+        RawMetrics.query.filter_by(file_id=f.id).delete()
+        HalsteadMetrics.query.filter_by(file_id=f.id).delete()
+        GraphVisualization.query.filter_by(file_id=f.id).delete()
+    recorder = history.get_recorder()
+    if recorder is not None:
+        recorder.record(path, git_hash)
+    if is_updating:
+        search.remove_functions(f.id)
+        hotspots.remove(f.id)
+
+
+def _add_metrics_for_file(tree_obj, f, is_updating=False, data=None, 
+        analyzed=None):
     """Добавляет метрики для файла из дерева репозитория.
 
     Подсчитывает метрики и строит визуализации для файла *f*. Создает модели метрик (:class:`flaskr.models.RawMetrics`, :class:`flaskr.models.HalsteadMetrics`) и модели визуализаций (:class:`flaskr.models.GraphVisualization`) для файла *f*.
 
+    Анализаторы выбираются по расширению файла из реестра :mod:`flaskr.analyzers`, файлы без анализаторов не загружаются.
+
+    Перед получением содержимого файл проверяется политикой загрузки (см. :mod:`flaskr.policy`). Если файл не нужно анализировать, то причина сохраняется в поле *skip_reason* модели файла, а метрики и визуализации файла удаляются.
+
+    Время каждого этапа обработки файла и размеры данных записываются трассировщиком загрузки (см. :mod:`flaskr.tracing`). Новые метрики файла записываются в снимок метрик коммита (см. :mod:`flaskr.history`), по ним пересчитывается горячая точка файла (см. :mod:`flaskr.hotspots`).
+
     :param dict tree_obj: узел из дерева коммита репозитория
     :param f: модель файла
     :type f: :class:`flaskr.models.File`
+    :param bool is_updating: признак обновления метрик существующего файла
+    :param bytes data: содержимое файла, если оно уже получено, иначе содержимое читается из хранилища (см. :mod:`flaskr.blobstore`) или запрашивается у источника текущей загрузки и сохраняется в хранилище
+    :param tuple analyzed: результаты анализаторов, время этапов и размер файла, если файл уже проанализирован в другом процессе (см. :func:`_analyze_local_file`)
     """
-    if re.match(r'.+\.c$', tree_obj['path']):
-        blob_response = requests.get(tree_obj['url'])
-        blob_body = blob_response.json()
-
-        content = decode_content(
-                blob_body['content'], blob_body['encoding'])
-        calc_raw_metrics = raw.analyze_code(tree_obj['path'], content)
-
-        if not is_updating:
-            raw_metrics = RawMetrics(
-                    loc=calc_raw_metrics.loc,
-                    lloc=calc_raw_metrics.lloc,
-                    ploc=calc_raw_metrics.ploc,
-                    comments=calc_raw_metrics.comments,
-                    blanks=calc_raw_metrics.blanks,
-                    file_id=f.id
-                    )
-            db.session.add(raw_metrics)
-        else:
-            raw_metrics = RawMetrics.query.filter_by(file_id=f.id).first()
-            raw_metrics.loc = calc_raw_metrics.loc
-            raw_metrics.lloc = calc_raw_metrics.lloc
-            raw_metrics.ploc = calc_raw_metrics.ploc
-            raw_metrics.comments = calc_raw_metrics.comments
-            raw_metrics.blanks = calc_raw_metrics.blanks
-
-        calc_halstead_metrics = halstead.analyze_code(tree_obj['path'], 
-                content)
-
-        if not is_updating:
-            halstead_metrics = HalsteadMetrics(
-                    unique_n1=calc_halstead_metrics.n1,
-                    unique_n2=calc_halstead_metrics.n2,
-                    total_n1=calc_halstead_metrics.N1,
-                    total_n2=calc_halstead_metrics.N2,
-                    file_id=f.id
-                    )
-            db.session.add(halstead_metrics)
-        else:
-            halstead_metrics = HalsteadMetrics.query.filter_by(
-                    file_id=f.id).first()
-            halstead_metrics.total_n1 = calc_halstead_metrics.N1
-            halstead_metrics.total_n2 = calc_halstead_metrics.N2
-            halstead_metrics.unique_n1 = calc_halstead_metrics.n1
-            halstead_metrics.unique_n2 = calc_halstead_metrics.n2
-
-        current_app.logger.info("file: ")
-        current_app.logger.info(tree_obj['path'])
-        cfgs = graph.cfg_for_code(content, tree_obj['path'])
-        for func_name, dot in cfgs.items():
-            if not is_updating:
-                graph_vis = GraphVisualization(
-                        graph_type=GraphType.CFG,
-                        func_name=func_name,
-                        graph_dot=dot,
-                        file_id=f.id
-                        )
-                db.session.add(graph_vis)
-            else:
-                old_vis = GraphVisualization.query.filter_by(file_id=f.id,
-                        func_name=func_name)
+    names = analyzers.analyzers_for(tree_obj['path'])
+
+    if not names:
+        return
+
+    path = dir_path(f.parent_dir) + f.file_name
+    reason = policy.get_policy().skip_reason(path, tree_obj.get('size'))
+    f.skip_reason = reason
+
+    recorder = history.get_recorder()
+    git_hash = tree_obj.get('sha') or f.git_hash
+
+    if reason is not None:
+        _skip_file(f, path, git_hash, reason, is_updating)
+        return
+
+    tracer = tracing.get_tracer()
+    tracer.start_file(path)
+
+    if analyzed is not None:
+        results, times, size = analyzed
+        tracer.add_size('blob_size', size)
+        for stage, seconds in times.items():
+            tracer.add_time(stage, seconds)
+    else:
+        try:
+            with tracer.stage('fetch'):
+                if data is None:
+                    data = blobstore.get(git_hash)
+                    if data is None:
+                        data = sources.get_source().blob(tree_obj)
+                        blobstore.put(git_hash, data)
+                else:
+                    blobstore.put(git_hash, data)
+        except BlobTooLargeError as e:
+            # Размер в узле дерева не указан или меньше настоящего
+            tracer.finish_file()
+            f.skip_reason = policy.get_policy().skip_reason(path, e.size)
+            _skip_file(f, path, git_hash, f.skip_reason, is_updating)
+            return
+        tracer.add_size('blob_size', len(data))
+
+        with tracer.stage('decode'):
+            content = decode_bytes(data, 
+                    current_app.config.get('SOURCE_FALLBACK_ENCODING', 
+                        'latin-1'))
+        del data
+
+        results = {}
+        for name in names:
+            with tracer.stage(name):
+                results[name] = analyzers.run_analyzer(name, path, content)
+
+    with tracer.stage('db'):
+        for name, result in results.items():
+            _STORE_FUNCS[name](f, result, is_updating)
+        if recorder is not None:
+            recorder.record(path, git_hash, results)
+        if 'cfg' in results and search.get_indexer() is not None:
+            search.get_indexer().index_functions(f, path, results['cfg'])
+        if hotspots.get_tracker() is not None:
+            hotspots.get_tracker().update(f, path, results)
+
+    tracer.finish_file()
+
+
+def _index_file(f):
+    """Добавляет новый файл *f* в поисковый индекс проекта (см. 
+    :mod:`flaskr.search`).
+    """
+    indexer = search.get_indexer()
 
-                if old_vis:
-                    old_vis.delete()
-                
-                graph_vis = GraphVisualization(
-                        graph_type=GraphType.CFG,
-                        func_name=func_name,
-                        graph_dot=dot,
-                        file_id=f.id
-                        )
-                db.session.add(graph_vis)
+    if indexer is not None:
+        indexer.index_file(f, dir_path(f.parent_dir) + f.file_name)
+
+
+def _file_done(f):
+    """Отмечает файл *f* как обработанный в контрольных точках текущей 
+    загрузки (см. :mod:`flaskr.checkpoint`).
+    """
+    cp = checkpoint.get_checkpoint()
+
+    if cp is not None:
+        cp.file_done(dir_path(f.parent_dir) + f.file_name)
 
 
 def _add_tree_obj_to_db(o, parent_dir, project_id):
@@ -171,7 +466,7 @@ def _add_tree_obj_to_db(o, parent_dir, project_id):
 
     Если узел дерева типа **blob**, то создает модель файла :class:`flaskr.models.File`. Для данного файла добавляются метрики в БД при помощи функции :func:`_add_metrics_for_file`.
 
-    Если узел дерева типа **tree**, то создает модель директории :class:`flaskr.models.Directory`.
+    Если узел дерева типа **tree**, то создает модель директории :class:`flaskr.models.Directory` с пустым Git хешем, хеш устанавливается после обхода поддерева.
 
     :param dict o: узел из дерева коммита репозитория
     :param parent_dir: родительская директория узла
@@ -186,18 +481,23 @@ def _add_tree_obj_to_db(o, parent_dir, project_id):
         
         db.session.add(f)
         db.session.flush()
+        _index_file(f)
         _add_metrics_for_file(o, f)
         f.update_time = datetime.datetime.utcnow()
+        _file_done(f)
 
         return f
     
     if o['type'] == 'tree':
+        # Git хеш директории устанавливается функцией _traverse после 
+        # обхода всего поддерева
         d = Directory(dir_name = o['path'],
                 project_id=project_id,
                 dir_parent=parent_dir,
-                git_hash=o['sha'])
+                git_hash='')
         db.session.add(d)
         d.update_time = datetime.datetime.utcnow()
+        db.session.flush()
 
         return d
 
@@ -228,14 +528,18 @@ def _update_tree_obj_in_db(o, parent_dir, project_id):
                     git_hash=o['sha'])
             db.session.add(f)
             db.session.flush()
+            _index_file(f)
             _add_metrics_for_file(o, f)
             f.update_time = datetime.datetime.utcnow()
 
         if o['sha'] != f.git_hash:
+            f.churn += 1
             _add_metrics_for_file(o, f, is_updating=True)
             f.git_hash = o['sha']
             f.update_time = datetime.datetime.utcnow()
 
+        _file_done(f)
+
         return f
 
     if o['type'] == 'tree':
@@ -249,9 +553,10 @@ def _update_tree_obj_in_db(o, parent_dir, project_id):
             d = Directory(dir_name = o['path'],
                 project_id=project_id,
                 dir_parent=parent_dir,
-                git_hash=o['sha'])
+                git_hash='')
             db.session.add(d)
             d.update_time = datetime.datetime.utcnow()
+            db.session.flush()
             return d
         
         if o['sha'] != d.git_hash:
@@ -261,79 +566,615 @@ def _update_tree_obj_in_db(o, parent_dir, project_id):
         return None
  
 
-def add_tree_objs_to_db(tree_url, project_id):
-    """Обходит дерево коммита при помощи Github API и добавляет узлы в БД.
+def _get_policy(project, tree):
+    """Создает политику загрузки для проекта *project*. Если в корне 
+    дерева *tree* есть файл *.gitattributes*, то он учитывается политикой.
+
+    :param project: модель проекта
+    :type project: :class:`flaskr.models.Project`
+    :param list tree: узлы корня дерева коммита
+    :rtype: :class:`flaskr.policy.IngestionPolicy`
+    """
+    gitattributes = None
+
+    if project.use_gitattributes:
+        for o in tree:
+            if o['type'] == 'blob' and o['path'] == '.gitattributes':
+                gitattributes = decode_bytes(sources.get_source().blob(o))
+                break
+
+    return policy.IngestionPolicy.from_project(project, gitattributes)
+
+
+def get_unfinished_job(project_id, git_hash=None):
+    """Возвращает последнее незавершенное задание загрузки проекта.
+
+    :param int project_id: идентификатор проекта
+    :param str git_hash: Git хеш дерева задания, None - любое дерево
+    :rtype: :class:`flaskr.models.IngestionJob`
+    """
+    query = IngestionJob.query.filter_by(project_id=project_id, 
+            status='running')
+
+    if git_hash is not None:
+        query = query.filter_by(git_hash=git_hash)
+
+    return query.order_by(IngestionJob.id.desc()).first()
+
+
+def add_tree_objs_to_db(tree_ref, project_id, source=None, commit_sha=None):
+    """Обходит дерево коммита и добавляет узлы в БД.
 
-    В Github API есть ресурс для получения дерева файлов и директорий коммита:
+    Дерево и содержимое файлов читаются из источника *source* (см. :mod:`flaskr.sources`), по умолчанию - через Github API (:class:`GithubSource`). В Github API есть ресурс для получения дерева файлов и директорий коммита:
     `https://api.github.com/repos/{user}/{repo}/git/trees{/sha}`
 
-    URL с SHA-хешом соответстующего дерева передается в *tree_url*.
+    Для источника :class:`GithubSource` в *tree_ref* передается URL с SHA-хешом соответстующего дерева, для других источников - ссылка, которую вернул источник.
 
     Обход дерева производится при помощи функции :func:`_traverse`, в параметр *callback* передается функция :func:`_add_tree_obj_to_db`.
 
-    :param string tree_url: URL дерева
+    Загрузка фиксируется в БД частями (см. :mod:`flaskr.checkpoint`). Если предыдущая загрузка этого дерева была прервана, то она продолжается с последней контрольной точки при помощи функции :func:`_update_tree_obj_in_db`.
+
+    :param string tree_ref: URL или ссылка на дерево
     :param int project_id: идентификатор проекта
+    :param source: источник дерева и содержимого файлов
+    :param str commit_sha: SHA коммита для снимка метрик (см. :mod:`flaskr.history`)
     """
-    response = requests.get(tree_url)
-    body = response.json()
+    source = source or GithubSource()
+    sources.begin(source)
+    sha, tree = source.root_tree(tree_ref)
 
     p = Project.query.filter_by(id=project_id).first()
     p.update_time = datetime.datetime.utcnow()
 
-    root_dir = Directory(project_id=project_id,
-            git_hash=body['sha'])
+    job = get_unfinished_job(project_id, sha)
+    root_dir = p.get_root_dir()
+
+    if job is not None and root_dir is not None:
+        # Продолжение прерванной загрузки с последней контрольной точки
+        callback = _update_tree_obj_in_db
+    else:
+        job = None
+        callback = _add_tree_obj_to_db
+        root_dir = Directory(project_id=project_id,
+                git_hash='', generation=p.generation)
+        db.session.add(root_dir)
+        db.session.flush()
+    root_id = root_dir.id
+
+    policy.begin(_get_policy(p, tree))
+    tracer = tracing.begin(project_id, sha, job)
+    cp = checkpoint.begin(tracer.job)
+    recorder = history.begin(tracer.job, p.generation, sha, commit_sha)
+    search.begin(project_id, p.generation)
+    hotspots.begin(project_id, p.generation)
+    _traverse(tree, root_dir, project_id, callback)
+    root_dir = db.session.get(Directory, root_id)
+    root_dir.git_hash = sha
+    recorder.finish(root_dir)
+    tracer.finish()
+    cp.finish()
+
+    db.session.commit()
+    fragments.invalidate(project_id)
+    treeindex.rebuild(db.session.get(Project, project_id))
+
+
+def get_tarball_url(repository, ref=None):
+    """Возвращает URL архива (tarball) коммита репозитория.
+
+    :param dict repository: JSON-объект репозитория
+    :param str ref: SHA коммита или название ветви, по умолчанию - главная ветвь
+    :rtype: str
+    """
+    return apply_args_to_url(repository['archive_url'], 
+            archive_format='tarball', 
+            ref=ref or repository['default_branch'])
+
+
+def _new_dir(dirs, entries, path, project_id):
+    """Возвращает идентификатор директории *path* загружаемого дерева, 
+    создает модели директории и ее родителей, если их нет в *dirs*.
+
+    :param dict dirs: идентификаторы директорий {путь: идентификатор}
+    :param dict entries: узлы директорий {путь: [(режим, имя, Git хеш)]}
+    :param str path: путь к директории относительно корня репозитория
+    :param int project_id: идентификатор проекта
+    :rtype: int
+    """
+    if path not in dirs:
+        parent_path, _, name = path.rpartition('/')
+        d = Directory(dir_name=name, project_id=project_id, 
+                dir_parent_id=_new_dir(dirs, entries, parent_path, 
+                    project_id), git_hash='')
+        db.session.add(d)
+        db.session.flush()
+        dirs[path] = d.id
+        entries[path] = []
+    return dirs[path]
+
+
+def _set_tree_hashes(dirs, entries):
+    """Вычисляет Git хеши директорий загруженного дерева от самых 
+    глубоких к корню и записывает их в БД одним запросом.
 
+    :param dict dirs: идентификаторы директорий {путь: идентификатор}
+    :param dict entries: узлы директорий {путь: [(режим, имя, Git хеш)]}
+    :returns: Git хеш корневой директории
+    :rtype: str
+    """
+    hashes = {}
+    for path in sorted(dirs, key=lambda x: x.count('/') + bool(x), 
+            reverse=True):
+        hashes[path] = gitobj.tree_sha(entries[path])
+        if path:
+            parent_path, _, name = path.rpartition('/')
+            entries[parent_path].append((gitobj.TREE_MODE, name, 
+                hashes[path]))
+
+    db.session.execute(db.update(Directory), [{'id': dirs[path], 
+        'git_hash': git_hash} for path, git_hash in hashes.items()])
+    return hashes['']
+
+
+def _apply_policy(ingestion_policy, files):
+    """Проверяет политикой *ingestion_policy* уже проанализированные файлы 
+    текущей загрузки и удаляет результаты анализа файлов, которые 
+    политика пропускает (см. :func:`_skip_file`).
+
+    :param ingestion_policy: политика загрузки
+    :type ingestion_policy: :class:`flaskr.policy.IngestionPolicy`
+    :param files: файлы [(идентификатор, путь, Git хеш)]
+    """
+    for file_id, path, git_hash in files:
+        reason = ingestion_policy.skip_reason(path)
+        if reason is not None:
+            f = db.session.get(File, file_id)
+            f.skip_reason = reason
+            _skip_file(f, path, git_hash, reason, True)
+
+
+def add_tarball_to_db(tarball_url, project_id):
+    """Загружает архив (tarball) коммита одним HTTP запросом и добавляет 
+    его содержимое в БД.
+
+    Архив читается модулем :mod:`tarfile` в потоковом режиме, файлы не 
+    распаковываются на диск: каждый файл анализируется сразу после 
+    чтения (см. :func:`_add_metrics_for_file`), поэтому память 
+    ограничена размером самого большого файла. Модели директорий 
+    (:class:`flaskr.models.Directory`) и файлов (:class:`flaskr.models.File`) 
+    создаются по путям файлов в архиве.
+
+    Git хеши файлов и директорий вычисляются локально (см. 
+    :mod:`flaskr.gitobj`). Хеши директорий совпадают с хешами Git, если 
+    в репозитории нет подмодулей и файлов с атрибутом export-ignore, 
+    иначе при следующем событии push такие директории будут обновлены.
+
+    Файлы фиксируются в БД частями (см. :mod:`flaskr.checkpoint`), хеши 
+    директорий устанавливаются в конце загрузки. Прерванную загрузку 
+    архива завершает следующее событие push: директории с пустым хешем 
+    обходятся повторно, уже добавленные файлы не анализируются.
+
+    Файл *.gitattributes* может встретиться в архиве после других файлов, 
+    поэтому файлы, проанализированные до него, повторно проверяются 
+    политикой с его правилами (см. :func:`_apply_policy`).
+
+    :param string tarball_url: URL архива коммита (см. :func:`get_tarball_url`)
+    :param int project_id: идентификатор проекта
+    """
+    response = requests.get(tarball_url, stream=True)
+    response.raise_for_status()
+    response.raw.decode_content = True
+
+    p = Project.query.filter_by(id=project_id).first()
+    p.update_time = datetime.datetime.utcnow()
+    # Модель проекта удаляется из сессии в контрольных точках
+    use_gitattributes = p.use_gitattributes
+
+    root_dir = Directory(project_id=project_id, git_hash='', 
+            generation=p.generation)
     db.session.add(root_dir)
+    db.session.flush()
+
+    # Модели директорий удаляются из сессии в контрольных точках, поэтому 
+    # хранятся идентификаторы директорий {путь: идентификатор} и узлы 
+    # директорий {путь: [(режим, имя, SHA)]}
+    dirs = {'': root_dir.id}
+    entries = {'': []}
+
+    base_policy = _get_policy(p, [])
+    policy.begin(base_policy)
+    tracer = tracing.begin(project_id, '')
+    cp = checkpoint.begin(tracer.job)
+    recorder = history.begin(tracer.job, p.generation, '')
+    indexer = search.begin(project_id, p.generation)
+    hotspots.begin(project_id, p.generation)
+
+    # Файлы, проанализированные до .gitattributes [(id, путь, Git хеш)]
+    analyzed = [] if use_gitattributes else None
+
+    with tarfile.open(fileobj=response.raw, mode='r|*') as tar:
+        for member in tar:
+            # Все пути в архиве Github начинаются с директории 
+            # <владелец>-<репозиторий>-<SHA>/
+            path = member.name.partition('/')[2].strip('/')
+
+            if not path:
+                continue
+
+            if member.isdir():
+                _new_dir(dirs, entries, path, project_id)
+                continue
+
+            if member.issym():
+                mode = gitobj.LINK_MODE
+                data = member.linkname.encode('utf-8')
+            elif member.isfile():
+                mode = gitobj.EXEC_MODE if member.mode & 0o111 \
+                        else gitobj.BLOB_MODE
+                data = tar.extractfile(member).read()
+            else:
+                continue
+
+            parent_path, _, name = path.rpartition('/')
+            sha = gitobj.blob_sha(data)
+            parent_id = _new_dir(dirs, entries, parent_path, project_id)
+            entries[parent_path].append((mode, name, sha))
+
+            f = File(file_name=name, 
+                    parent_dir=db.session.get(Directory, parent_id), 
+                    git_hash=sha)
+            db.session.add(f)
+            db.session.flush()
+            indexer.index_file(f, path)
+
+            if path == '.gitattributes' and analyzed is not None:
+                ingestion_policy = policy.IngestionPolicy(
+                        base_policy.max_blob_size, base_policy.excludes,
+                        policy.parse_gitattributes(decode_bytes(data)))
+                policy.begin(ingestion_policy)
+                _apply_policy(ingestion_policy, analyzed)
+                analyzed = None
+
+            if mode != gitobj.LINK_MODE:
+                _add_metrics_for_file({'path': name, 'size': len(data)}, f,
+                        data=data)
+                if analyzed is not None and f.skip_reason is None and \
+                        analyzers.analyzers_for(name):
+                    analyzed.append((f.id, path, sha))
+            f.update_time = datetime.datetime.utcnow()
+            del data
+            cp.file_done(path)
+
+    tracer.job.git_hash = _set_tree_hashes(dirs, entries)
+    recorder.finish(db.session.get(Directory, dirs['']), tracer.job.git_hash)
+    tracer.finish()
+    cp.finish()
+
+    db.session.commit()
+    fragments.invalidate(project_id)
+    treeindex.rebuild(db.session.get(Project, project_id))
 
-    _traverse(body['tree'], root_dir, project_id, _add_tree_obj_to_db)
+
+def _walk_local(root):
+    """Обходит локальную копию репозитория *root* в порядке имен, 
+    директория *.git* пропускается.
+
+    :returns: генератор кортежей (путь относительно корня, абсолютный 
+        путь, режим Git, размер)
+    """
+    for dirpath, dirnames, filenames in os.walk(root):
+        # Ссылки на директории хранятся в Git как символические ссылки
+        links = [d for d in dirnames 
+                if os.path.islink(os.path.join(dirpath, d))]
+        dirnames[:] = sorted(d for d in dirnames 
+                if d != '.git' and d not in links)
+        for name in sorted(filenames + links):
+            full = os.path.join(dirpath, name)
+            path = os.path.relpath(full, root).replace(os.sep, '/')
+            st = os.lstat(full)
+            if stat.S_ISLNK(st.st_mode):
+                yield path, full, gitobj.LINK_MODE, st.st_size
+            elif stat.S_ISREG(st.st_mode):
+                yield path, full, gitobj.EXEC_MODE if st.st_mode & 0o111 \
+                        else gitobj.BLOB_MODE, st.st_size
+
+
+def _analyze_local_file(task):
+    """Читает файл локальной копии репозитория, вычисляет его Git хеш и, 
+    если нужно, сохраняет содержимое в хранилище (см. 
+    :mod:`flaskr.blobstore`) и запускает анализаторы. Функция выполняется 
+    в процессах пула :func:`add_local_tree_to_db` и не обращается к БД.
+
+    :param tuple task: путь относительно корня, абсолютный путь, режим 
+        Git, Git хеш файла в БД или None, признак анализа файла, 
+        кодировка для недекодируемых файлов, директория хранилища или None
+    :returns: путь, Git хеш, размер, результаты анализаторов или None, 
+        время этапов {этап: секунды}, размер записанного в хранилище файла
+    :rtype: tuple
+    """
+    path, full, mode, known_sha, analyze, fallback, store_root = task
+    times = {}
+
+    start = time.perf_counter()
+    if mode == gitobj.LINK_MODE:
+        data = os.readlink(full).encode('utf-8')
+    else:
+        with open(full, 'rb') as f:
+            data = f.read()
+    sha = gitobj.blob_sha(data)
+    stored = 0
+    if analyze and store_root is not None:
+        stored = blobstore.write(store_root, sha, data)
+    times['fetch'] = time.perf_counter() - start
+
+    if not analyze or sha == known_sha:
+        return path, sha, len(data), None, times, stored
+
+    start = time.perf_counter()
+    content = decode_bytes(data, fallback)
+    times['decode'] = time.perf_counter() - start
+
+    results = {}
+    for name in analyzers.analyzers_for(path):
+        start = time.perf_counter()
+        results[name] = analyzers.run_analyzer(name, path, content)
+        times[name] = time.perf_counter() - start
+
+    return path, sha, len(data), results, times, stored
+
+
+def add_local_tree_to_db(root, project_id, workers=None, progress=None):
+    """Загружает локальную копию репозитория *root* в БД (команда 
+    ``flask analyze-path``).
+
+    Файлы читаются и анализируются параллельно в пуле процессов 
+    (:class:`concurrent.futures.ProcessPoolExecutor`) функцией 
+    :func:`_analyze_local_file`, результаты записываются в БД в порядке 
+    обхода тем же кодом, что и при загрузке через веб-хук (см. 
+    :func:`_add_metrics_for_file`). Чтобы результаты не копились в 
+    памяти, в пуле одновременно находится не больше *4 \* workers* 
+    файлов.
+
+    Git хеши файлов и директорий вычисляются локально (см. 
+    :mod:`flaskr.gitobj`), директория *.git* пропускается. Файлы 
+    фиксируются в БД частями (см. :mod:`flaskr.checkpoint`), хеши 
+    директорий устанавливаются в конце загрузки. Если загрузка была 
+    прервана (у корня текущего поколения пустой хеш), то она 
+    продолжается: существующие директории используются повторно, файлы 
+    с тем же Git хешем не анализируются.
+
+    Дерево загружается в текущее поколение проекта, поэтому загруженное 
+    дерево нужно сначала отсоединить сменой поколения (см. 
+    :mod:`flaskr.collector`).
+
+    :param str root: путь к локальной копии репозитория
+    :param int project_id: идентификатор проекта
+    :param int workers: количество процессов, по умолчанию - количество 
+        процессоров
+    :param progress: функция ``progress(files, summary)``, которая 
+        вызывается после фиксации каждой части загрузки
+    :returns: сводка по загрузке (см. :meth:`flaskr.tracing.IngestionTracer.summary`)
+    :rtype: dict
+    :raises ValueError: если дерево текущего поколения проекта уже загружено
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    p = Project.query.filter_by(id=project_id).first()
+    p.update_time = datetime.datetime.utcnow()
+
+    root_dir = p.get_root_dir()
+    # Модели директорий удаляются из сессии в контрольных точках, поэтому 
+    # хранятся идентификаторы директорий {путь: идентификатор}
+    dirs = {}
+    files = {}
+    if root_dir is not None:
+        if root_dir.git_hash:
+            raise ValueError('Дерево проекта %d уже загружено' % project_id)
+
+        # Продолжение прерванной загрузки
+        paths = history.tree_paths(root_dir)
+        for id, path in paths.items():
+            dirs[path.rstrip('/')] = id
+        for id, dir_id, name, sha in db.session.execute(db.select(File.id, 
+                File.dir_id, File.file_name, File.git_hash)
+                .join(Directory, Directory.id == File.dir_id)
+                .where(Directory.project_id == project_id)):
+            if dir_id in paths:
+                files[paths[dir_id] + name] = (id, sha)
+        job = get_unfinished_job(project_id, '')
+    else:
+        root_dir = Directory(project_id=project_id, git_hash='', 
+                generation=p.generation)
+        db.session.add(root_dir)
+        db.session.flush()
+        dirs[''] = root_dir.id
+        job = None
+
+    # узлы директорий {путь: [(режим, имя, SHA)]}
+    entries = {path: [] for path in dirs}
+
+    gitattributes = None
+    if p.use_gitattributes and \
+            os.path.isfile(os.path.join(root, '.gitattributes')):
+        with open(os.path.join(root, '.gitattributes'), 'rb') as f:
+            gitattributes = decode_bytes(f.read())
+    policy.begin(policy.IngestionPolicy.from_project(p, gitattributes))
+
+    tracer = tracing.begin(project_id, '', job)
+    cp = checkpoint.begin(tracer.job)
+    recorder = history.begin(tracer.job, p.generation, '')
+    indexer = search.begin(project_id, p.generation)
+    hotspots.begin(project_id, p.generation)
+
+    ingestion_policy = policy.get_policy()
+    fallback = current_app.config.get('SOURCE_FALLBACK_ENCODING', 'latin-1')
+    store_root = blobstore.root()
+
+    def tasks():
+        for path, full, mode, size in _walk_local(root):
+            analyze = mode != gitobj.LINK_MODE and \
+                    bool(analyzers.analyzers_for(path)) and \
+                    ingestion_policy.skip_reason(path, size) is None
+            known = files.get(path)
+            yield (path, full, mode, known[1] if known else None, analyze, 
+                    fallback, store_root), mode
+
+    def store(result, mode):
+        path, sha, size, results, times, stored = result
+        blobstore.written(stored)
+        parent_path, _, name = path.rpartition('/')
+        parent_id = _new_dir(dirs, entries, parent_path, project_id)
+        entries[parent_path].append((mode, name, sha))
+
+        known = files.get(path)
+        if known is not None and known[1] == sha:
+            return
+
+        if known is not None:
+            f = db.session.get(File, known[0])
+            f.git_hash = sha
+            f.churn += 1
+        else:
+            f = File(file_name=name, 
+                    parent_dir=db.session.get(Directory, parent_id), 
+                    git_hash=sha)
+            db.session.add(f)
+            db.session.flush()
+            indexer.index_file(f, path)
+
+        if mode != gitobj.LINK_MODE:
+            _add_metrics_for_file({'path': name, 'size': size, 'sha': sha},
+                    f, is_updating=known is not None, 
+                    analyzed=(results, times, size) if results is not None
+                    else None)
+        f.update_time = datetime.datetime.utcnow()
+
+        cp.file_done(path)
+        if progress is not None and \
+                tracer.job.files_done % cp.chunk_size == 0:
+            progress(tracer.job.files_done, tracer.summary())
+
+    workers = workers or os.cpu_count() or 1
+    pending = collections.deque()
+    with ProcessPoolExecutor(workers) as executor:
+        for task, mode in tasks():
+            pending.append((executor.submit(_analyze_local_file, task), mode))
+            if len(pending) >= 4 * workers:
+                future, mode = pending.popleft()
+                store(future.result(), mode)
+        while pending:
+            future, mode = pending.popleft()
+            store(future.result(), mode)
+
+    tracer.job.git_hash = _set_tree_hashes(dirs, entries)
+    recorder.finish(db.session.get(Directory, dirs['']), tracer.job.git_hash)
+    summary = tracer.finish()
+    cp.finish()
 
     db.session.commit()
+    fragments.invalidate(project_id)
+    treeindex.rebuild(db.session.get(Project, project_id))
 
+    return summary
 
-def update_tree_objs_in_db(tree_url, project_id):
-    """Обходит дерево коммита при помощи Github API и обновляет узлы в БД.
 
-    В Github API есть ресурс для получения дерева файлов и директорий коммита:
+def update_tree_objs_in_db(tree_ref, project_id, source=None, 
+        commit_sha=None):
+    """Обходит дерево коммита и обновляет узлы в БД.
+
+    Дерево и содержимое файлов читаются из источника *source* (см. :mod:`flaskr.sources`), по умолчанию - через Github API (:class:`GithubSource`). В Github API есть ресурс для получения дерева файлов и директорий коммита:
     `https://api.github.com/repos/{user}/{repo}/git/trees{/sha}`
 
-    URL с SHA-хешом соответстующего дерева передается в *tree_url*.
+    Для источника :class:`GithubSource` в *tree_ref* передается URL с SHA-хешом соответстующего дерева, для других источников - ссылка, которую вернул источник.
+
+    Обход дерева производится при помощи функции :func:`_traverse`, в параметр *callback* передается функция :func:`_update_tree_obj_in_db`. Загрузка фиксируется в БД частями (см. :mod:`flaskr.checkpoint`).
 
-    Обход дерева производится при помощи функции :func:`_traverse`, в параметр *callback* передается функция :func:`_update_tree_obj_in_db`.
+    Git хеш корневой директории обновляется, только если он не был изменен другой загрузкой с начала обхода.
 
-    :param string tree_url: URL дерева
+    :param string tree_ref: URL или ссылка на дерево
     :param int project_id: идентификатор проекта
+    :param source: источник дерева и содержимого файлов
+    :param str commit_sha: SHA коммита для снимка метрик (см. :mod:`flaskr.history`)
+    :raises flaskr.delivery.ConcurrentIngestionError: если дерево проекта было изменено другой загрузкой
     """
-    response = requests.get(tree_url)
-    body = response.json()
+    source = source or GithubSource()
+    sources.begin(source)
+    sha, tree = source.root_tree(tree_ref)
 
-    d = Directory.query.filter_by(
-            project_id=project_id,
-            dir_name=None
-            ).first()
+    p = Project.query.filter_by(id=project_id).first()
+    d = p.get_root_dir()
 
-    if body['sha'] != d.git_hash:
-        p = Project.query.filter_by(id=project_id).first()
+    if sha != d.git_hash:
+        base_hash = d.git_hash
         p.update_time = datetime.datetime.utcnow()
-        _traverse(body['tree'], d, project_id, _update_tree_obj_in_db)
+        policy.begin(_get_policy(p, tree))
+        tracer = tracing.begin(project_id, sha, 
+                get_unfinished_job(project_id, sha))
+        cp = checkpoint.begin(tracer.job)
+        recorder = history.begin(tracer.job, p.generation, sha, commit_sha)
+        search.begin(project_id, p.generation)
+        hotspots.begin(project_id, p.generation)
+        root_id = d.id
+        _traverse(tree, d, project_id, _update_tree_obj_in_db)
+        recorder.finish(db.session.get(Directory, root_id))
+        tracer.finish()
+        cp.finish()
+
+        # Оптимистичная проверка: корень не должен был измениться другой 
+        # загрузкой с начала обхода
+        result = db.session.execute(db.update(Directory)
+                .where(Directory.id == root_id, 
+                    Directory.git_hash == base_hash)
+                .values(git_hash=sha))
+        if result.rowcount != 1:
+            db.session.rollback()
+            raise delivery.ConcurrentIngestionError(
+                    'Дерево проекта %d изменено другой загрузкой' % project_id)
+
         db.session.commit()
+        fragments.invalidate(project_id)
+        treeindex.rebuild(db.session.get(Project, project_id))
+
+
+def update_to_commit(project_id, repository, sha):
+    """Обновляет узлы дерева проекта в БД до коммита *sha*. Источник 
+    дерева выбирается функцией :func:`get_source`.
+
+    :param int project_id: идентификатор проекта
+    :param dict repository: JSON-объект репозитория из события веб-хука
+    :param str sha: SHA коммита
+    """
+    project = Project.query.filter_by(id=project_id).first()
+
+    with closing(get_source(project)) as source:
+        tree_ref = source.tree_of_commit(repository, sha)
+        update_tree_objs_in_db(tree_ref, project_id, source, sha)
 
 
 def _traverse(tree, parent_dir, project_id, callback):
     """Вспомогательная функция, которая используется для реализации рекурсивного обхода дерева.
 
-    Данная функция используется функциями :func:`add_tree_objs_to_db` и :func:`update_tree_objs_in_db`. Функция обходит рекурсивно дерево, критерием прерывания рекурсии являются узлы дерева, которые имеют тип (поле *type*) blob (файл). То есть, если узел имеет тип tree (директория), то обход продолжается для этой директории. При обходе дерева для каждого узла вызывается функция *callback*.
+    Данная функция используется функциями :func:`add_tree_objs_to_db` и :func:`update_tree_objs_in_db`. Функция обходит рекурсивно дерево, критерием прерывания рекурсии являются узлы дерева, которые имеют тип (поле *type*) blob (файл). То есть, если узел имеет тип tree (директория), то обход продолжается для этой директории. При обходе дерева для каждого узла вызывается функция *callback*. Поддеревья читаются из источника текущей загрузки (см. :func:`flaskr.sources.get_source`).
 
-    :param dict tree: JSON-объект дерева
+    Git хеш директории устанавливается только после обхода всего ее поддерева. Поэтому при прерванной загрузке директории с неполным поддеревом имеют старый (или пустой) хеш и будут обойдены повторно, а полностью загруженные директории - пропущены (см. :mod:`flaskr.checkpoint`).
+
+    Директории удаляются из сессии в контрольных точках вместе с 
+    остальными моделями, поэтому обход хранит их идентификаторы и 
+    загружает модели заново перед вызовом *callback*.
+
+    :param list tree: узлы дерева
     :param parent_dir: родительская директория
     :type parent_dir: :class:`flaskr.models.Directory`
     :param int project_id: идентификатор проекта
     """
+    parent_id = parent_dir.id
+
     for o in tree:
-        obj = callback(o, parent_dir, project_id)
+        obj = callback(o, db.session.get(Directory, parent_id), project_id)
 
         if obj:
             if o['type'] == 'tree':
-                response = requests.get(o['url'])
-                body = response.json()
-                _traverse(body['tree'], obj, project_id, callback)
-
+                dir_id = obj.id
+                _traverse(sources.get_source().subtree(o), obj, project_id,
+                        callback)
+                db.session.get(Directory, dir_id).git_hash = o['sha']
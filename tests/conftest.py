@@ -0,0 +1,237 @@
+"""Общие фикстуры тестов: приложение с временной БД, простые анализаторы
+вместо пакетов *metrics* и *visualization*, локальный Git репозиторий
+и HTTP сервер для архивов.
+"""
+import functools
+import http.server
+import re
+import shutil
+import subprocess
+import threading
+from contextlib import closing
+import pytest
+from flaskr import analyzers
+from flaskr import compression
+from flaskr import create_app
+from flaskr import distributions
+from flaskr import fragments
+from flaskr import treeindex
+from flaskr import webhook
+from flaskr.models import db
+from flaskr.models import Project
+from flaskr.models import User
+
+#: Определение функции на языке C: ``int имя(``
+_FUNC_RE = re.compile(r'^\w+\s+(\w+)\s*\(', re.MULTILINE)
+
+
+def _raw(path, content):
+    lines = content.splitlines()
+    blanks = sum(1 for line in lines if not line.strip())
+    return {'loc': len(lines), 'lloc': len(lines) - blanks,
+            'ploc': len(lines) - blanks, 'comments': 0, 'blanks': blanks}
+
+
+def _halstead(path, content):
+    words = content.split()
+    return {'unique_n1': len(set(words)) + 1, 'unique_n2': 2,
+            'total_n1': len(words) + 1, 'total_n2': 2}
+
+
+def _cfg(path, content):
+    return {name: 'digraph "%s" { entry [label="%s"]; }' % (name, body)
+            for name, body in ((m.group(1), m.group(0))
+                for m in _FUNC_RE.finditer(content))}
+
+
+@pytest.fixture(autouse=True)
+def simple_analyzers():
+    """Заменяет встроенные анализаторы простыми анализаторами версии
+    *test-1* и восстанавливает реестр после теста.
+    """
+    saved = (dict(analyzers._analyzers), dict(analyzers._extensions),
+            dict(analyzers._versions))
+
+    analyzers._extensions.clear()
+    analyzers.register_analyzer('raw', _raw,
+            analyzers.C_SOURCES + analyzers.C_HEADERS, 'test-1')
+    analyzers.register_analyzer('halstead', _halstead,
+            analyzers.C_SOURCES + analyzers.C_HEADERS, 'test-1')
+    analyzers.register_analyzer('cfg', _cfg, analyzers.C_SOURCES, 'test-1')
+
+    yield
+
+    for registry, values in zip((analyzers._analyzers,
+            analyzers._extensions, analyzers._versions), saved):
+        registry.clear()
+        registry.update(values)
+
+
+@pytest.fixture
+def app(tmp_path):
+    """Приложение с БД SQLite во временной директории. Контекст
+    приложения не остается открытым, чтобы запросы тестового клиента
+    получали свой объект g.
+    """
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///%s' % (tmp_path / 'test.db'),
+        'BLOB_STORE_DIR': str(tmp_path / 'blobs'),
+        'GIT_MIRRORS_DIR': str(tmp_path / 'mirrors'),
+        'INGESTION_SOURCE': 'mirror',
+        'INGESTION_CHUNK_SIZE': 2,
+        'GC_BACKGROUND': False,
+        'GC_BATCH_PAUSE': 0,
+        'REANALYSIS_BATCH_PAUSE': 0
+    })
+
+    # Кеши модулей общие для всех приложений процесса
+    for cache in (fragments._cache, treeindex._indexes,
+            distributions._cache, compression._cache):
+        cache.clear()
+
+    with app.app_context():
+        db.create_all()
+
+    yield app
+
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def project_id(app):
+    """Идентификатор проекта *p* пользователя *u* без веб-хука."""
+    with app.app_context():
+        user = User(username='u', email='u@example.com', passw_hash='x')
+        db.session.add(user)
+        db.session.flush()
+        project = Project(user_id=user.id, project_name='p')
+        db.session.add(project)
+        db.session.commit()
+        return project.id
+
+
+def git(repo, *args):
+    """Выполняет команду Git в репозитории *repo* и возвращает вывод."""
+    return subprocess.run(['git', '-C', str(repo)] + list(args), check=True,
+            stdout=subprocess.PIPE, text=True).stdout.strip()
+
+
+@pytest.fixture
+def repo(tmp_path):
+    """Локальный Git репозиторий с одним коммитом в ветви *main*. Метод
+    ``commit(files, message)`` записывает файлы {путь: содержимое или
+    None для удаления} и возвращает SHA нового коммита.
+    """
+    if shutil.which('git') is None:
+        pytest.skip('git не установлен')
+
+    path = tmp_path / 'repo'
+    path.mkdir()
+    git(path, 'init', '--quiet', '--initial-branch=main')
+    git(path, 'config', 'user.email', 'test@example.com')
+    git(path, 'config', 'user.name', 'Test')
+
+    class Repo:
+        def __init__(self):
+            self.path = path
+            self.url = str(path)
+
+        def commit(self, files, message='change'):
+            for name, content in files.items():
+                full = path / name
+                if content is None:
+                    full.unlink()
+                    continue
+                full.parent.mkdir(parents=True, exist_ok=True)
+                full.write_text(content)
+            git(path, 'add', '--all')
+            git(path, 'commit', '--quiet', '-m', message)
+            return git(path, 'rev-parse', 'HEAD')
+
+        def tree_sha(self, ref='HEAD', path=''):
+            return git(self.path, 'rev-parse', '%s:%s' % (ref, path))
+
+        def repository(self):
+            """JSON-объект репозитория события веб-хука."""
+            return {'clone_url': self.url, 'default_branch': 'main',
+                    'branches_url': self.url + '/branches{/branch}',
+                    'archive_url': self.url + '/{archive_format}{/ref}'}
+
+    r = Repo()
+    r.commit({
+        'README': 'readme\n',
+        'src/main.c': 'int main(void)\n{\n    return helper();\n}\n',
+        'src/helper.c': 'int helper(void)\n{\n    return 0;\n}\n\n'
+                'int unused(void)\n{\n    return 1;\n}\n',
+        'src/helper.h': 'int helper(void);\n',
+        'lib/util/strings.c': 'int strings_len(const char *s)\n{\n'
+                '    return 0;\n}\n',
+    }, 'initial')
+    return r
+
+
+@pytest.fixture
+def send_event(client, repo):
+    """Функция ``send_event(event, sha=None, hook_id=7, delivery_id=None,
+    project_name='p', repository=None)``, которая отправляет событие
+    веб-хука Github *event* проекту пользователя *u* и возвращает ответ.
+    По умолчанию в событии передается репозиторий фикстуры *repo*.
+    """
+    def send_event(event, sha=None, hook_id=7, delivery_id=None,
+            project_name='p', repository=None):
+        headers = {'X-GitHub-Event': event, 'X-GitHub-Hook-ID': str(hook_id)}
+        if delivery_id is not None:
+            headers['X-GitHub-Delivery'] = delivery_id
+        payload = {'repository': repository or repo.repository()}
+        if sha is not None:
+            payload['after'] = sha
+        return client.post('/api/u/%s/webhook/github' % project_name,
+                json=payload, headers=headers)
+
+    return send_event
+
+
+@pytest.fixture
+def ingest(repo):
+    """Функция ``ingest(project_id)``, которая загружает ветвь *main*
+    репозитория фикстуры *repo* в проект источником проекта. Вызывается
+    в контексте приложения.
+    """
+    def ingest(project_id):
+        with closing(webhook.get_source(db.session.get(Project,
+                project_id))) as source:
+            ref = source.tree_of_default_branch(repo.repository())
+            webhook.add_tree_objs_to_db(ref, project_id, source)
+
+    return ingest
+
+
+@pytest.fixture
+def http_dir(tmp_path):
+    """HTTP сервер, который отдает файлы временной директории. Возвращает
+    пару (директория, базовый URL).
+    """
+    root = tmp_path / 'http'
+    root.mkdir()
+
+    class Handler(http.server.SimpleHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0),
+            functools.partial(Handler, directory=str(root)))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    yield root, 'http://127.0.0.1:%d' % server.server_port
+
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,120 @@
+"""Тесты хранилища содержимого файлов (см. :mod:`flaskr.blobstore`)."""
+import os
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from flaskr import blobstore
+from flaskr import gitobj
+
+
+def store(root, data):
+    """Сохраняет *data* в хранилище *root* и возвращает пару (Git хеш,
+    путь к файлу хранилища).
+    """
+    sha = gitobj.blob_sha(data)
+    blobstore.write(root, sha, data)
+    return sha, blobstore._path(root, sha)
+
+
+def _write_and_read(root, data):
+    sha = gitobj.blob_sha(data)
+    blobstore.write(root, sha, data)
+    return sha, blobstore.read(root, sha)
+
+
+def test_write_and_read(app, tmp_path):
+    root = str(tmp_path / 'store')
+    data = b'int main(void);\n'
+    sha = gitobj.blob_sha(data)
+
+    assert blobstore.read(root, sha) is None
+    size = blobstore.write(root, sha, data)
+    path = blobstore._path(root, sha)
+    assert size == os.path.getsize(path)
+    assert blobstore.write(root, sha, data) == 0
+    assert blobstore.read(root, sha) == data
+
+    with app.app_context():
+        assert blobstore.get(sha) is None
+        blobstore.put(sha, data)
+        assert blobstore.get(sha) == data
+
+        app.config['BLOB_STORE_ENABLED'] = False
+        assert blobstore.get(sha) is None
+        assert blobstore.evict(0) == 0
+
+
+def test_corrupt_entry_is_removed(tmp_path):
+    root = str(tmp_path)
+    sha, path = store(root, b'a\n')
+    with open(path, 'wb') as f:
+        f.write(b'not zlib')
+    assert blobstore.read(root, sha) is None
+    assert not os.path.exists(path)
+
+    # Содержимое не совпадает с Git хешем
+    sha, path = store(root, b'b\n')
+    with open(path, 'wb') as f:
+        f.write(zlib.compress(b'c\n'))
+    assert blobstore.read(root, sha) is None
+    assert not os.path.exists(path)
+
+
+def test_evict_least_recently_used(app):
+    root = app.config['BLOB_STORE_DIR']
+    # Случайные данные не сжимаются, файлы хранилища одного размера
+    entries = [store(root, os.urandom(1000)) for _ in range(4)]
+    for i, (_sha, path) in enumerate(entries):
+        os.utime(path, (1000 + i, 1000 + i))
+    size = os.path.getsize(entries[0][1])
+    # Временные файлы незавершенной записи не учитываются и не удаляются
+    tmp = os.path.join(root, entries[0][1].split(os.sep)[-2], '.tmp-x')
+    with open(tmp, 'wb') as f:
+        f.write(b'x' * 10 * size)
+
+    # Чтение и повторная запись отмечают использование
+    assert blobstore.read(root, entries[0][0]) is not None
+    assert blobstore.write(root, entries[1][0], b'') == 0
+
+    with app.app_context():
+        assert blobstore.evict(4 * size) == 0
+        assert blobstore.evict(3 * size) == 2 * size
+
+    assert [os.path.exists(path) for _sha, path in entries] == \
+            [True, True, False, False]
+    assert os.path.exists(tmp)
+
+
+def test_written_triggers_evict(app, monkeypatch):
+    calls = []
+    monkeypatch.setattr(blobstore, 'evict', lambda: calls.append(1))
+    monkeypatch.setattr(blobstore, '_written', 0)
+    app.config['BLOB_STORE_MAX_SIZE'] = 1600
+
+    with app.app_context():
+        blobstore.written(60)
+        blobstore.written(39)
+        assert calls == []
+
+        blobstore.written(1)
+        assert calls == [1]
+        assert blobstore._written == 0
+
+        blobstore.written(0)
+        assert calls == [1]
+
+
+def test_pool_workers(tmp_path):
+    root = str(tmp_path)
+    # Одинаковое содержимое записывается несколькими процессами
+    # одновременно
+    contents = [b'same\n'] * 8 + [b'file %d\n' % i for i in range(8)]
+
+    with ProcessPoolExecutor(2) as executor:
+        results = list(executor.map(_write_and_read, [root] * len(contents),
+            contents))
+
+    assert [data for _sha, data in results] == contents
+    for sha, data in results:
+        assert blobstore.read(root, sha) == data
+    assert not [name for _dir, _dirs, files in os.walk(root)
+            for name in files if name.startswith('.tmp-')]
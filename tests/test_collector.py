@@ -0,0 +1,82 @@
+"""Тесты сброса веб-хука и сборщика деревьев прошлых поколений (см.
+:mod:`flaskr.collector`).
+"""
+import pytest
+from flaskr import collector
+from flaskr import delivery
+from flaskr.models import db
+from flaskr.models import CommitSnapshot
+from flaskr.models import Directory
+from flaskr.models import File
+from flaskr.models import MetricsDelta
+from flaskr.models import Project
+from flaskr.models import ProjectLease
+from flaskr.models import RawMetrics
+
+
+def reset(client):
+    return client.put('/api/u/p/webhook/github?reset=true')
+
+
+def test_reset_revokes_lease(app, client, repo, project_id, send_event):
+    assert send_event('ping').status_code == 200
+
+    # Загрузка старого веб-хука, которая еще выполняется
+    with app.app_context():
+        old = delivery.acquire(project_id)
+        assert old is not None
+
+    assert reset(client).status_code == 200
+    with app.app_context():
+        lease = db.session.get(ProjectLease, project_id)
+        assert lease.owner is None
+        assert lease.pending_sha is None
+
+    assert send_event('ping', hook_id=8).status_code == 200
+    with app.app_context():
+        with pytest.raises(delivery.ConcurrentIngestionError):
+            old.renew()
+        project = db.session.get(Project, project_id)
+        assert project.hook_id == 8
+        assert project.get_root_dir().git_hash == repo.tree_sha()
+
+
+def test_collect_removes_old_generation(app, client, repo, project_id,
+        send_event):
+    assert send_event('ping').status_code == 200
+    sha = repo.commit({'src/main.c': 'int main(void);\n'})
+    assert send_event('push', sha).status_code == 200
+
+    with app.app_context():
+        old_root = db.session.get(Project, project_id).get_root_dir().id
+        assert CommitSnapshot.query.count() == 2
+        assert MetricsDelta.query.count() > 0
+
+    assert reset(client).status_code == 200
+    assert send_event('ping', hook_id=8).status_code == 200
+
+    with app.app_context():
+        project = db.session.get(Project, project_id)
+        root_dir = project.get_root_dir()
+        dirs = Directory.query.count()
+        files = File.query.count()
+        assert dirs == 8 and files == 10
+
+        assert collector.collect(batch_size=2) > 0
+
+        assert db.session.get(Directory, old_root) is None
+        assert Directory.query.count() == 4
+        assert {d.project_id for d in Directory.query} == {project_id}
+        assert File.query.count() == 5
+        assert RawMetrics.query.count() == 4
+        assert db.session.get(Directory, root_dir.id).git_hash == \
+                repo.tree_sha(sha)
+        assert {s.generation for s in CommitSnapshot.query} == \
+                {project.generation}
+        assert MetricsDelta.query.join(CommitSnapshot,
+                CommitSnapshot.id == MetricsDelta.snapshot_id).filter(
+                    CommitSnapshot.generation != project.generation
+                ).count() == 0
+
+        # Повторный запуск ничего не удаляет
+        assert collector.collect() == 0
@@ -0,0 +1,94 @@
+"""Тесты сжатия ответов приложения (см. :mod:`flaskr.compression`)."""
+import gzip
+import json
+import pytest
+from flaskr import analyzers
+from flaskr import compression
+from flaskr.models import db
+from flaskr.models import GraphVisualization
+from flaskr.models import Project
+
+
+@pytest.fixture
+def ingested(app, project_id, send_event):
+    app.config['COMPRESSION_MIN_SIZE'] = 100
+    assert send_event('ping').status_code == 200
+
+
+def test_gzip_response(client, ingested):
+    plain = client.get('/api/u/p/hotspots')
+    assert 'Content-Encoding' not in plain.headers
+    assert 'Accept-Encoding' in plain.headers['Vary']
+
+    response = client.get('/api/u/p/hotspots',
+            headers={'Accept-Encoding': 'gzip, deflate'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    data = gzip.decompress(response.get_data())
+    assert json.loads(data) == plain.get_json()
+    assert len(response.get_data()) < len(plain.get_data())
+
+
+def test_small_response_not_compressed(app, client, ingested):
+    app.config['COMPRESSION_MIN_SIZE'] = 1024 * 1024
+
+    response = client.get('/api/u/p/hotspots',
+            headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
+    assert response.get_json()['hotspots']
+
+
+def test_unsupported_encoding(client, ingested):
+    response = client.get('/api/u/p/hotspots',
+            headers={'Accept-Encoding': 'identity, zstd'})
+    assert 'Content-Encoding' not in response.headers
+
+
+def test_streamed_response_not_compressed(client, repo, ingested):
+    response = client.get('/api/u/p/diff?from=%s&to=%s' % (repo.tree_sha(),
+        repo.tree_sha()), headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert 'Content-Encoding' not in response.headers
+    assert response.get_json()['files'] == []
+
+
+def test_cached_graphs(app, client, project_id, send_event, ingested):
+    url = '/api/u/p/src/helper.c/visualization/graph/cfg'
+    headers = {'Accept-Encoding': 'gzip'}
+
+    first = client.get(url, headers=headers)
+    assert first.headers['Content-Encoding'] == 'gzip'
+    names = [v['func_name'] for v in
+            json.loads(gzip.decompress(first.get_data()))]
+    assert names == ['helper', 'unused']
+    assert len(compression._cache) == 1
+
+    # Повторный ответ берется из кеша без обращения к графам в БД
+    with app.app_context():
+        GraphVisualization.query.delete()
+        db.session.commit()
+
+    second = client.get(url, headers=headers)
+    assert second.get_data() == first.get_data()
+    assert second.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in second.headers['Vary']
+
+    # Клиенту без сжатия ответ строится заново
+    assert client.get(url).get_json() == []
+
+    # Тот же blob в другом проекте, загруженный новой версией анализатора
+    dot = 'digraph "helper" { %s}' % ('v2; ' * 50)
+    analyzers.register_analyzer('cfg', lambda path, content:
+            {'helper': dot}, version='test-2')
+    with app.app_context():
+        project = db.session.get(Project, project_id)
+        db.session.add(Project(user_id=project.user_id, project_name='q'))
+        db.session.commit()
+    assert send_event('ping', hook_id=8, project_name='q').status_code == 200
+
+    other = client.get('/api/u/q/src/helper.c/visualization/graph/cfg',
+            headers=headers)
+    assert other.headers['Content-Encoding'] == 'gzip'
+    assert json.loads(gzip.decompress(other.get_data())) == [{
+        'func_name': 'helper', 'type': 'CFG',
+        'dot': dot}]
@@ -0,0 +1,124 @@
+"""Тесты идемпотентной обработки событий веб-хука и аренды проекта (см.
+:mod:`flaskr.delivery`).
+"""
+import pytest
+from flaskr import delivery
+from flaskr import webhook
+from flaskr.models import db
+from flaskr.models import Project
+from flaskr.models import ProjectLease
+from flaskr.models import WebhookDelivery
+
+
+def test_duplicate_and_forget(app, project_id):
+    with app.test_request_context():
+        assert not delivery.is_duplicate('d1', project_id, 'push')
+        assert delivery.is_duplicate('d1', project_id, 'push')
+
+        delivery.forget('d1')
+        assert not delivery.is_duplicate('d1', project_id, 'push')
+        delivery.forget(None)
+
+
+def test_lease_pending_commit(app, project_id):
+    with app.test_request_context():
+        lease = delivery.acquire(project_id)
+        assert lease is not None
+        assert delivery.acquire(project_id) is None
+        assert delivery.acquire(project_id, 'a' * 40, {'n': 1}) is None
+        assert delivery.acquire(project_id, 'b' * 40, {'n': 2}) is None
+
+        # Отложенные коммиты сводятся к самому новому
+        assert lease.release() == ('b' * 40, {'n': 2})
+        assert lease.release() is None
+        assert delivery.acquire(project_id) is not None
+
+
+def test_abandon_keeps_pending_commit(app, project_id):
+    with app.test_request_context():
+        lease = delivery.acquire(project_id)
+        delivery.acquire(project_id, 'a' * 40, {'n': 1})
+        lease.abandon()
+
+        other = delivery.acquire(project_id)
+        assert other is not None
+        assert other.release() == ('a' * 40, {'n': 1})
+
+
+def test_revoked_lease_is_lost(app, project_id):
+    with app.test_request_context():
+        old = delivery.acquire(project_id, 'a' * 40, {})
+        delivery.acquire(project_id, 'b' * 40, {})
+        delivery.revoke(project_id)
+        db.session.commit()
+
+        new = delivery.acquire(project_id)
+        assert new is not None
+        with pytest.raises(delivery.ConcurrentIngestionError):
+            old.renew()
+        old.abandon()
+        assert db.session.get(ProjectLease, project_id).owner == new.owner
+        assert new.release() is None
+
+
+def test_duplicate_push_is_dropped(app, repo, project_id, send_event):
+    assert send_event('ping', delivery_id='d1').status_code == 200
+    sha = repo.commit({'src/main.c': 'int main(void);\n'})
+
+    response = send_event('push', delivery_id='d2', sha=sha)
+    assert response.status_code == 200
+    response = send_event('push', delivery_id='d2', sha=sha)
+    assert response.status_code == 200
+    assert response.get_json()['message'] == 'Событие уже было получено.'
+
+
+def test_failed_push_is_redelivered(app, repo, project_id, send_event,
+        monkeypatch):
+    assert send_event('ping', delivery_id='d1').status_code == 200
+    sha = repo.commit({'src/main.c': 'int main(void);\n'})
+
+    update_to_commit = webhook.update_to_commit
+    def fail(*args):
+        raise RuntimeError('источник недоступен')
+    monkeypatch.setattr(webhook, 'update_to_commit', fail)
+    with pytest.raises(RuntimeError):
+        send_event('push', delivery_id='d2', sha=sha)
+
+    with app.app_context():
+        assert db.session.get(WebhookDelivery, 'd2') is None
+        assert db.session.get(ProjectLease, project_id).owner is None
+
+    monkeypatch.setattr(webhook, 'update_to_commit', update_to_commit)
+    response = send_event('push', delivery_id='d2', sha=sha)
+    assert response.get_json()['message'] == 'Событие push успешно обработано.'
+    with app.app_context():
+        root_dir = db.session.get(Project, project_id).get_root_dir()
+        assert root_dir.git_hash == repo.tree_sha(sha)
+
+
+def test_failed_ping_is_redelivered(app, repo, project_id, send_event,
+        monkeypatch):
+    add_tree_objs_to_db = webhook.add_tree_objs_to_db
+    def fail(*args):
+        raise RuntimeError('источник недоступен')
+    monkeypatch.setattr(webhook, 'add_tree_objs_to_db', fail)
+    with pytest.raises(RuntimeError):
+        send_event('ping', delivery_id='d1')
+
+    with app.app_context():
+        assert db.session.get(Project, project_id).hook_id is None
+        assert db.session.get(WebhookDelivery, 'd1') is None
+
+    monkeypatch.setattr(webhook, 'add_tree_objs_to_db', add_tree_objs_to_db)
+    assert send_event('ping', delivery_id='d1').status_code == 200
+
+
+def test_wrong_hook_does_not_use_delivery(app, repo, project_id,
+        send_event):
+    assert send_event('ping', delivery_id='d1').status_code == 200
+    sha = repo.commit({'src/main.c': 'int main(void);\n'})
+
+    assert send_event('push', delivery_id='d2', hook_id=8,
+            sha=sha).status_code == 403
+    response = send_event('push', delivery_id='d2', sha=sha)
+    assert response.get_json()['message'] == 'Событие push успешно обработано.'
@@ -0,0 +1,70 @@
+"""Тесты снимков метрик коммитов и изменения метрик между коммитами (см.
+:mod:`flaskr.history`).
+"""
+import json
+from flaskr import history
+from flaskr.models import db
+from flaskr.models import Project
+
+
+def test_diff_between_commits(app, client, repo, project_id, send_event):
+    assert send_event('ping').status_code == 200
+    tree = repo.tree_sha()
+    sha = repo.commit({
+        'src/main.c': 'int main(void)\n{\n\n    return 1;\n}\n',
+        'src/new.c': 'int added(void)\n{\n    return 2;\n}\n'
+    })
+    assert send_event('push', sha).status_code == 200
+
+    response = client.get('/api/u/p/diff?from=%s&to=%s' % (tree, sha))
+    assert response.status_code == 200
+    body = json.loads(response.get_data(as_text=True))
+    assert (body['from'], body['to']) == (tree, sha)
+
+    files = {f['path']: f for f in body['files']}
+    assert sorted(files) == ['src/main.c', 'src/new.c']
+    assert files['src/main.c']['status'] == 'modified'
+    assert files['src/main.c']['delta']['loc'] == 1
+    assert files['src/main.c']['delta']['blanks'] == 1
+    assert files['src/new.c']['status'] == 'added'
+    assert files['src/new.c']['from']['loc'] is None
+    assert files['src/new.c']['functions']['added'] == ['added']
+
+    directories = body['directories']
+    assert sorted(directories) == ['', 'src/']
+    assert directories['']['files'] == directories['src/']['files'] == 2
+    assert directories['']['loc'] == directories['src/']['loc'] == 1 + 4
+
+    # Обратное сравнение
+    body = client.get('/api/u/p/diff?from=%s&to=%s' % (sha, tree)).get_json()
+    files = {f['path']: f for f in body['files']}
+    assert files['src/new.c']['status'] == 'removed'
+    assert files['src/new.c']['functions']['removed'] == ['added']
+    assert files['src/main.c']['delta']['loc'] == -1
+
+
+def test_state_at_latest_delta(app, repo, project_id, send_event):
+    assert send_event('ping').status_code == 200
+    first = repo.commit({'src/main.c': 'int main(void);\n'})
+    assert send_event('push', first).status_code == 200
+    second = repo.commit({'README': 'changed\n'})
+    assert send_event('push', second).status_code == 200
+
+    with app.app_context():
+        project = db.session.get(Project, project_id)
+        state = history.state_at(history.find_snapshot(project, second))
+        assert state['src/main.c']['loc'] == 1
+        assert state['src/helper.c']['loc'] == 9
+        assert 'README' not in state
+
+        # Изменились только файлы без метрик
+        assert list(history.diff(history.find_snapshot(project, first),
+            history.find_snapshot(project, second))) == []
+
+
+def test_diff_unknown_commit(app, client, repo, project_id, send_event):
+    assert send_event('ping').status_code == 200
+
+    response = client.get('/api/u/p/diff?from=%s&to=%s' % (repo.tree_sha(),
+        '0' * 40))
+    assert response.status_code == 404
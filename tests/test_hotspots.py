@@ -0,0 +1,60 @@
+"""Тесты рейтинга горячих точек проекта (см. :mod:`flaskr.hotspots`)."""
+from flaskr import hotspots
+from flaskr.models import db
+from flaskr.models import Hotspot
+from flaskr.models import Project
+
+
+def test_score():
+    assert hotspots.score(2, 10, 30.5) == 61.0
+    assert hotspots.score(3, 10, None) == 30.0
+    assert hotspots.score(1, None, None) == 0.0
+
+
+def test_hotspots_api(app, client, repo, project_id, send_event):
+    assert send_event('ping').status_code == 200
+    sha = repo.commit({'src/main.c': 'int main(void)\n{\n'
+        '    return helper() + helper() + helper();\n}\n'})
+    assert send_event('push', sha).status_code == 200
+
+    response = client.get('/api/u/p/hotspots?per_page=3')
+    assert response.status_code == 200
+    page = response.get_json()
+    assert (page['page'], page['per_page'], page['has_next']) == (1, 3, True)
+    assert len(page['hotspots']) == 3
+    first = page['hotspots'][0]
+    assert (first['path'], first['churn']) == ('src/main.c', 2)
+    scores = [h['score'] for h in page['hotspots']]
+    assert scores == sorted(scores, reverse=True)
+
+    page = client.get('/api/u/p/hotspots?page=2&per_page=3').get_json()
+    assert page['has_next'] is False
+    assert len(page['hotspots']) == 1
+
+    # README не анализируется и не попадает в рейтинг
+    assert 'README' not in {h['path'] for h in client.get(
+        '/api/u/p/hotspots').get_json()['hotspots']}
+
+    assert client.get('/api/u/p/hotspots?per_page=0').status_code == 400
+    assert client.get('/api/u/p/hotspots?page=0').status_code == 400
+
+
+def test_rebuild(app, repo, project_id, send_event):
+    assert send_event('ping').status_code == 200
+    sha = repo.commit({'src/helper.h': 'int helper(void);\nint x;\n'})
+    assert send_event('push', sha).status_code == 200
+
+    with app.app_context():
+        project = db.session.get(Project, project_id)
+        before = [(h.file_id, h.path, h.churn, h.score)
+                for h in hotspots.top(project)]
+
+        Hotspot.query.delete()
+        db.session.commit()
+        assert hotspots.top(project) == []
+
+        assert hotspots.rebuild(project) == 4
+        assert [(h.file_id, h.path, h.churn, h.score)
+                for h in hotspots.top(project)] == before
+        assert [h.path for h in hotspots.top(project, 1, 2)] == \
+                [path for _, path, _, _ in before[1:3]]
@@ -0,0 +1,134 @@
+"""Тесты разбора графов DOT (см. :mod:`flaskr.dot`) и сокращенного
+представления больших графов (см. :mod:`flaskr.lod`).
+"""
+import pytest
+from flaskr import dot
+from flaskr import lod
+
+
+def ids(summary):
+    return [(n['id'], n['kind'], n['size']) for n in summary['nodes']]
+
+
+def edges(summary):
+    return sorted((e['source'], e['target']) for e in summary['edges'])
+
+
+def test_parse():
+    graph = dot.parse('strict digraph "f" {\n'
+            '  node [shape=box]; // комментарий\n'
+            '  entry [label="int f()\\l"];\n'
+            '  a -> b -> c [label="T"];\n'
+            '  subgraph s { x [shape=ellipse, label=<x<br/>y>]; }\n'
+            '  c -> x;\n'
+            '}')
+
+    assert graph['name'] == 'f'
+    assert graph['directed']
+    assert graph['nodes'] == [
+        {'id': 'entry', 'label': 'int f()', 'shape': 'box'},
+        {'id': 'a', 'label': 'a', 'shape': 'box'},
+        {'id': 'b', 'label': 'b', 'shape': 'box'},
+        {'id': 'c', 'label': 'c', 'shape': 'box'},
+        {'id': 'x', 'label': 'x\ny', 'shape': 'ellipse'}]
+    assert graph['edges'] == [
+        {'source': 'a', 'target': 'b', 'label': 'T'},
+        {'source': 'b', 'target': 'c', 'label': 'T'},
+        {'source': 'c', 'target': 'x', 'label': None}]
+
+
+def test_parse_error():
+    with pytest.raises(dot.DotSyntaxError):
+        dot.parse('digraph { a -> }')
+    with pytest.raises(dot.DotSyntaxError):
+        dot.parse('digraph { a [label=<b> }')
+
+
+def test_to_dot_round_trip():
+    graph = dot.parse('digraph "f" { a [label="if (x \\"y\\")\\nthen", '
+            'shape=diamond]; a -> b [label="T"]; a -> c; }')
+
+    text = dot.to_dot(graph, {'a': '/src/a.c'})
+    assert 'URL="/src/a.c"' in text
+    assert dot.parse(text) == graph
+
+    undirected = dot.parse('graph { a -- b; }')
+    assert dot.parse(dot.to_dot(undirected)) == dict(undirected, name='G')
+
+
+def test_small_graph_unchanged():
+    graph = dot.parse('digraph { a -> b; b -> a; }')
+    assert lod.summarize(graph, 10) is graph
+
+
+def test_chain():
+    graph = dot.parse('digraph { s -> a; a -> b; b -> c; c -> d; d -> e; }')
+
+    summary = lod.summarize(graph, 3)
+    assert ids(summary) == [('chain:s', 'chain', 6)]
+    assert summary['nodes'][0]['label'] == 's\n...\ne\n(блоков: 6)'
+    assert summary['nodes'][0]['expandable']
+    assert (summary['total'], summary['budget']) == (6, 3)
+
+    summary = lod.summarize(graph, 10, ['chain:s'])
+    assert [n['id'] for n in summary['nodes']] == list('sabcde')
+
+
+def test_parallel_group():
+    graph = dot.parse('digraph { s -> a; s -> b; s -> c; '
+            'a -> e; b -> e; c -> e; }')
+
+    summary = lod.summarize(graph, 3)
+    assert ids(summary) == [('s', 'node', 1), ('group:a', 'group', 3),
+            ('e', 'node', 1)]
+    assert edges(summary) == [('group:a', 'e'), ('s', 'group:a')]
+
+    summary = lod.summarize(graph, 10, ['group:a'])
+    assert [n['id'] for n in summary['nodes']] == list('sabce')
+
+
+def test_loop():
+    graph = dot.parse('digraph { a -> b; b -> c; c -> d; d -> b; d -> e; }')
+
+    summary = lod.summarize(graph, 3)
+    assert ids(summary) == [('a', 'node', 1), ('loop:b', 'loop', 3),
+            ('e', 'node', 1)]
+    assert summary['nodes'][1]['label'] == 'цикл: b\n(блоков: 3)'
+    assert edges(summary) == [('a', 'loop:b'), ('loop:b', 'e')]
+
+    # Раскрытый цикл показывает блоки тела, а не цепочку из них
+    summary = lod.summarize(graph, 10, ['loop:b'])
+    assert [n['id'] for n in summary['nodes']] == list('abcde')
+    assert ('d', 'b') in edges(summary)
+
+
+def test_nested_loop():
+    graph = dot.parse('digraph { a -> b; b -> c; c -> b; c -> d; '
+            'd -> a; d -> e; }')
+
+    assert ids(lod.summarize(graph, 2)) == [('loop:a', 'loop', 4),
+            ('e', 'node', 1)]
+
+    summary = lod.summarize(graph, 10, ['loop:a'])
+    assert ids(summary) == [('a', 'node', 1), ('loop:b', 'loop', 2),
+            ('d', 'node', 1), ('e', 'node', 1)]
+
+    summary = lod.summarize(graph, 10, ['loop:a', 'loop:b'])
+    assert [n['id'] for n in summary['nodes']] == list('abcde')
+
+
+def test_budget():
+    graph = dot.parse('digraph { s -> a; s -> b; a -> c; b -> c; '
+            'c -> d; c -> e; d -> f; e -> f; }')
+
+    summary = lod.summarize(graph, 3, ['group:a', 'group:d'])
+    assert ids(summary) == [('s', 'node', 1), ('a', 'node', 1),
+            (lod.REST_ID, 'rest', 5)]
+    assert summary['nodes'][-1]['label'] == 'еще блоков: 5'
+    assert edges(summary) == [('a', lod.REST_ID), ('s', 'a'),
+            ('s', lod.REST_ID)]
+
+    # Бюджет больше - видно больше вершин в порядке обхода в ширину
+    summary = lod.summarize(graph, 5, ['group:a', 'group:d'])
+    assert [n['id'] for n in summary['nodes']] == \
+            ['s', 'a', 'b', 'c', lod.REST_ID]
@@ -0,0 +1,104 @@
+"""Тесты политики загрузки файлов (см. :mod:`flaskr.policy`)."""
+from contextlib import closing
+from flaskr import policy
+from flaskr import webhook
+from flaskr.models import db
+from flaskr.models import File
+from flaskr.models import GraphVisualization
+from flaskr.models import Project
+from flaskr.models import RawMetrics
+
+
+def test_parse_gitattributes():
+    text = '# comment\n\ngen/** linguist-generated\n' \
+            'gen/keep.c -linguist-generated text\n' \
+            '*.pb.c linguist-generated=true\n*.md linguist-documentation\n'
+
+    assert policy.parse_gitattributes(text) == [('gen/**', True),
+            ('gen/keep.c', False), ('*.pb.c', True)]
+
+
+def test_match_path():
+    assert policy.match_path('*.c', 'src/main.c')
+    assert policy.match_path('/src/*.c', 'src/main.c')
+    assert policy.match_path('vendor/**', 'vendor/x/a.c')
+    assert policy.match_path('src/**/*.c', 'src/main.c')
+    assert policy.match_path('src/**/*.c', 'src/a/b/main.c')
+    assert not policy.match_path('src/*.h', 'src/main.c')
+
+    # * не подходит под /
+    assert policy.match_path('vendor/*', 'vendor/a.c')
+    assert not policy.match_path('vendor/*', 'vendor/x/a.c')
+
+    # Шаблон директории
+    assert policy.match_path('vendor/', 'vendor/a.c')
+    assert policy.match_path('vendor/', 'vendor/x/a.c')
+    assert policy.match_path('vendor/', 'lib/vendor/a.c')
+    assert not policy.match_path('vendor/', 'vendor')
+    assert not policy.match_path('vendor/', 'vendored/a.c')
+    assert policy.match_path('third_party/zlib/', 'third_party/zlib/z.c')
+    assert not policy.match_path('third_party/zlib/',
+            'lib/third_party/zlib/z.c')
+
+
+def test_skip_reason():
+    p = policy.IngestionPolicy(100, ['vendor/**', '*_generated.c', ' '],
+            [('gen/**', True), ('gen/keep.c', False)])
+
+    assert p.skip_reason('src/main.c', 10) is None
+    assert p.skip_reason('src/main.c') is None
+    assert '100' in p.skip_reason('src/main.c', 101)
+    assert 'vendor/**' in p.skip_reason('vendor/lib/a.c', 1)
+    assert '*_generated.c' in p.skip_reason('src/x_generated.c', 1)
+    assert 'linguist-generated' in p.skip_reason('gen/out.c', 1)
+    assert p.skip_reason('gen/keep.c', 1) is None
+
+
+def test_policy_from_project(app, project_id):
+    app.config['INGESTION_MAX_BLOB_SIZE'] = 1000
+    app.config['INGESTION_EXCLUDES'] = ['vendor/**']
+
+    with app.app_context():
+        project = db.session.get(Project, project_id)
+        p = policy.IngestionPolicy.from_project(project,
+                'gen/* linguist-generated\n')
+        assert p.max_blob_size == 1000
+        assert p.excludes == ['vendor/**']
+        assert p.generated == [('gen/*', True)]
+
+        project.max_blob_size = 10
+        project.exclude_globs = 'lib/**\n*.h'
+        project.use_gitattributes = False
+        p = policy.IngestionPolicy.from_project(project,
+                'gen/* linguist-generated\n')
+        assert p.max_blob_size == 10
+        assert p.excludes == ['lib/**', '*.h']
+        assert p.generated == []
+
+
+def test_ingest_skips_files(app, repo, project_id):
+    repo.commit({'.gitattributes': 'src/main.c linguist-generated\n'})
+
+    with app.app_context():
+        project = db.session.get(Project, project_id)
+        project.max_blob_size = 50
+        project.exclude_globs = 'lib/**'
+        db.session.commit()
+
+        with closing(webhook.get_source(project)) as source:
+            ref = source.tree_of_default_branch(repo.repository())
+            webhook.add_tree_objs_to_db(ref, project_id, source)
+
+        files = {f.file_name: f for f in File.query}
+        assert 'превышает' in files['helper.c'].skip_reason
+        assert 'lib/**' in files['strings.c'].skip_reason
+        assert 'linguist-generated' in files['main.c'].skip_reason
+        assert files['helper.h'].skip_reason is None
+
+        for name in ('helper.c', 'strings.c', 'main.c'):
+            assert RawMetrics.query.filter_by(
+                    file_id=files[name].id).count() == 0
+            assert GraphVisualization.query.filter_by(
+                    file_id=files[name].id).count() == 0
+        assert RawMetrics.query.filter_by(
+                file_id=files['helper.h'].id).count() == 1
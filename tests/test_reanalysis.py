@@ -0,0 +1,162 @@
+"""Тесты повторного анализа после обновления анализаторов (см.
+:mod:`flaskr.reanalysis`).
+"""
+import shutil
+import pytest
+from flaskr import analyzers
+from flaskr import reanalysis
+from flaskr import sources
+from flaskr.models import db
+from flaskr.models import File
+from flaskr.models import GraphVisualization
+from flaskr.models import HalsteadMetrics
+from flaskr.models import Hotspot
+from flaskr.models import Project
+from flaskr.models import RawMetrics
+
+
+def cfg_v2(path, content):
+    return {name: 'digraph "%s" { v2; }' % name
+            for name in analyzers.run_analyzer('cfg-v1', path, content)}
+
+
+@pytest.fixture
+def upgrade_cfg():
+    """Функция, которая заменяет анализатор *cfg* версией *test-2*."""
+    def upgrade():
+        analyzers.register_analyzer('cfg-v1', analyzers._analyzers['cfg'])
+        analyzers.register_analyzer('cfg', cfg_v2, version='test-2')
+    return upgrade
+
+
+def rows(model):
+    """Строки результатов анализа {(файл, ...): (идентификатор, версия)}."""
+    if model is GraphVisualization:
+        return {(r.file_id, r.func_name): (r.id, r.analyzer_version)
+                for r in model.query}
+    return {r.file_id: (r.id, r.analyzer_version) for r in model.query}
+
+
+def test_stale_files(app, project_id, ingest, upgrade_cfg):
+    with app.app_context():
+        ingest(project_id)
+        root_dir = db.session.get(Project, project_id).get_root_dir()
+        assert reanalysis.stale_files(root_dir) == []
+
+        upgrade_cfg()
+        stale = reanalysis.stale_files(root_dir)
+        assert sorted(r.file_name for r in stale) == ['helper.c', 'main.c',
+                'strings.c']
+        assert all(r.cfg and not r.raw and not r.halstead for r in stale)
+
+        # Результат без версии устарел, пропущенный файл не анализируется
+        header = File.query.filter_by(file_name='helper.h').one()
+        RawMetrics.query.filter_by(file_id=header.id).one()\
+                .analyzer_version = None
+        File.query.filter_by(file_name='main.c').one().skip_reason = 'skip'
+        db.session.flush()
+        stale = {r.file_name: r for r in reanalysis.stale_files(root_dir)}
+        assert sorted(stale) == ['helper.c', 'helper.h', 'strings.c']
+        assert stale['helper.h'].raw and not stale['helper.h'].cfg
+
+
+def test_reanalyze_swaps_stale_model(app, project_id, ingest, upgrade_cfg):
+    with app.app_context():
+        ingest(project_id)
+        raw, halstead = rows(RawMetrics), rows(HalsteadMetrics)
+        hotspots = {h.file_id: h.score for h in Hotspot.query}
+
+        upgrade_cfg()
+        project = db.session.get(Project, project_id)
+        summary = reanalysis.reanalyze(project, workers=1, batch_size=2)
+
+        assert (summary['files'], summary['stale'], summary['missing']) == \
+                (3, 3, 0)
+        assert rows(RawMetrics) == raw
+        assert rows(HalsteadMetrics) == halstead
+        assert {h.file_id: h.score for h in Hotspot.query} == hotspots
+        graphs = GraphVisualization.query.all()
+        assert sorted(g.func_name for g in graphs) == ['helper', 'main',
+                'strings_len', 'unused']
+        assert {(g.analyzer_version, g.graph_dot.split('{')[1])
+                for g in graphs} == {('test-2', ' v2; }')}
+
+        # Две части по 2 файла
+        assert db.session.get(Project, project_id).analysis_revision == 2
+
+        # Повторный запуск ничего не анализирует
+        summary = reanalysis.reanalyze(db.session.get(Project, project_id),
+                workers=1)
+        assert (summary['files'], summary['stale']) == (0, 0)
+        assert db.session.get(Project, project_id).analysis_revision == 2
+
+
+def test_reanalyze_hotspot_metrics_together(app, project_id, ingest):
+    with app.app_context():
+        ingest(project_id)
+        raw, halstead = rows(RawMetrics), rows(HalsteadMetrics)
+        graphs = rows(GraphVisualization)
+        main_id = File.query.filter_by(file_name='main.c').one().id
+        Hotspot.query.filter_by(file_id=main_id).delete()
+
+        halstead_v1 = analyzers._analyzers['halstead']
+        analyzers.register_analyzer('halstead', lambda path, content: dict(
+            halstead_v1(path, content), unique_n2=3), version='test-1')
+        analyzers.register_analyzer('raw', analyzers._analyzers['raw'],
+                version='test-2')
+        summary = reanalysis.reanalyze(db.session.get(Project, project_id),
+                workers=1)
+
+        assert summary['files'] == 4
+        assert {v for _id, v in rows(RawMetrics).values()} == {'test-2'}
+        assert set(rows(RawMetrics)) == set(raw)
+        # Метрики Холстеда той же версии вычислены заново вместе с LOC
+        # метриками
+        assert rows(HalsteadMetrics) == halstead
+        assert {m.unique_n2 for m in HalsteadMetrics.query} == {3}
+        assert rows(GraphVisualization) == graphs
+        assert db.session.get(Hotspot, main_id) is not None
+
+
+def test_reanalyze_missing_content(app, repo, project_id, ingest,
+        upgrade_cfg):
+    with app.app_context():
+        ingest(project_id)
+        shutil.rmtree(app.config['BLOB_STORE_DIR'])
+        shutil.rmtree(sources.mirror_path(project_id))
+
+        upgrade_cfg()
+        summary = reanalysis.reanalyze(db.session.get(Project, project_id),
+                workers=1)
+        assert (summary['files'], summary['stale'], summary['missing']) == \
+                (0, 3, 3)
+        assert db.session.get(Project, project_id).analysis_revision == 0
+
+        # Содержимое читается из локальной копии репозитория
+        summary = reanalysis.reanalyze(db.session.get(Project, project_id),
+                checkout=str(repo.path), workers=1)
+        assert (summary['files'], summary['missing']) == (3, 0)
+        assert {v for _id, v in rows(GraphVisualization).values()} == \
+                {'test-2'}
+
+
+def test_reanalyze_resumes(app, project_id, ingest, upgrade_cfg):
+    with app.app_context():
+        ingest(project_id)
+        upgrade_cfg()
+
+        def interrupt(summary):
+            raise KeyboardInterrupt
+
+        with pytest.raises(KeyboardInterrupt):
+            reanalysis.reanalyze(db.session.get(Project, project_id),
+                    workers=1, batch_size=2, progress=interrupt)
+
+        # Первая часть зафиксирована, аренда проекта освобождена
+        project = db.session.get(Project, project_id)
+        assert project.analysis_revision == 1
+        assert len(reanalysis.stale_files(project.get_root_dir())) == 1
+
+        summary = reanalysis.reanalyze(project, workers=1, batch_size=2)
+        assert (summary['files'], summary['stale']) == (1, 1)
+        assert db.session.get(Project, project_id).analysis_revision == 2
@@ -0,0 +1,193 @@
+"""Тесты пула отрисовки графов (см. :mod:`flaskr.render`). Вместо
+Graphviz запускается сценарий оболочки, который возвращает свои
+аргументы и ограничение памяти.
+"""
+import os
+import threading
+import time
+import pytest
+from flaskr import render
+
+#: Сценарий вместо Graphviz: граф с *sleep* отрисовывается долго, граф с
+#: *fail* - с ошибкой
+_DOT_SCRIPT = '''#!/bin/sh
+input=$(cat)
+echo run >> "$0.log"
+case "$input" in *sleep*) exec sleep 10;; esac
+case "$input" in *fail*) exit 1;; esac
+echo "<svg args='$*' ulimit='$(ulimit -v)'/>"
+'''
+
+
+@pytest.fixture
+def dot_binary(app, tmp_path):
+    """Путь к сценарию вместо Graphviz. Пул отрисовки создается заново
+    по параметрам приложения теста.
+    """
+    if os.name != 'posix':
+        pytest.skip('сценарий требует sh')
+
+    path = tmp_path / 'dot'
+    path.write_text(_DOT_SCRIPT)
+    path.chmod(0o755)
+    app.config.update(RENDER_DOT_BINARY=str(path), RENDER_WORKERS=1,
+            RENDER_QUEUE_SIZE=1, RENDER_TIMEOUT=5.0)
+    render._executor = render._slots = None
+
+    yield path
+
+    if render._executor is not None:
+        render._executor.shutdown(wait=True)
+    render._executor = render._slots = None
+
+
+def runs(path):
+    """Количество запусков сценария."""
+    log = path.parent / (path.name + '.log')
+    return len(log.read_text().splitlines()) if log.exists() else 0
+
+
+def assert_slots_free(app):
+    """Проверяет, что все места пула и очереди свободны."""
+    size = app.config['RENDER_WORKERS'] + app.config['RENDER_QUEUE_SIZE']
+    slots = render._slots
+    acquired = 0
+    # Место освобождается обратным вызовом после завершения отрисовки
+    deadline = time.monotonic() + 5
+    while acquired < size and time.monotonic() < deadline:
+        if slots.acquire(timeout=0.1):
+            acquired += 1
+    try:
+        assert acquired == size
+        assert not slots.acquire(blocking=False)
+    finally:
+        for _ in range(acquired):
+            slots.release()
+
+
+def test_count_nodes():
+    assert render.count_nodes('digraph {\n a [label="x"];\n "b c" [];\n'
+            ' a -> b [label="y"];\n}') == 2
+
+
+def test_command():
+    assert render._command('dot', 'sfdp', 0) == ['dot', '-Ksfdp', '-Tsvg']
+    if os.name == 'posix':
+        assert render._command('dot', 'dot', 2 * 1024 * 1024) == ['sh',
+                '-c', 'ulimit -v 2048 && exec "$0" "$@"', 'dot', '-Kdot',
+                '-Tsvg']
+
+
+def test_render_ok(app, dot_binary):
+    app.config['RENDER_MEMORY_LIMIT'] = 256 * 1024 * 1024
+
+    with app.app_context():
+        svg, status = render.render_svg('digraph { a [label="a"]; }')
+
+    assert status == 'ok'
+    assert "args='-Kdot -Tsvg'" in svg
+    assert "ulimit='262144'" in svg
+    assert_slots_free(app)
+
+
+def test_render_cheap_and_too_large(app, dot_binary):
+    app.config.update(RENDER_CHEAP_FROM=1, RENDER_MAX_NODES=2)
+    graph = 'digraph {\n%s\n}'
+
+    with app.app_context():
+        svg, status = render.render_svg(graph % 'a [];')
+        assert status == 'ok' and '-Kdot' in svg
+
+        svg, status = render.render_svg(graph % 'a [];\nb [];')
+        assert status == 'cheap' and '-Ksfdp' in svg
+
+        assert render.render_svg(graph % 'a [];\nb [];\nc [];') == \
+                (None, 'too_large')
+
+    assert runs(dot_binary) == 2
+
+
+def test_render_error(app, dot_binary):
+    with app.app_context():
+        assert render.render_svg('digraph { fail [] }') == (None, 'error')
+
+        app.config['RENDER_DOT_BINARY'] = str(dot_binary) + '-missing'
+        app.config['RENDER_MEMORY_LIMIT'] = 0
+        assert render.render_svg('digraph { a [] }') == (None, 'error')
+
+    assert_slots_free(app)
+
+
+def test_render_timeout_releases_slots(app, dot_binary):
+    app.config['RENDER_TIMEOUT'] = 0.3
+
+    with app.app_context():
+        started = time.monotonic()
+        assert render.render_svg('digraph { sleep [] }') == \
+                (None, 'timeout')
+        assert time.monotonic() - started < 5
+
+        assert_slots_free(app)
+        app.config['RENDER_TIMEOUT'] = 5.0
+        assert render.render_svg('digraph { a [] }')[1] == 'ok'
+
+
+def test_run_after_deadline(dot_binary):
+    assert render._run(str(dot_binary), 'dot', 'digraph { a [] }',
+            time.monotonic() - 1, 0) == (None, 'timeout')
+    assert runs(dot_binary) == 0
+
+
+def test_busy_and_queue_deadline(app, dot_binary, monkeypatch):
+    app.config['RENDER_TIMEOUT'] = 0.2
+    started = threading.Event()
+    finish = threading.Event()
+    run = render._run
+
+    def blocking_run(*args):
+        if not started.is_set():
+            started.set()
+            finish.wait(10)
+        return run(*args)
+
+    monkeypatch.setattr(render, '_run', blocking_run)
+    results = []
+
+    def first():
+        with app.app_context():
+            results.append(render.render_svg('digraph { a [] }'))
+
+    thread = threading.Thread(target=first)
+    with app.app_context():
+        thread.start()
+        assert started.wait(5)
+
+        # Единственный поток пула занят, граф ждет в очереди и не
+        # дожидается отрисовки до истечения времени
+        assert render.render_svg('digraph { b [] }') == (None, 'timeout')
+
+        # Поток и очередь заняты
+        assert render.render_svg('digraph { c [] }') == (None, 'busy')
+
+        finish.set()
+        thread.join(10)
+
+        # Оба графа дождались потока пула после истечения времени и
+        # Graphviz для них не запускался
+        assert results == [(None, 'timeout')]
+        assert_slots_free(app)
+        assert runs(dot_binary) == 0
+
+
+def test_summarize_dot(app):
+    with app.app_context():
+        small = 'digraph {\n a [label="a"];\n b [label="b"];\n a -> b;\n}'
+        assert render.summarize_dot(small, 5) is None
+
+        summary = render.summarize_dot(small, 5, ['chain:a'])
+        assert [n['id'] for n in summary['nodes']] == ['a', 'b']
+
+        summary = render.summarize_dot(small, 1)
+        assert [n['kind'] for n in summary['nodes']] == ['chain']
+
+        assert render.summarize_dot('digraph { a [label=<x] }', 0) is None
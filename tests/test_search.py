@@ -0,0 +1,85 @@
+"""Тесты поиска функций и файлов проекта (см. :mod:`flaskr.search`)."""
+from flaskr import search
+from flaskr import webhook
+from flaskr.models import db
+from flaskr.models import Project
+from flaskr.models import SearchEntry
+
+
+def test_trigrams():
+    assert search.trigrams('Ab') == {'$ab', 'ab$'}
+    assert search.trigrams('abcd') == {'$ab', 'abc', 'bcd', 'cd$'}
+
+
+def test_search_prefix_and_fuzzy(app, project_id, ingest):
+    with app.app_context():
+        ingest(project_id)
+        project = db.session.get(Project, project_id)
+
+        results = search.search(project, 'Help')
+        assert sorted((r['kind'], r['name'], r['path']) for r in results) \
+                == [('file', 'helper.c', 'src/helper.c'),
+                    ('file', 'helper.h', 'src/helper.h'),
+                    ('function', 'helper', 'src/helper.c')]
+        assert all(r['score'] == 1.0 for r in results)
+
+        assert [r['name'] for r in search.search(project, 'help',
+            'function')] == ['helper']
+        assert [r['path'] for r in search.search(project, 'src/h', 'file')] \
+                == ['src/helper.c', 'src/helper.h']
+        assert len(search.search(project, 'help', limit=1)) == 1
+        assert search.search(project, '  ') == []
+
+        fuzzy = search.search(project, 'strings_ln', 'function')
+        assert [r['name'] for r in fuzzy] == ['strings_len']
+        assert 0 < fuzzy[0]['score'] < 1
+
+
+def test_fuzzy_search_filters_kind(app, repo, project_id, ingest):
+    # Файлы совпадают с запросом лучше функции и заняли бы всех
+    # кандидатов нечеткого поиска
+    repo.commit({'d%d/strings_ln' % i: 'text\n' for i in range(5)})
+
+    with app.app_context():
+        ingest(project_id)
+        project = db.session.get(Project, project_id)
+
+        assert [r['kind'] for r in search.search(project, 'strings_ln',
+            limit=1)] == ['file']
+        assert [r['name'] for r in search.search(project, 'strings_ln',
+            'function', limit=1)] == ['strings_len']
+
+
+def test_search_follows_updates(app, repo, project_id, ingest):
+    with app.app_context():
+        ingest(project_id)
+        sha = repo.commit({'src/helper.c': 'int helper(void)\n{\n'
+            '    return 0;\n}\n\nint helper_fast(void)\n{\n'
+            '    return 1;\n}\n'})
+        webhook.update_to_commit(project_id, repo.repository(), sha)
+
+        project = db.session.get(Project, project_id)
+        results = search.search(project, 'helper_', 'function')
+        assert [(r['name'], r['score']) for r in results][0] == \
+                ('helper_fast', 1.0)
+        assert all(r['score'] < 1 for r in results[1:])
+        assert SearchEntry.query.filter_by(name='unused').count() == 0
+
+        # Индекс, построенный заново, совпадает с поддерживаемым загрузкой
+        before = sorted((e.kind, e.name, e.path) for e in SearchEntry.query)
+        search.rebuild(project)
+        assert sorted((e.kind, e.name, e.path)
+                for e in SearchEntry.query) == before
+
+
+def test_search_api(client, project_id, send_event):
+    assert send_event('ping').status_code == 200
+
+    response = client.get('/api/u/p/search?q=help&kind=function')
+    assert response.status_code == 200
+    assert response.get_json() == [{'kind': 'function', 'name': 'helper',
+        'path': 'src/helper.c', 'file_id': response.get_json()[0]['file_id'],
+        'score': 1.0}]
+
+    assert client.get('/api/u/p/search?q=help&kind=dir').status_code == 400
+    assert client.get('/api/u/missing/search?q=help').status_code == 404
@@ -0,0 +1,86 @@
+"""Тесты загрузки из локального зеркала репозитория (см.
+:class:`flaskr.sources.GitMirrorSource`).
+"""
+from contextlib import closing
+import pytest
+from flaskr import history
+from flaskr import sources
+from flaskr import webhook
+from flaskr.models import db
+from flaskr.models import Directory
+from flaskr.models import File
+from flaskr.models import GraphVisualization
+from flaskr.models import Project
+from flaskr.models import RawMetrics
+
+
+def tree_hashes(project_id):
+    """Возвращает Git хеши директорий текущего дерева проекта {путь: хеш}.
+    """
+    root_dir = db.session.get(Project, project_id).get_root_dir()
+    paths = history.tree_paths(root_dir)
+    return {paths[d.id]: d.git_hash for d in
+            Directory.query.filter(Directory.id.in_(list(paths)))}
+
+
+def test_mirror_reads_trees_and_blobs(repo, tmp_path):
+    with closing(sources.GitMirrorSource(str(tmp_path / 'm.git'))) as source:
+        ref = source.tree_of_default_branch(repo.repository())
+        sha, tree = source.root_tree(ref)
+
+        assert sha == repo.tree_sha()
+        nodes = {o['path']: o for o in tree}
+        assert sorted(nodes) == ['README', 'lib', 'src']
+        assert nodes['lib']['type'] == 'tree'
+        assert nodes['README']['type'] == 'blob'
+        assert nodes['README']['size'] == len('readme\n')
+        assert source.blob(nodes['README']) == b'readme\n'
+
+        src = {o['path']: o for o in source.subtree(nodes['src'])}
+        assert sorted(src) == ['helper.c', 'helper.h', 'main.c']
+        assert source.blob(src['helper.h']) == b'int helper(void);\n'
+
+        with pytest.raises(KeyError):
+            source.blob({'sha': '0' * 40})
+
+
+def test_mirror_fetches_new_commits(repo, tmp_path):
+    with closing(sources.GitMirrorSource(str(tmp_path / 'm.git'))) as source:
+        source.tree_of_default_branch(repo.repository())
+        sha = repo.commit({'src/extra.c': 'int extra(void);\n'})
+
+        ref = source.tree_of_commit(repo.repository(), sha)
+        assert source.root_tree(ref)[0] == repo.tree_sha(sha)
+
+
+def test_ingest_from_mirror(app, repo, project_id, ingest):
+    with app.app_context():
+        ingest(project_id)
+
+        hashes = tree_hashes(project_id)
+        assert hashes == {path: repo.tree_sha('HEAD', path.rstrip('/'))
+                for path in ('', 'src/', 'lib/', 'lib/util/')}
+        assert File.query.count() == 5
+        assert RawMetrics.query.count() == 4
+        assert sorted(g.func_name for g in GraphVisualization.query) == \
+                ['helper', 'main', 'strings_len', 'unused']
+
+
+def test_update_to_commit(app, repo, project_id, ingest):
+    with app.app_context():
+        ingest(project_id)
+
+        sha = repo.commit({
+            'src/main.c': 'int main(void)\n{\n    return 1;\n}\n',
+            'src/new.c': 'int added(void)\n{\n    return 2;\n}\n'
+        })
+        webhook.update_to_commit(project_id, repo.repository(), sha)
+
+        hashes = tree_hashes(project_id)
+        assert hashes[''] == repo.tree_sha(sha)
+        assert hashes['src/'] == repo.tree_sha(sha, 'src')
+        main = File.query.filter_by(file_name='main.c').one()
+        assert main.churn == 2
+        assert RawMetrics.query.filter_by(file_id=main.id).one().loc == 4
+        assert File.query.filter_by(file_name='new.c').one().churn == 1
+        assert File.query.filter_by(file_name='helper.c').one().churn == 1
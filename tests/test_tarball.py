@@ -0,0 +1,111 @@
+"""Тесты загрузки проекта из архива коммита (см.
+:func:`flaskr.webhook.add_tarball_to_db`).
+"""
+import io
+import subprocess
+import tarfile
+from flaskr import history
+from flaskr import webhook
+from flaskr.models import db
+from flaskr.models import Directory
+from flaskr.models import File
+from flaskr.models import Hotspot
+from flaskr.models import Project
+from flaskr.models import RawMetrics
+
+
+def make_tarball(path, members):
+    """Создает архив *path* в формате архивов Github с файлами *members*
+    [(путь, содержимое или None для директории)] в заданном порядке.
+    """
+    with tarfile.open(str(path), 'w:gz') as tar:
+        for name, content in members:
+            info = tarfile.TarInfo('u-p-0000000/' + name)
+            if content is None:
+                info.type = tarfile.DIRTYPE
+                info.mode = 0o755
+                tar.addfile(info)
+            else:
+                data = content.encode('utf-8')
+                info.size = len(data)
+                info.mode = 0o644
+                tar.addfile(info, io.BytesIO(data))
+
+
+def test_tarball_hashes_match_git(app, repo, project_id, http_dir):
+    root, base_url = http_dir
+    subprocess.run(['git', '-C', str(repo.path), 'archive',
+        '--format=tar.gz', '--prefix=u-p-0000000/',
+        '-o', str(root / 'main.tar.gz'), 'HEAD'], check=True)
+
+    with app.app_context():
+        webhook.add_tarball_to_db(base_url + '/main.tar.gz', project_id)
+
+        root_dir = db.session.get(Project, project_id).get_root_dir()
+        paths = history.tree_paths(root_dir)
+        assert {paths[d.id]: d.git_hash for d in Directory.query} == \
+                {path: repo.tree_sha('HEAD', path.rstrip('/'))
+                        for path in ('', 'src/', 'lib/', 'lib/util/')}
+        assert File.query.count() == 5
+        assert RawMetrics.query.count() == 4
+
+        snapshot = history.find_snapshot(db.session.get(Project,
+            project_id), repo.tree_sha())
+        assert snapshot is not None
+        assert sorted(history.state_at(snapshot)) == ['lib/util/strings.c',
+                'src/helper.c', 'src/helper.h', 'src/main.c']
+
+
+def test_gitattributes_after_ingested_files(app, project_id, http_dir):
+    root, base_url = http_dir
+    # .gitattributes идет в архиве после файлов, которые он помечает, и
+    # после первой контрольной точки (INGESTION_CHUNK_SIZE = 2)
+    make_tarball(root / 'late.tar.gz', [
+        ('', None),
+        ('a.c', 'int a(void);\n'),
+        ('gen', None),
+        ('gen/out.c', 'int out(void);\n'),
+        ('gen/table.c', 'int table(void);\n'),
+        ('b.c', 'int b(void);\n'),
+        ('.gitattributes', 'gen/* linguist-generated\n'),
+    ])
+
+    with app.app_context():
+        webhook.add_tarball_to_db(base_url + '/late.tar.gz', project_id)
+
+        files = {f.file_name: f for f in File.query}
+        for name in ('out.c', 'table.c'):
+            assert 'linguist-generated' in files[name].skip_reason
+            assert RawMetrics.query.filter_by(
+                    file_id=files[name].id).count() == 0
+            assert db.session.get(Hotspot, files[name].id) is None
+        for name in ('a.c', 'b.c'):
+            assert files[name].skip_reason is None
+            assert RawMetrics.query.filter_by(
+                    file_id=files[name].id).count() == 1
+
+        project = db.session.get(Project, project_id)
+        snapshot = history.find_snapshot(project,
+                project.get_root_dir().git_hash)
+        state = history.state_at(snapshot)
+        assert state['gen/out.c']['skipped']
+        assert not state['a.c']['skipped']
+
+
+def test_ping_ingests_tarball(app, repo, project_id, send_event, http_dir):
+    root, base_url = http_dir
+    (root / 'tarball').mkdir()
+    subprocess.run(['git', '-C', str(repo.path), 'archive',
+        '--format=tar.gz', '--prefix=u-p-0000000/',
+        '-o', str(root / 'tarball' / 'main'), 'HEAD'], check=True)
+    app.config['INGESTION_SOURCE'] = 'tarball'
+
+    repository = dict(repo.repository(),
+            archive_url=base_url + '/{archive_format}{/ref}')
+    response = send_event('ping', repository=repository)
+
+    assert response.status_code == 200
+    with app.app_context():
+        project = db.session.get(Project, project_id)
+        assert project.hook_id == 7
+        assert project.get_root_dir().git_hash == repo.tree_sha()
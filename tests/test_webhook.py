@@ -0,0 +1,34 @@
+"""Тесты получения содержимого blob'ов (см. :func:`flaskr.webhook.fetch_blob`).
+"""
+import base64
+import json
+import pytest
+from flaskr import webhook
+
+
+def test_fetch_raw_blob(app, http_dir):
+    root, base_url = http_dir
+    (root / 'blob').write_bytes(b'x' * 1000)
+
+    with app.app_context():
+        assert webhook.fetch_blob(base_url + '/blob') == b'x' * 1000
+        assert webhook.fetch_blob(base_url + '/blob', 1000) == b'x' * 1000
+
+        with pytest.raises(webhook.BlobTooLargeError) as e:
+            webhook.fetch_blob(base_url + '/blob', 999)
+        assert e.value.size == 1000
+
+
+def test_fetch_json_blob(app, http_dir):
+    root, base_url = http_dir
+    content = b'int main(void);\n'
+    (root / 'blob.json').write_text(json.dumps({'size': len(content),
+        'encoding': 'base64', 'content': base64.b64encode(content).decode()}))
+
+    for raw in (True, False):
+        app.config['GITHUB_RAW_BLOBS'] = raw
+        with app.app_context():
+            assert webhook.fetch_blob(base_url + '/blob.json') == content
+            with pytest.raises(webhook.BlobTooLargeError) as e:
+                webhook.fetch_blob(base_url + '/blob.json', len(content) - 1)
+            assert e.value.size == len(content)